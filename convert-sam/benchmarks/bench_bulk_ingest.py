@@ -0,0 +1,105 @@
+"""
+Bulk source_url ingestion throughput at varying concurrency
+
+Copies N generated files, spread over several local HTTP servers (hosts) that answer
+after a fixed delay, into a local S3 stand-in through start_job. Compares one request
+per URL with bulk requests (`source_urls`), with 1, 4, 8 and 16 IngestUrl invocations
+(threads standing in for containers) copying at once. File sizes alternate between the
+given sizes; the default includes files larger than INGEST_PART_SIZE_MB, copied in parts.
+
+    python benchmarks/bench_bulk_ingest.py --urls 100 --workers 1 4 8 16
+"""
+import argparse
+import contextlib
+import json
+import os
+import tempfile
+
+from common import load_lambda_app, timed, write_results
+from fakes import FakeLambdaClient, FakeS3, FakeTable, LocalHTTPServer
+
+BUCKET = "benchmark-bucket"
+os.environ.setdefault("BUCKET_NAME", BUCKET)
+app = load_lambda_app("start_job")
+
+
+def single_requests(urls):
+    job_ids = []
+    for url in urls:
+        response = app.lambda_handler({"body": json.dumps({"source_url": url})}, None)
+        assert response["statusCode"] == 200, response["body"]
+        job_ids.append(json.loads(response["body"])["job_id"])
+    return job_ids
+
+
+def bulk_requests(urls):
+    job_ids = []
+    for start in range(0, len(urls), app.BULK_MAX_URLS):
+        body = json.dumps({"source_urls": urls[start:start + app.BULK_MAX_URLS]})
+        response = app.lambda_handler({"body": body}, None)
+        jobs = json.loads(response["body"])["jobs"]
+        errors = [job["error"] for job in jobs if "error" in job]
+        assert not errors, errors
+        job_ids.extend(job["job_id"] for job in jobs)
+    return job_ids
+
+
+def ingest(requests, urls):
+    """Sends the requests and waits for the copies; returns the job ids."""
+    job_ids = requests(urls)
+    app.lambda_client.pool.shutdown(wait=True)
+    return job_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--urls", type=int, default=100)
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[256, 20 * 1024])
+    parser.add_argument("--hosts", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--server-latency-ms", type=float, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'mode':<8} {'workers':>7} {'docs/s':>8} {'MB/s':>7} {'db_reqs':>7} {'s3_reqs':>7} {'max_per_host':>12}")
+    with contextlib.ExitStack() as stack:
+        servers = [
+            stack.enter_context(LocalHTTPServer(latency_s=args.server_latency_ms / 1000))
+            for _ in range(args.hosts)
+        ]
+        sizes = [args.sizes_kb[i % len(args.sizes_kb)] * 1024 for i in range(args.urls)]
+        total_mb = sum(sizes) / 2 ** 20
+        for workers in args.workers:
+            for mode, requests in (("single", single_requests), ("bulk", bulk_requests)):
+                urls = [servers[i % len(servers)].url(size, f"doc{i}.pdf") for i, size in enumerate(sizes)]
+                with tempfile.TemporaryDirectory() as root:
+                    app.s3_client = s3 = FakeS3(root)
+                    table = FakeTable(latency_s=args.db_latency_ms / 1000)
+                    app.STORE.table = table
+                    app.lambda_client = FakeLambdaClient(app.ingest_handler, max_workers=workers, timeout_s=900)
+                    for server in servers:
+                        server.max_active = 0
+                    with contextlib.redirect_stderr(open(os.devnull, "w")):  # job log lines
+                        elapsed, job_ids = timed(ingest, requests, urls)
+                    jobs = [app.STORE.get_job(job_id) for job_id in job_ids]
+                    failed = [job["message"] for job in jobs if job["status"] == "error"]
+                    assert not failed and not app.lambda_client.errors, (failed, app.lambda_client.errors)
+                    assert not s3.uploads, "multipart uploads left open"
+                row = {
+                    "mode": mode, "workers": workers, "urls": args.urls, "sizes_kb": args.sizes_kb,
+                    "docs_per_s": args.urls / elapsed, "mb_per_s": total_mb / elapsed,
+                    "db_requests": table.requests, "s3_requests": s3.requests,
+                    "max_per_host": max(server.max_active for server in servers),
+                }
+                results.append(row)
+                print(f"{mode:<8} {workers:>7} {row['docs_per_s']:>8.1f} {row['mb_per_s']:>7.1f} "
+                      f"{table.requests:>7} {s3.requests:>7} {row['max_per_host']:>12}")
+
+    if args.output:
+        write_results(args.output, "bulk_ingest", results)
+
+
+if __name__ == "__main__":
+    main()
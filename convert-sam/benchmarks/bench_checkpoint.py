@@ -0,0 +1,105 @@
+"""
+Checkpointed conversion of scanned PDFs that take longer than the Lambda timeout
+
+Converts scanned PDFs (every page OCR'd) on the checkpointed route: a unit of pages at a
+time, handing the rest to a new invocation when the next unit might not finish before
+the timeout. Invocations run one after the other in this process, each with a fresh
+deadline of --timeout seconds (nothing is killed at the deadline; the report shows
+whether any invocation ran past it). The "one invocation" column is the time the same
+PDF takes converted in one go, which is what the Lambda would need without checkpoints.
+
+    python benchmarks/bench_checkpoint.py --pages 20 60 --timeout 30 --unit-pages 4
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from common import load_convert_app, timed, write_results
+from corpus import write_scanned_pdf
+from fakes import FakeLambdaClient, FakeS3, FakeTable
+
+BUCKET = "benchmark-bucket"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[20, 60])
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds per invocation")
+    parser.add_argument("--unit-pages", type=int, default=4, help="Pages per checkpointed unit")
+    parser.add_argument("--margin", type=int, default=5, help="CHECKPOINT_MIN_REMAINING_SEC")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    os.environ.update({
+        "AWS_LAMBDA_FUNCTION_NAME": "Convert", "OCR_FALLBACK": "true",
+        "CHECKPOINT_MIN_PAGES": "1", "CHECKPOINT_UNIT_PAGES": str(args.unit_pages),
+        "CHECKPOINT_MIN_REMAINING_SEC": str(args.margin),
+    })  # read when the app module is imported
+    app = load_convert_app()
+    durations = []
+    lock = threading.Lock()
+
+    def handler(event, context):
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(sys.stderr):  # metric log lines
+                return app.lambda_handler(event, context)
+        finally:
+            with lock:
+                durations.append(time.perf_counter() - start)
+
+    results = []
+    print(f"{'pages':>6} {'one_inv_s':>10} {'invocations':>12} {'max_inv_s':>10} {'total_s':>8} {'within':>7}")
+    with tempfile.TemporaryDirectory() as root:
+        s3, table = FakeS3(root), FakeTable()
+        lambda_client = FakeLambdaClient(handler, max_workers=1, timeout_s=args.timeout)
+        app.get_s3 = lambda: s3
+        app.get_lambda = lambda: lambda_client
+        app.STORE.table = table
+
+        for pages in args.pages:
+            pdf_filename = write_scanned_pdf(str(Path(root) / f"scan-{pages}p.pdf"), pages)
+            with tempfile.TemporaryDirectory() as temp_dir:
+                local_filename = str(Path(temp_dir) / "scan.pdf")
+                os.symlink(pdf_filename, local_filename)
+                one_invocation_s, _ = timed(app.convert_pdf_pages, local_filename, 1, pages)
+
+            job_id = f"job{pages:05d}"
+            key = f"input/{job_id}/scan.pdf"
+            s3.add_file(BUCKET, key, pdf_filename, "application/pdf")
+            app.STORE.create_job(job_id, f"s3://{BUCKET}/{key}")
+            durations.clear()
+            invocations = lambda_client.invocations
+            start = time.perf_counter()
+            event = {"detail": {"bucket": {"name": BUCKET}, "object": {"key": key}}}
+            lambda_client.invoke(FunctionName="Convert", InvocationType="Event", Payload=json.dumps(event))
+            while (job := app.STORE.get_job(job_id))["status"] == "started" and not lambda_client.errors:
+                time.sleep(0.05)
+            total_s = time.perf_counter() - start
+            assert job["status"] == "success", (job, lambda_client.errors)
+            while len(durations) < lambda_client.invocations - invocations:
+                time.sleep(0.01)  # the last invocation is still returning
+
+            row = {
+                "pages": pages, "one_invocation_s": one_invocation_s,
+                "invocations": lambda_client.invocations - invocations,
+                "max_invocation_s": max(durations), "total_s": total_s,
+                "within_timeout": max(durations) <= args.timeout,
+                "pages_done": int(job["pages_done"]), "continuations": job["metadata"]["continuations"],
+            }
+            results.append(row)
+            print(f"{pages:>6} {one_invocation_s:>10.1f} {row['invocations']:>12} "
+                  f"{row['max_invocation_s']:>10.1f} {total_s:>8.1f} {str(row['within_timeout']):>7}")
+
+    if args.output:
+        write_results(args.output, "checkpoint", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Module init time of the convert Lambda, measured in fresh interpreters (cold starts)
+
+    python benchmarks/bench_cold_start.py --runs 20 --output cold_start.json
+
+Reports the time to import the module and to create the AWS clients, and the cumulative
+import time of each top-level dependency (from `python -X importtime`). Save the JSON
+output per commit to track cold-start regressions.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from common import LAMBDA_DIR, percentile, write_results
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {layer!r})
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.get_s3()
+app.STORE.table
+print(json.dumps({{"import_s": imported - start, "clients_s": time.perf_counter() - imported}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Cumulative import time (seconds) of each top-level module in `-X importtime` output."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # nested imports are indented
+            packages[name.strip()] = int(cumulative) / 1e6
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--top", type=int, default=10, help="Number of dependencies to show")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env.setdefault("TABLE_NAME", "DocumentConversionJobs")
+    code = CHILD.format(
+        layer=str(LAMBDA_DIR / "layers" / "job_store" / "python"), path=str(LAMBDA_DIR / "convert")
+    )
+    totals, imports, clients = [], [], []
+    packages = defaultdict(list)
+    for _ in range(args.runs):
+        run = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        timing = json.loads(run.stdout.strip().splitlines()[-1])
+        imports.append(timing["import_s"])
+        clients.append(timing["clients_s"])
+        totals.append(timing["import_s"] + timing["clients_s"])
+        for name, seconds in parse_importtime(run.stderr).items():
+            packages[name].append(seconds)
+
+    summary = {
+        name: {"p50_s": percentile(values, 50), "p99_s": percentile(values, 99)}
+        for name, values in (("init", totals), ("import", imports), ("clients", clients))
+    }
+    dependencies = sorted(
+        ({"module": name, "p50_s": percentile(values, 50)} for name, values in packages.items()),
+        key=lambda row: row["p50_s"],
+        reverse=True,
+    )
+    for name, row in summary.items():
+        print(f"{name:>8}: p50 {row['p50_s'] * 1000:8.1f} ms   p99 {row['p99_s'] * 1000:8.1f} ms")
+    print("slowest imports (p50):")
+    for row in dependencies[:args.top]:
+        print(f"  {row['module']:<30} {row['p50_s'] * 1000:8.1f} ms")
+    if args.output:
+        write_results(
+            args.output, "cold_start",
+            {"runs": args.runs, "summary": summary, "dependencies": dependencies},
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Compression ratio and CPU cost of the output encodings, per output format
+
+Converts a text PDF (pdftotext txt and bbox-layout html) and a page image (Tesseract
+txt and hOCR) from the corpus, then streams each output through the convert Lambda's
+CompressingReader with gzip and zstd at several levels, as the upload does.
+zstd levels are skipped when the `zstandard` package is not installed.
+
+    python benchmarks/bench_compression.py --pages 20 --output compression.json
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from common import load_convert_app, write_results
+from corpus import write_text_images, write_text_pdf
+
+LEVELS = {"gzip": [1, 6, 9], "zstd": [1, 3, 9, 19]}
+READ_SIZE = 8 * 1024 * 1024  # the S3 transfer manager reads one multipart chunk at a time
+
+
+def compress_file(app, filename, encoding, level):
+    """Returns (compressed bytes, CPU seconds, wall seconds) of streaming a file through the reader."""
+    cpu, wall = time.process_time(), time.perf_counter()
+    with open(filename, "rb") as f:
+        reader = app.compression.CompressingReader(f, encoding, level)
+        while reader.read(READ_SIZE):
+            pass
+    return reader.bytes_out, time.process_time() - cpu, time.perf_counter() - wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20, help="Pages of the text PDF")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    app = load_convert_app()
+    encodings = ["gzip"] + (["zstd"] if app.compression.zstd_available() else [])
+    results = []
+    print(f"{'output':<10} {'size_kb':>8} {'encoding':<9} {'ratio':>6} {'cpu_ms/MB':>10} {'MB/s':>7}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_output = app.convert_pdf_poppler(
+            write_text_pdf(str(Path(temp_dir) / "doc.pdf"), args.pages), 1, args.pages,
+        )
+        image_output = app.convert_image_tesseract(write_text_images(temp_dir, 1)[0])
+        outputs = {
+            "pdf-txt": pdf_output['txt'], "pdf-bbox": pdf_output['html'],
+            "ocr-txt": image_output['txt'], "ocr-hocr": image_output['html'],
+        }
+        for name, filename in outputs.items():
+            size = Path(filename).stat().st_size
+            for encoding in encodings:
+                for level in LEVELS[encoding]:
+                    runs = [compress_file(app, filename, encoding, level) for _ in range(args.repeat)]
+                    compressed, cpu_s, wall_s = min(runs, key=lambda run: run[1])
+                    row = {
+                        "output": name, "bytes": size, "encoding": encoding, "level": level,
+                        "compressed_bytes": compressed, "ratio": size / compressed,
+                        "cpu_ms_per_mb": cpu_s * 1000 / (size / 2 ** 20),
+                        "mb_per_s": size / 2 ** 20 / wall_s,
+                    }
+                    results.append(row)
+                    print(f"{name:<10} {size // 1024:>8} {f'{encoding}-{level}':<9} {row['ratio']:>6.1f} "
+                          f"{row['cpu_ms_per_mb']:>10.1f} {row['mb_per_s']:>7.1f}")
+
+    if args.output:
+        write_results(args.output, "compression", results)
+
+
+if __name__ == "__main__":
+    main()
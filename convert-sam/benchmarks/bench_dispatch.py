@@ -0,0 +1,162 @@
+"""
+Per-event vs queued, batched dispatch of conversions
+
+Converts a burst of N small images the two ways S3 upload events can reach the convert
+Lambda (see the DispatchMode template parameter):
+
+- per-event: one invocation per upload. In a burst every upload lands in a new
+  container, so each conversion runs in a fresh process (a cold start).
+- queued: uploads go through a queue (a local SQS stand-in) and each container
+  receives batches of `--batch-size` records and converts CONVERT_BATCH_WORKERS of
+  them at a time.
+
+At most `--concurrency` containers run at once in both modes. Reports documents per
+second and the billed GB-seconds (memory x process lifetimes, init included).
+
+    python benchmarks/bench_dispatch.py --docs 200 --concurrency 8 --batch-workers 1 4
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import write_results
+from corpus import write_text_images
+
+BUCKET = "benchmark-bucket"
+
+
+def upload_event(key):
+    return {
+        "source": "aws.s3",
+        "detail-type": "Object Created",
+        "detail": {"bucket": {"name": BUCKET}, "object": {"key": key}},
+    }
+
+
+def run_container(mode, spec_path, batch_size):
+    """Runs in a fresh process: one container converting the documents in the spec."""
+    from common import load_convert_app
+    from fakes import FakeLambdaContext, FakeS3, FakeTable, LocalQueue
+
+    with open(spec_path) as f:
+        documents = json.load(f)
+    app = load_convert_app()
+    handler_s, failed = [], 0
+    with tempfile.TemporaryDirectory() as root:
+        s3, table = FakeS3(root), FakeTable()
+        app.get_s3 = lambda: s3
+        app.STORE.table = table
+        events = []
+        for job_id, filename in documents:
+            key = f"input/{job_id}/{os.path.basename(filename)}"
+            s3.add_file(BUCKET, key, filename, "image/png")
+            app.STORE.create_job(job_id, f"s3://{BUCKET}/{key}")
+            events.append(upload_event(key))
+
+        with contextlib.redirect_stdout(sys.stderr):  # metric log lines
+            if mode == "per-event":
+                for event in events:
+                    start = time.perf_counter()
+                    app.lambda_handler(event, FakeLambdaContext(60))
+                    handler_s.append(time.perf_counter() - start)
+            else:
+                queue = LocalQueue()
+                for event in events:
+                    queue.send(json.dumps(event))
+                while len(queue):
+                    start = time.perf_counter()
+                    _, failures = queue.poll(app.lambda_handler, FakeLambdaContext(60), batch_size)
+                    handler_s.append(time.perf_counter() - start)
+                    failed += len(failures)
+                failed += len(queue.dead_letters)
+        statuses = [table.records(job_id)[-1]["status"] for job_id, _ in documents]
+    print(json.dumps({
+        "invocations": len(handler_s), "handler_s": sum(handler_s), "failed": failed,
+        "succeeded": statuses.count("success"),
+    }))
+
+
+def start_container(mode, documents, spec_dir, env, batch_size):
+    """Runs a container process. Returns its lifetime in seconds and its report."""
+    spec_path = os.path.join(spec_dir, f"{documents[0][0]}.json")
+    with open(spec_path, "w") as f:
+        json.dump(documents, f)
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", mode, spec_path, "--batch-size", str(batch_size)],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True,
+    ).stdout
+    return time.perf_counter() - start, json.loads(output.strip().splitlines()[-1])
+
+
+def run_mode(mode, images, args, batch_workers, spec_dir):
+    documents = [(f"job{i:05d}", images[i % len(images)]) for i in range(args.docs)]
+    if mode == "per-event":
+        containers = [[document] for document in documents]
+    else:
+        containers = [documents[i::args.concurrency] for i in range(args.concurrency)]
+        containers = [c for c in containers if c]
+    env = dict(os.environ, CONVERT_BATCH_WORKERS=str(batch_workers))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        runs = list(pool.map(
+            lambda c: start_container(mode, c, spec_dir, env, args.batch_size), containers
+        ))
+    elapsed = time.perf_counter() - start
+
+    lifetimes = [lifetime for lifetime, _ in runs]
+    handler_s = sum(report["handler_s"] for _, report in runs)
+    return {
+        "mode": mode, "batch_workers": batch_workers if mode == "queued" else None,
+        "docs": args.docs, "containers": len(containers),
+        "invocations": sum(report["invocations"] for _, report in runs),
+        "succeeded": sum(report["succeeded"] for _, report in runs),
+        "failed": sum(report["failed"] for _, report in runs),
+        "docs_per_s": args.docs / elapsed,
+        "gb_seconds": args.memory_mb / 1024 * sum(lifetimes),
+        "init_share": 1 - handler_s / sum(lifetimes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="Containers running at once")
+    parser.add_argument("--batch-size", type=int, default=10, help="Queue records per invocation")
+    parser.add_argument("--batch-workers", type=int, nargs="+", default=[1, 4],
+                        help="CONVERT_BATCH_WORKERS values to run in queued mode")
+    parser.add_argument("--memory-mb", type=int, default=512, help="Lambda memory, for GB-seconds")
+    parser.add_argument("--dpi", type=int, default=75)
+    parser.add_argument("--lines", type=int, default=10)
+    parser.add_argument("--output", help="Save results to this JSON file")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_container(*args.child, args.batch_size)
+
+    results = []
+    print(f"{'mode':<10} {'workers':>7} {'containers':>10} {'invocations':>11} {'docs/s':>7} "
+          f"{'GB-s':>8} {'init_share':>10} {'failed':>6}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        images = write_text_images(work_dir, 4, 0, args.dpi, args.lines)
+        configurations = [("per-event", 1)] + [("queued", workers) for workers in args.batch_workers]
+        for mode, workers in configurations:
+            row = run_mode(mode, images, args, workers, work_dir)
+            results.append(row)
+            print(f"{mode:<10} {str(row['batch_workers'] or '-'):>7} {row['containers']:>10} "
+                  f"{row['invocations']:>11} {row['docs_per_s']:>7.2f} {row['gb_seconds']:>8.1f} "
+                  f"{row['init_share']:>10.0%} {row['failed']:>6}")
+
+    if args.output:
+        write_results(args.output, "dispatch", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+source_url ingestion: streaming multipart upload vs downloading the whole file first
+
+Serves generated files from a local HTTP server and copies them into a local S3
+stand-in, either with start_job's streaming upload or the way start_job used to (whole
+body in memory, then one PutObject). Each run is a separate process so its peak memory
+can be measured.
+
+    python benchmarks/bench_ingest.py --sizes-mb 1 16 128 1024
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import load_lambda_app, write_results
+from fakes import FakeS3, FakeTable, LocalHTTPServer
+
+BUCKET = "benchmark-bucket"
+
+
+def run_child(mode, size, chunked):
+    app = load_lambda_app("start_job")
+    import requests
+
+    with tempfile.TemporaryDirectory() as root, LocalHTTPServer(send_length=not chunked) as server:
+        s3 = FakeS3(root)
+        app.s3_client = s3
+        app.STORE.table = FakeTable()
+        url = server.url(size)
+        baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        start = time.perf_counter()
+        if mode == "stream":
+            app.stream_url_to_s3(url, BUCKET, "input/job/document.pdf")
+        else:
+            response = requests.get(url)
+            response.raise_for_status()
+            s3.put_object(Bucket=BUCKET, Key="input/job/document.pdf", Body=response.content,
+                          ContentType=response.headers.get("Content-Type"))
+        elapsed = time.perf_counter() - start
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        assert s3.head_object(Bucket=BUCKET, Key="input/job/document.pdf")["ContentLength"] == size
+    print(json.dumps({
+        "mode": mode, "size_mb": size / 2 ** 20, "chunked": chunked, "s3_requests": s3.requests,
+        "seconds": elapsed, "mb_per_s": size / 2 ** 20 / elapsed,
+        "peak_rss_mb": peak_mb, "added_rss_mb": peak_mb - baseline_mb,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 16, 128, 1024])
+    parser.add_argument("--modes", nargs="+", choices=["stream", "buffered"], default=["stream", "buffered"])
+    parser.add_argument("--chunked", action="store_true",
+                        help="Serve without Content-Length (chunked transfer encoding)")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(args.child[0], int(args.child[1]), args.chunked)
+
+    results = []
+    print(f"{'size_mb':>8} {'mode':<9} {'s3_reqs':>7} {'seconds':>8} {'MB/s':>7} {'added_rss_mb':>12}")
+    for size_mb in args.sizes_mb:
+        for mode in args.modes:
+            command = [sys.executable, __file__, "--child", mode, str(size_mb * 2 ** 20)]
+            if args.chunked:
+                command.append("--chunked")
+            output = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True)
+            row = json.loads(output.stdout.strip().splitlines()[-1])
+            results.append(row)
+            print(f"{size_mb:>8} {mode:<9} {row['s3_requests']:>7} {row['seconds']:>8.2f} "
+                  f"{row['mb_per_s']:>7.1f} {row['added_rss_mb']:>12.1f}")
+
+    if args.output:
+        write_results(args.output, "ingest", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Batch job-status requests vs one request per job
+
+Checks the status of N jobs through the query_jobs Lambda handler, either with one
+request per job_id or with batch requests of up to BATCH_MAX_JOBS ids, against an
+in-memory DynamoDB table. The round trip of each API request (API Gateway + Lambda
+invocation) and of each DynamoDB request are modeled with fixed latencies.
+
+    python benchmarks/bench_job_status.py --jobs 10 100 1000 --output status.json
+"""
+import argparse
+import json
+
+from common import load_lambda_app, timed, write_results
+from fakes import FakeDynamoDB, FakeTable
+
+app = load_lambda_app("query_jobs")
+
+
+def make_table(count, latency_s):
+    table = FakeTable(app.TABLE.name, latency_s=latency_s)
+    for i in range(count):
+        table.put_item(Item={
+            "job_id": f"job{i:05d}", "created_at": app.JOB_STATE_KEY,
+            "started_at": "2024-01-01T00:00:00", "url": f"s3://bucket/input/job{i:05d}/doc.pdf",
+            "status": ("started", "success", "error")[i % 3],
+            "urls": {"txt": f"https://bucket.s3.local/output/job{i:05d}/doc.txt"},
+        })
+    return table
+
+
+def single_requests(job_ids, api_latency_s):
+    statuses = {}
+    for job_id in job_ids:
+        app.time.sleep(api_latency_s)
+        response = app.lambda_handler({"queryStringParameters": {"job_id": job_id}}, None)
+        statuses[job_id] = json.loads(response["body"]).get("status")
+    return statuses, len(job_ids)
+
+
+def batch_requests(job_ids, api_latency_s):
+    statuses, calls = {}, 0
+    for start in range(0, len(job_ids), app.BATCH_MAX_JOBS):
+        app.time.sleep(api_latency_s)
+        body = json.dumps({"job_ids": job_ids[start:start + app.BATCH_MAX_JOBS]})
+        response = app.lambda_handler({"body": body}, None)
+        statuses.update(
+            (job_id, state["status"]) for job_id, state in json.loads(response["body"])["jobs"].items()
+        )
+        calls += 1
+    return statuses, calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--api-latency-ms", type=float, default=30,
+                        help="Round trip of one API request, excluding the handler")
+    parser.add_argument("--db-latency-ms", type=float, default=5,
+                        help="Round trip of one DynamoDB request")
+    parser.add_argument("--unprocessed", type=float, default=0.0,
+                        help="Share of BatchGetItem keys returned unprocessed, to exercise retries")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'jobs':>6} {'mode':<7} {'api_calls':>9} {'db_reqs':>8} {'total_s':>8} {'jobs/s':>9}")
+    for count in args.jobs:
+        table = make_table(count, args.db_latency_ms / 1000)
+        app.TABLE = table
+        app.dynamodb = FakeDynamoDB(table, unprocessed_fraction=args.unprocessed)
+        job_ids = [f"job{i:05d}" for i in range(count)]
+        expected = None
+        for mode, func in (("single", single_requests), ("batch", batch_requests)):
+            table.requests = 0
+            app.STATE_CACHE = app.StateCache(app.STATE_CACHE.max_entries, app.STATE_CACHE.ttl_sec)
+            elapsed, (statuses, calls) = timed(func, job_ids, args.api_latency_ms / 1000)
+            expected = expected or statuses
+            assert statuses == expected, f"{mode} statuses differ"
+            row = {
+                "jobs": count, "mode": mode, "api_calls": calls,
+                "db_requests": table.requests, "total_s": elapsed, "jobs_per_s": count / elapsed,
+            }
+            results.append(row)
+            print(f"{count:>6} {mode:<7} {calls:>9} {table.requests:>8} {elapsed:>8.3f} {count / elapsed:>9.1f}")
+
+    if args.output:
+        write_results(args.output, "job_status", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Fixed-interval polling vs long polling of the job-status endpoint
+
+A background thread finishes a job after a given time while a client waits for it,
+either polling the query_jobs handler at a fixed interval (the old web client) or
+long polling with ?wait=&last_status=. Reports the API requests and DynamoDB reads each
+client made and how late it saw the change. Times are in seconds of real time, so the
+defaults are scaled down from the 5 s / 20 s used in production.
+
+    python benchmarks/bench_long_poll.py --job-seconds 1 3 6
+"""
+import argparse
+import json
+import threading
+import time
+
+from common import load_lambda_app, write_results
+from fakes import FakeLambdaContext, FakeTable
+
+app = load_lambda_app("query_jobs")
+
+
+def finish_later(table, job_id, delay_s):
+    def finish():
+        time.sleep(delay_s)
+        table.update_item(
+            Key={"job_id": job_id, "created_at": app.JOB_STATE_KEY},
+            UpdateExpression="SET #status = :status, completed_at = :now",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":status": "success", ":now": "now"},
+        )
+    thread = threading.Thread(target=finish)
+    thread.start()
+    return thread
+
+
+def poll(job_id, interval_s, wait_s, timeout_s):
+    """Runs a client until it sees the job finish. Returns (API requests, seconds)."""
+    start, requests, last_status = time.monotonic(), 0, "started"  # as just created
+    while True:
+        params = {"job_id": job_id}
+        if wait_s:
+            params.update(wait=str(wait_s), last_status=last_status)
+        response = app.lambda_handler({"queryStringParameters": params}, FakeLambdaContext(timeout_s))
+        requests += 1
+        last_status = json.loads(response["body"])["status"]
+        if last_status != "started":
+            return requests, time.monotonic() - start
+        time.sleep(interval_s)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--job-seconds", type=float, nargs="+", default=[1, 3, 6])
+    parser.add_argument("--poll-interval", type=float, default=1.25,
+                        help="Interval of the fixed-interval client")
+    parser.add_argument("--wait", type=float, default=5, help="Maximum wait of a long poll")
+    parser.add_argument("--db-latency-ms", type=float, default=5)
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    app.LONG_POLL_MAX_WAIT_SEC = args.wait
+    results = []
+    print(f"{'job_s':>6} {'mode':<9} {'requests':>8} {'db_reads':>8} {'late_s':>7}")
+    for job_seconds in args.job_seconds:
+        for mode, interval, wait in (("interval", args.poll_interval, 0), ("long", 0.1, args.wait)):
+            table = FakeTable(app.TABLE.name, latency_s=args.db_latency_ms / 1000)
+            app.TABLE = table
+            app.STATE_CACHE = app.StateCache(app.STATE_CACHE.max_entries, app.STATE_CACHE.ttl_sec)
+            table.put_item(Item={"job_id": "job", "created_at": app.JOB_STATE_KEY, "status": "started"})
+            table.requests = 0
+            thread = finish_later(table, "job", job_seconds)
+            requests, elapsed = poll("job", interval, wait, timeout_s=wait + 5)
+            thread.join()
+            reads = table.requests - 1  # the update of finish_later
+            row = {
+                "job_s": job_seconds, "mode": mode, "requests": requests,
+                "db_reads": reads, "late_s": elapsed - job_seconds,
+            }
+            results.append(row)
+            print(f"{job_seconds:>6.1f} {mode:<9} {requests:>8} {reads:>8} {row['late_s']:>7.2f}")
+
+    if args.output:
+        write_results(args.output, "long_poll", results)
+
+
+if __name__ == "__main__":
+    main()
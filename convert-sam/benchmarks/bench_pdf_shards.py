@@ -0,0 +1,56 @@
+"""
+Wall time of page-sharded PDF conversion versus page count and worker count
+
+    python benchmarks/bench_pdf_shards.py --pages 10 100 400 --workers 1 2 4
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from common import load_convert_app, timed, write_results
+from corpus import write_text_pdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--shard-pages", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    app = load_convert_app()
+    results = []
+    print(f"{'pages':>6} {'workers':>8} {'serial_s':>9} {'sharded_s':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for pages in args.pages:
+            pdf_filename = write_text_pdf(str(Path(temp_dir) / f"doc{pages}.pdf"), pages)
+            serial = min(
+                timed(app.convert_pdf_poppler, pdf_filename, 1, pages)[0]
+                for _ in range(args.repeat)
+            )
+            for workers in args.workers:
+                sharded = min(
+                    timed(
+                        app.convert_pdf_poppler_sharded,
+                        pdf_filename,
+                        pages_per_shard=args.shard_pages,
+                        max_workers=workers,
+                    )[0]
+                    for _ in range(args.repeat)
+                )
+                print(f"{pages:>6} {workers:>8} {serial:>9.3f} {sharded:>10.3f} {serial / sharded:>8.2f}")
+                results.append({
+                    "pages": pages,
+                    "workers": workers,
+                    "shard_pages": args.shard_pages,
+                    "serial_s": serial,
+                    "sharded_s": sharded,
+                })
+    if args.output:
+        write_results(args.output, "pdf_shards", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+OCR time and peak memory with and without image preprocessing, by image resolution
+
+Makes phone-photo-like inputs from the text corpus: a page rendered at the resolution
+that gives the requested megapixels, tinted, rotated by a few degrees and saved as an
+RGB JPEG. Each is OCR'd by Tesseract as uploaded ("raw") and after preprocessing.py
+("preprocessed", steps from PREPROCESS_STEPS, default all of them). Every run is a
+separate process, so peak memory is measured per run; `words` counts the recognized
+words that are in the corpus vocabulary, to check that accuracy holds.
+
+Needs numpy and Pillow, besides tesseract and poppler-utils.
+
+    python benchmarks/bench_preprocess.py --megapixels 1 4 12 24
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import load_convert_app, write_results
+from corpus import PAGE_HEIGHT, PAGE_WIDTH, WORDS, write_text_images
+
+PAGE_AREA_SQ_IN = PAGE_WIDTH / 72 * PAGE_HEIGHT / 72
+
+
+def write_photo(directory, megapixels, angle, seed=0):
+    """Writes a tinted, rotated RGB JPEG of a text page with about `megapixels` pixels."""
+    from PIL import Image
+
+    dpi = round(math.sqrt(megapixels * 1e6 / PAGE_AREA_SQ_IN))
+    page = write_text_images(directory, 1, seed, dpi)[0]
+    with Image.open(page) as gray:
+        photo = Image.merge("RGB", (
+            gray.point(lambda level: int(40 + level * 0.85)),
+            gray.point(lambda level: int(35 + level * 0.8)),
+            gray.point(lambda level: int(30 + level * 0.7)),
+        ))
+    photo = photo.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=(220, 205, 180))
+    filename = str(Path(directory) / f"photo-{megapixels}mp.jpg")
+    photo.save(filename, quality=90, dpi=(72, 72))  # cameras record a nominal 72 dpi
+    return filename
+
+
+def run_child(mode, filename):
+    app = load_convert_app()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data = Path(filename).read_bytes()
+        start = time.perf_counter()
+        if mode == "preprocessed":
+            data = app.PREPROCESSOR.process(data)
+        preprocessed = time.perf_counter()
+        image_filename = str(Path(temp_dir) / ("image.png" if mode == "preprocessed" else "image.jpg"))
+        Path(image_filename).write_bytes(data)
+        output = app.convert_image_tesseract(image_filename)
+        done = time.perf_counter()
+        text = Path(output['txt']).read_text(encoding="utf-8")
+    vocabulary = set(WORDS)
+    print(json.dumps({
+        "mode": mode, "ocr_input_bytes": len(data),
+        "preprocess_s": preprocessed - start, "ocr_s": done - preprocessed, "total_s": done - start,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+        "peak_tesseract_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024,
+        "words": sum(word.strip(".,").lower() in vocabulary for word in text.split()),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 4, 12, 24])
+    parser.add_argument("--angle", type=float, default=2.0, help="Rotation of the photos, in degrees")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_child(*args.child)
+
+    env = dict(os.environ, TESSERACT_ENGINE="subprocess")
+    env.setdefault("PREPROCESS_STEPS", "resize,grayscale,binarize,deskew")
+    results = []
+    print(f"{'MP':>5} {'mode':<13} {'input_kb':>8} {'prep_s':>7} {'ocr_s':>7} {'total_s':>7} "
+          f"{'rss_mb':>7} {'tess_mb':>8} {'words':>6}")
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        for megapixels in args.megapixels:
+            photo_dir = Path(corpus_dir) / f"{megapixels}mp"
+            photo_dir.mkdir()
+            filename = write_photo(str(photo_dir), megapixels, args.angle)
+            for mode in ("raw", "preprocessed"):
+                # raw runs don't import numpy and Pillow, as in a Lambda without preprocessing
+                mode_env = dict(env, PREPROCESS_STEPS="") if mode == "raw" else env
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", mode, filename],
+                    env=mode_env, stdout=subprocess.PIPE, text=True, check=True,
+                ).stdout
+                row = {"megapixels": megapixels, **json.loads(output.strip().splitlines()[-1])}
+                results.append(row)
+                print(f"{megapixels:>5g} {mode:<13} {row['ocr_input_bytes'] // 1024:>8} "
+                      f"{row['preprocess_s']:>7.2f} {row['ocr_s']:>7.2f} {row['total_s']:>7.2f} "
+                      f"{row['peak_rss_mb']:>7} {row['peak_tesseract_rss_mb']:>8} {row['words']:>6}")
+
+    if args.output:
+        write_results(args.output, "preprocess", results)
+
+
+if __name__ == "__main__":
+    main()
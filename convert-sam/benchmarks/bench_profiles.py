@@ -0,0 +1,81 @@
+"""
+Latency and CPU time saved by conversion profiles
+
+Converts a text PDF, a scanned PDF (OCR_FALLBACK) and a page image from the corpus with
+several profiles, as the convert Lambda does for a job started with them. CPU time
+includes the child processes (pdftotext, pdftoppm, tesseract), which do most of the work.
+
+    python benchmarks/bench_profiles.py --pages 20 --output profiles.json
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from common import load_convert_app, write_results
+from corpus import write_scanned_pdf, write_text_images, write_text_pdf
+
+PROFILES = {
+    "default": None,
+    "txt": {"formats": ["txt"]},
+    "html": {"formats": ["html"]},
+    "txt-first-3": {"formats": ["txt"], "last_page": 3},
+    "ocr-100dpi": {"dpi": 100},
+}
+
+
+def convert(app, profile, filename, content_type):
+    """Returns (wall seconds, CPU seconds including children) of converting a file."""
+    start, cpu = time.perf_counter(), os.times()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_filename = str(Path(temp_dir) / Path(filename).name)
+        os.symlink(filename, local_filename)  # outputs are written next to the input
+        app.convert_file(local_filename, content_type, None, profile)
+    end = os.times()
+    cpu_s = sum(end[i] - cpu[i] for i in range(4))  # user, system, children user/system
+    return time.perf_counter() - start, cpu_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20, help="Pages of the PDFs")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    # every page is converted, in one shard (read when the app module is imported)
+    os.environ.update({"OCR_FALLBACK": "true", "PDF_SHARD_PAGES": str(args.pages)})
+    app = load_convert_app()
+    from conversion_profile import ConversionProfile  # the layer is on the path once the app is loaded
+
+    results = []
+    print(f"{'document':<12} {'profile':<12} {'wall_s':>7} {'cpu_s':>7} {'saved':>6}")
+    with tempfile.TemporaryDirectory() as root:
+        documents = {
+            "text-pdf": (write_text_pdf(str(Path(root) / "text.pdf"), args.pages), "application/pdf"),
+            "scanned-pdf": (write_scanned_pdf(str(Path(root) / "scan.pdf"), args.pages), "application/pdf"),
+            "image": (write_text_images(root, 1)[0], "image/png"),
+        }
+        for document, (filename, content_type) in documents.items():
+            baseline = None
+            for name, profile in PROFILES.items():
+                runs = [
+                    convert(app, ConversionProfile.from_dict(profile), filename, content_type)
+                    for _ in range(args.repeat)
+                ]
+                wall_s, cpu_s = min(runs)
+                baseline = baseline or cpu_s
+                row = {
+                    "document": document, "profile": name, "settings": profile,
+                    "wall_s": wall_s, "cpu_s": cpu_s, "cpu_saved": 1 - cpu_s / baseline,
+                }
+                results.append(row)
+                print(f"{document:<12} {name:<12} {wall_s:>7.2f} {cpu_s:>7.2f} {row['cpu_saved']:>6.0%}")
+
+    if args.output:
+        write_results(args.output, "profiles", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Latency distribution of a mixed workload, with and without size/page-count routing
+
+Converts a reproducible mix of small images, page scans and PDFs of 2 to 200 pages, one
+document at a time, and measures each job from the upload event to its final status.
+Each configuration runs in a fresh process with its own environment:
+
+- uniform: every document is downloaded and converted by one invocation; PDFs in shards
+  of 10 pages
+- routed: small inputs are converted in memory, PDFs are sharded from 20 pages and
+  fanned out in chunks of 50 pages (each chunk a separate invocation) from 100 pages
+
+Fanned-out chunks run on threads of the benchmark process, each standing in for a
+container, so they share the CPUs of the machine running the benchmark.
+
+    python benchmarks/bench_routing.py --docs 40 --output routing.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from common import percentile, write_results
+from corpus import write_text_images, write_text_pdf
+
+BUCKET = "benchmark-bucket"
+# class -> (weight in the mix, corpus spec)
+WORKLOAD = {
+    "receipt": (50, {"kind": "image", "dpi": 75, "lines": 10}),
+    "image-page": (20, {"kind": "image", "dpi": 200, "lines": 45}),
+    "pdf-2p": (15, {"kind": "pdf", "pages": 2}),
+    "pdf-30p": (10, {"kind": "pdf", "pages": 30}),
+    "pdf-200p": (5, {"kind": "pdf", "pages": 200}),
+}
+CONFIGURATIONS = {
+    "uniform": {"IN_MEMORY_MAX_BYTES": "0", "PDF_SHARD_PAGES": "10"},
+    "routed": {
+        "IN_MEMORY_MAX_BYTES": str(256 * 1024), "PDF_SHARD_PAGES": "10", "PDF_SHARD_MIN_PAGES": "20",
+        "FANOUT_MIN_PAGES": "100", "FANOUT_CHUNK_PAGES": "50",
+    },
+}
+
+
+def make_documents(directory):
+    """Writes one document per workload class. Returns {class: (filename, content_type)}."""
+    documents = {}
+    for name, (_, spec) in WORKLOAD.items():
+        if spec["kind"] == "image":
+            image_dir = Path(directory) / name
+            image_dir.mkdir()
+            filename = write_text_images(image_dir, 1, 0, spec["dpi"], spec["lines"])[0]
+            documents[name] = (filename, "image/png")
+        else:
+            filename = write_text_pdf(str(Path(directory) / f"{name}.pdf"), spec["pages"])
+            documents[name] = (filename, "application/pdf")
+    return documents
+
+
+def run_configuration(spec_path, chunk_workers):
+    """Runs in a fresh process: converts the documents of the workload one at a time."""
+    from common import load_convert_app
+    from fakes import FakeLambdaClient, FakeS3, FakeTable
+
+    with open(spec_path) as f:
+        workload = json.load(f)
+    app = load_convert_app()
+    with tempfile.TemporaryDirectory() as root:
+        s3, table = FakeS3(root), FakeTable()
+        lambda_client = FakeLambdaClient(app.lambda_handler, max_workers=chunk_workers)
+        app.get_s3 = lambda: s3
+        app.get_lambda = lambda: lambda_client
+        app.STORE.table = table
+
+        rows = []
+        for i, (name, filename, content_type) in enumerate(workload):
+            job_id = f"job{i:05d}"
+            key = f"input/{job_id}/{os.path.basename(filename)}"
+            s3.add_file(BUCKET, key, filename, content_type)
+            app.STORE.create_job(job_id, f"s3://{BUCKET}/{key}")
+            event = {"detail": {"bucket": {"name": BUCKET}, "object": {"key": key}}}
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stderr):  # metric log lines
+                app.lambda_handler(event, None)
+                while (job := app.STORE.get_job(job_id))["status"] == "started":
+                    time.sleep(0.005)  # fanned out: wait for the merge
+            elapsed = time.perf_counter() - start
+            assert job["status"] == "success", job
+            rows.append({"class": name, "route": job["metadata"].get("route"), "seconds": elapsed})
+    print(json.dumps({"jobs": rows, "invocations": lambda_client.invocations}))
+
+
+def summarize(latencies):
+    return {f"p{pct}_s": percentile(latencies, pct) for pct in (50, 95, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=40, help="Documents in the mix")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--configurations", nargs="+", choices=list(CONFIGURATIONS),
+                        default=list(CONFIGURATIONS))
+    parser.add_argument("--chunk-workers", type=int, default=4,
+                        help="Fanned-out chunks converted at once")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_configuration(args.child, args.chunk_workers)
+
+    rng = random.Random(args.seed)
+    names = rng.choices(list(WORKLOAD), weights=[weight for weight, _ in WORKLOAD.values()], k=args.docs)
+    results = []
+    print(f"{'configuration':<14} {'class':<11} {'jobs':>4} {'routes':<18} {'p50_s':>7} {'p95_s':>7} {'p99_s':>7}")
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        documents = make_documents(corpus_dir)
+        spec_path = os.path.join(corpus_dir, "workload.json")
+        with open(spec_path, "w") as f:
+            json.dump([(name, *documents[name]) for name in names], f)
+
+        for configuration in args.configurations:
+            env = dict(os.environ, AWS_LAMBDA_FUNCTION_NAME="Convert", **CONFIGURATIONS[configuration])
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", spec_path, "--chunk-workers", str(args.chunk_workers)],
+                env=env, stdout=subprocess.PIPE, text=True, check=True,
+            ).stdout
+            report = json.loads(output.strip().splitlines()[-1])
+            by_class = defaultdict(list)
+            for job in report["jobs"]:
+                by_class[job["class"]].append(job)
+            by_class["all"] = report["jobs"]
+
+            for name, jobs in by_class.items():
+                routes = Counter(job["route"] for job in jobs)
+                row = {
+                    "configuration": configuration, "class": name, "jobs": len(jobs),
+                    "routes": dict(routes), **summarize([job["seconds"] for job in jobs]),
+                }
+                results.append(row)
+                route_text = ",".join(f"{route}:{count}" for route, count in sorted(routes.items()))
+                print(f"{configuration:<14} {name:<11} {len(jobs):>4} {route_text:<18} "
+                      f"{row['p50_s']:>7.3f} {row['p95_s']:>7.3f} {row['p99_s']:>7.3f}")
+
+    if args.output:
+        write_results(args.output, "routing", results)
+
+
+if __name__ == "__main__":
+    main()
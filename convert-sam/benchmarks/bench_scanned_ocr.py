@@ -0,0 +1,56 @@
+"""
+Throughput of the scanned-PDF OCR fallback, in pages per second per vCPU
+
+    python benchmarks/bench_scanned_ocr.py --pages 4 16 --workers 1 2 4
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from common import load_convert_app, timed, write_results
+from corpus import write_scanned_pdf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--scan-dpi", type=int, default=150, help="Resolution of the synthetic scans")
+    parser.add_argument("--ocr-dpi", type=int, default=300)
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    app = load_convert_app()
+    vcpus = app.available_cpus()
+    results = []
+    print(f"vCPUs available: {vcpus}")
+    print(f"{'pages':>6} {'workers':>8} {'elapsed_s':>10} {'pages/s':>8} {'pages/s/vCPU':>13}")
+    for pages in args.pages:
+        for workers in args.workers:
+            # fresh directory per run, so no OCR output is reused
+            with tempfile.TemporaryDirectory() as temp_dir:
+                pdf_filename = write_scanned_pdf(
+                    str(Path(temp_dir) / "scan.pdf"), pages, dpi=args.scan_dpi
+                )
+                output = app.convert_pdf_poppler(pdf_filename, 1, pages)
+                elapsed, _ = timed(
+                    app.ocr_fallback, pdf_filename, output, 1, args.ocr_dpi, workers
+                )
+            throughput = pages / elapsed
+            used_vcpus = min(workers, vcpus)
+            print(f"{pages:>6} {workers:>8} {elapsed:>10.2f} {throughput:>8.2f} {throughput / used_vcpus:>13.3f}")
+            results.append({
+                "pages": pages,
+                "workers": workers,
+                "vcpus": used_vcpus,
+                "ocr_dpi": args.ocr_dpi,
+                "elapsed_s": elapsed,
+                "pages_per_s": throughput,
+                "pages_per_s_per_vcpu": throughput / used_vcpus,
+            })
+    if args.output:
+        write_results(args.output, "scanned_ocr", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Per-image OCR latency of the tesseract command versus the in-process engine, on a cold
+start (first image in a fresh process) and warm (later images)
+
+    python benchmarks/bench_tesseract_engine.py --images 20 --dpi 100
+
+The in-process engine needs libtesseract on the library path (see TESSERACT_LIBRARY).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from common import percentile, write_results
+from corpus import write_text_images
+
+
+def child(images):
+    """Runs in a fresh process: imports the Lambda module and OCRs each image once."""
+    start = time.perf_counter()
+    from common import load_convert_app
+    app = load_convert_app()
+    init_s = time.perf_counter() - start
+    latencies = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for index, image in enumerate(images):
+            start = time.perf_counter()
+            app.convert_image_tesseract(image, Path(temp_dir) / f"out{index}")
+            latencies.append(time.perf_counter() - start)
+    print(json.dumps({"capi": app.TESSERACT_CAPI, "init_s": init_s, "latencies": latencies}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--dpi", type=int, default=100, help="Image resolution (smaller = smaller images)")
+    parser.add_argument("--lines", type=int, default=10, help="Lines of text per image")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    parser.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    results = []
+    print(f"{'engine':>11} {'init_s':>7} {'cold_s':>7} {'warm_p50_s':>11} {'warm_p95_s':>11}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        images = write_text_images(temp_dir, args.images, dpi=args.dpi, lines=args.lines)
+        for engine in ("subprocess", "capi"):
+            env = dict(os.environ, TESSERACT_ENGINE=engine)
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", *images],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            run = json.loads(output.strip().splitlines()[-1])
+            if engine == "capi" and not run["capi"]:
+                print("capi: libtesseract not available, skipped")
+                continue
+            cold, warm = run["latencies"][0], run["latencies"][1:]
+            row = {
+                "engine": engine,
+                "images": len(images),
+                "init_s": run["init_s"],
+                "cold_s": cold,
+                "warm_p50_s": percentile(warm, 50),
+                "warm_p95_s": percentile(warm, 95),
+            }
+            print(f"{engine:>11} {row['init_s']:>7.3f} {cold:>7.3f} {row['warm_p50_s']:>11.3f} {row['warm_p95_s']:>11.3f}")
+            results.append(row)
+    if args.output:
+        write_results(args.output, "tesseract_engine", results)
+
+
+if __name__ == "__main__":
+    main()
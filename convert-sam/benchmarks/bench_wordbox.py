@@ -0,0 +1,117 @@
+"""
+Reading word coordinates from the wbox output instead of parsing the html output
+
+Converts a text PDF (bbox-layout html) and page images (hOCR) from the corpus, writes
+the word boxes of each html output, then compares getting every word with its bounding
+box from:
+
+- html-tree: parsing the whole html document (ElementTree), as downstream jobs do
+- wbox-load: opening the wbox file (memory-mapped) and reading every word
+- wbox-columns: reading only the bounding box column, in place (e.g. to filter words by
+  position before reading their text)
+
+and reports the file sizes, the time to write the wbox and the time and peak Python
+memory (tracemalloc) of each reader. The memory-mapped wbox is not counted: its pages
+are read from the page cache, and only those that are touched.
+
+    python benchmarks/bench_wordbox.py --pages 20 --images 5 --output wordbox.json
+"""
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from common import load_convert_app, write_results
+from corpus import write_text_images, write_text_pdf
+
+
+def html_tree_words(filename):
+    """Words with their boxes from the whole parsed html document (bbox-layout or hOCR)."""
+    words = []
+    for elem in ET.parse(filename).iter():
+        name = elem.tag.rsplit("}", 1)[-1]
+        if name == "word":
+            bbox = tuple(float(elem.get(attr)) for attr in ("xMin", "yMin", "xMax", "yMax"))
+            words.append((elem.text, bbox))
+        elif elem.get("class") == "ocrx_word":
+            fields = elem.get("title").split(";")[0].split()
+            words.append(("".join(elem.itertext()).strip(), tuple(float(v) for v in fields[1:5])))
+    return len(words)
+
+
+def wbox_words(wordbox, filename):
+    with wordbox.WordBoxes.open(filename) as boxes:
+        return sum(1 for _ in boxes.words())
+
+
+def wbox_columns(wordbox, filename):
+    with wordbox.WordBoxes.open(filename) as boxes:
+        bbox = boxes.word_bbox
+        return sum(1 for i in range(0, len(bbox), 4) if bbox[i + 2] > bbox[i])
+
+
+def measure(func, *args, repeat=3):
+    """Returns (best seconds, peak traced bytes) of calling func."""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20, help="Pages of the text PDF")
+    parser.add_argument("--images", type=int, default=5, help="Page images to OCR")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args()
+
+    app = load_convert_app()
+    wordbox = app.wordbox
+    results = []
+    print(f"{'document':<14} {'html_kb':>8} {'wbox_kb':>8} {'write_ms':>9} "
+          f"{'reader':<13} {'ms':>8} {'peak_kb':>8}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_output = app.convert_pdf_poppler(
+            write_text_pdf(str(Path(temp_dir) / "doc.pdf"), args.pages), 1, args.pages,
+        )
+        documents = {f"pdf-{args.pages}p": pdf_output['html']}
+        for image in write_text_images(temp_dir, args.images):
+            documents[f"hocr-{Path(image).stem}"] = app.convert_image_tesseract(image)['html']
+
+        for document, html in documents.items():
+            wbox = app.add_wordbox({'html': html})['wbox']
+            write_s, _ = measure(app.add_wordbox, {'html': html}, repeat=args.repeat)
+            html_bytes, wbox_bytes = Path(html).stat().st_size, Path(wbox).stat().st_size
+            readers = {
+                "html-tree": (html_tree_words, html),
+                "wbox-load": (wbox_words, wordbox, wbox),
+                "wbox-columns": (wbox_columns, wordbox, wbox),
+            }
+            for reader, (func, *func_args) in readers.items():
+                read_s, peak = measure(func, *func_args, repeat=args.repeat)
+                row = {
+                    "document": document, "html_bytes": html_bytes, "wbox_bytes": wbox_bytes,
+                    "write_s": write_s, "reader": reader, "read_s": read_s, "peak_bytes": peak,
+                }
+                results.append(row)
+                print(f"{document:<14} {html_bytes // 1024:>8} {wbox_bytes // 1024:>8} "
+                      f"{write_s * 1000:>9.1f} {reader:<13} {read_s * 1000:>8.2f} {peak // 1024:>8}")
+
+    if args.output:
+        write_results(args.output, "wordbox", results)
+
+
+if __name__ == "__main__":
+    main()
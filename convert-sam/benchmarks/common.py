@@ -0,0 +1,71 @@
+"""
+Shared helpers for the convert-sam benchmarks
+
+The benchmarks run the Lambda code locally, so poppler-utils and tesseract must be on
+the PATH of the machine running them.
+"""
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+LAMBDA_DIR = ROOT / "src" / "lambda"
+
+
+def load_lambda_app(function):
+    """
+    Imports the module (`app`) of a Lambda function in src/lambda. All functions name
+    their module `app`, so a process can only load one of them.
+    """
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("TABLE_NAME", "DocumentConversionJobs")
+    sys.path.insert(0, str(LAMBDA_DIR / "layers" / "job_store" / "python"))
+    sys.path.insert(0, str(LAMBDA_DIR / function))
+    import app
+    return app
+
+
+def load_convert_app():
+    """Imports the convert Lambda module (`app`) from src/lambda/convert."""
+    return load_lambda_app("convert")
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def timed(func, *args, **kwargs):
+    """Calls func and returns (elapsed seconds, result)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, name, results):
+    """Saves benchmark results as JSON, tagged with the current git revision."""
+    with open(path, "w") as f:
+        json.dump(
+            {"benchmark": name, "revision": git_revision(), "results": results},
+            f,
+            indent=2,
+        )
+    print(f"Results written to {path}")
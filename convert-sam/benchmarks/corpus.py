@@ -0,0 +1,158 @@
+"""
+Generates a reproducible corpus of PDF documents for the benchmarks
+
+PDFs are written directly (no third party libraries) so the same seed always produces
+the same bytes. Scanned (image-only) PDFs are made by rendering text PDFs with the
+Poppler `pdftoppm` command.
+"""
+import random
+import subprocess
+import tempfile
+import zlib
+from pathlib import Path
+
+WORDS = (
+    "invoice contract party agreement payment total amount date term service "
+    "customer account balance section clause shall provide notice period rate "
+    "schedule delivery order number reference signature witness effective"
+).split()
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _stream(data):
+    return b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream"
+
+
+def write_pdf(path, pages):
+    """
+    Writes a PDF file.
+
+    Args:
+        path (str): Output path.
+        pages (list): One (content_stream, resources, extra_objects) tuple per page.
+        `resources` is a PDF dictionary (bytes) that may refer to the extra objects
+        as `{0} 0 R`, `{1} 0 R`, ... in the order given.
+    """
+    objects = [None, None]  # catalog and page tree are filled in last
+    font_id = len(objects) + 1
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for content, resources, extra_objects in pages:
+        extra_ids = []
+        for obj in extra_objects:
+            objects.append(obj)
+            extra_ids.append(len(objects))
+        resources = resources.replace(b"{font}", b"%d 0 R" % font_id)
+        for index, obj_id in enumerate(extra_ids):
+            resources = resources.replace(b"{%d}" % index, b"%d 0 R" % obj_id)
+        objects.append(_stream(content))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources %s /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, resources, content_id)
+        )
+        page_ids.append(len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for obj_id, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % obj_id + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, xref
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def text_page(rng, lines=45, font_size=11):
+    """Content of a page filled with `lines` lines of random words."""
+    leading = font_size + 3
+    ops = [b"BT /F1 %d Tf %d TL 72 %d Td" % (font_size, leading, PAGE_HEIGHT - 72)]
+    for _ in range(lines):
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 12)))
+        ops.append(b"(%s) Tj T*" % _escape(line).encode("latin-1"))
+    ops.append(b"ET")
+    return b"\n".join(ops), b"<< /Font << /F1 {font} >> >>", []
+
+
+def write_text_pdf(path, page_count, seed=0, lines=45):
+    """Writes a PDF with `page_count` pages of text, reproducible from `seed`."""
+    rng = random.Random(seed)
+    return write_pdf(path, [text_page(rng, lines) for _ in range(page_count)])
+
+
+def read_pgm(path):
+    """Reads a binary (P5) PGM file and returns (width, height, pixels)."""
+    with open(path, "rb") as f:
+        data = f.read()
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b"#":
+            pos = data.index(b"\n", pos) + 1
+            continue
+        end = pos
+        while not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    assert fields[0] == b"P5" and fields[3] == b"255", f"unsupported PGM file {path}"
+    return int(fields[1]), int(fields[2]), data[pos + 1:]
+
+
+def image_page(width, height, pixels):
+    """Content of a page covered by one 8-bit grayscale image."""
+    compressed = zlib.compress(pixels, 6)
+    image = (
+        b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+        b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n"
+        % (width, height, len(compressed))
+    ) + compressed + b"\nendstream"
+    content = b"q %d 0 0 %d 0 0 cm /Im1 Do Q" % (PAGE_WIDTH, PAGE_HEIGHT)
+    return content, b"<< /XObject << /Im1 {0} >> >>", [image]
+
+
+def write_scanned_pdf(path, page_count, seed=0, dpi=150, lines=45):
+    """
+    Writes an image-only PDF with `page_count` scanned pages of text (no text layer),
+    reproducible from `seed`.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        text_pdf = write_text_pdf(str(Path(temp_dir) / "text.pdf"), page_count, seed, lines)
+        subprocess.run(
+            ["pdftoppm", "-gray", "-r", str(dpi), text_pdf, str(Path(temp_dir) / "page")],
+            check=True,
+        )
+        pages = [image_page(*read_pgm(pgm)) for pgm in sorted(Path(temp_dir).glob("page*.pgm"))]
+    return write_pdf(path, pages)
+
+
+def write_text_images(directory, count, seed=0, dpi=150, lines=45):
+    """
+    Writes `count` PNG images of text pages (page-0001.png, ...) to `directory`, reproducible
+    from `seed`. Returns the image paths.
+    """
+    text_pdf = write_text_pdf(str(Path(directory) / "pages.pdf"), count, seed, lines)
+    subprocess.run(
+        ["pdftoppm", "-gray", "-png", "-r", str(dpi), text_pdf, str(Path(directory) / "page")],
+        check=True,
+    )
+    return [str(path) for path in sorted(Path(directory).glob("page*.png"))]
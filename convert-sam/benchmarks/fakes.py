@@ -0,0 +1,642 @@
+"""
+Local stand-ins for the AWS services used by the Lambdas, for offline benchmarks
+
+Only the calls the Lambdas make are implemented. Object bodies are kept on disk so they
+do not count towards the memory use of the code being measured.
+"""
+import copy
+import json
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+
+def client_error(code, message, operation):
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+class FakeS3:
+    """S3 client backed by a local directory"""
+
+    def __init__(self, root=None, latency_s=0.0):
+        self.root = Path(root or tempfile.mkdtemp(prefix="fake-s3-"))
+        self.latency_s = latency_s  # added to every request, to model network round trips
+        self.objects = {}  # (bucket, key) -> {"path", "ContentType", "LastModified", ...}
+        self.uploads = {}  # multipart upload id -> {"Bucket", "Key", "ContentType", "parts"}
+        self.upload_count = 0  # ids are never reused, as uploads complete
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def _request(self):
+        with self.lock:
+            self.requests += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    def _path(self, bucket, key):
+        path = self.root / bucket / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _get(self, bucket, key, operation):
+        try:
+            return self.objects[(bucket, key)]
+        except KeyError:
+            raise client_error("404" if operation == "HeadObject" else "NoSuchKey",
+                               f"{key} not found", operation) from None
+
+    def _store(self, bucket, key, content_type=None, **extra):
+        self.objects[(bucket, key)] = {
+            "path": self._path(bucket, key),
+            "ContentType": content_type or "binary/octet-stream",
+            "LastModified": datetime.now(timezone.utc),
+            **extra,
+        }
+
+    # test helpers
+    def add_file(self, bucket, key, filename, content_type):
+        shutil.copyfile(filename, self._path(bucket, key))
+        self._store(bucket, key, content_type)
+
+    def read(self, bucket, key):
+        return self._get(bucket, key, "GetObject")["path"].read_bytes()
+
+    # client API
+    def head_object(self, Bucket, Key, **kwargs):
+        self._request()
+        obj = self._get(Bucket, Key, "HeadObject")
+        return {
+            "ContentType": obj["ContentType"],
+            "ContentLength": obj["path"].stat().st_size,
+            "LastModified": obj["LastModified"],
+            **{k: v for k, v in obj.items() if k not in ("path", "ContentType", "LastModified")},
+        }
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        self._request()
+        shutil.copyfile(self._get(Bucket, Key, "GetObject")["path"], Filename)
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._request()
+        obj = self._get(Bucket, Key, "GetObject")
+        return {
+            "Body": open(obj["path"], "rb"),
+            "ContentType": obj["ContentType"],
+            "ContentLength": obj["path"].stat().st_size,
+            "LastModified": obj["LastModified"],
+        }
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, **kwargs):
+        self._request()
+        shutil.copyfile(Filename, self._path(Bucket, Key))
+        extra = dict(ExtraArgs or {})
+        self._store(Bucket, Key, extra.pop("ContentType", None), **extra)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        self._request()
+        with open(self._path(Bucket, Key), "wb") as f:
+            shutil.copyfileobj(Fileobj, f)
+        extra = dict(ExtraArgs or {})
+        self._store(Bucket, Key, extra.pop("ContentType", None), **extra)
+
+    def put_object(self, Bucket, Key, Body=b"", ContentType=None, **kwargs):
+        self._request()
+        with open(self._path(Bucket, Key), "wb") as f:
+            if isinstance(Body, str):
+                Body = Body.encode()
+            if isinstance(Body, (bytes, bytearray, memoryview)):
+                f.write(Body)
+            else:
+                shutil.copyfileobj(Body, f)
+        self._store(Bucket, Key, ContentType, **kwargs)
+        return {"ETag": f'"{Key}"'}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self._request()
+        source = self._get(CopySource["Bucket"], CopySource["Key"], "CopyObject")
+        shutil.copyfile(source["path"], self._path(Bucket, Key))
+        self.objects[(Bucket, Key)] = dict(
+            source, path=self._path(Bucket, Key), LastModified=datetime.now(timezone.utc)
+        )
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._request()
+        obj = self.objects.pop((Bucket, Key), None)
+        if obj:
+            obj["path"].unlink(missing_ok=True)
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None, **kwargs):
+        self._request()
+        with self.lock:
+            self.upload_count += 1
+            upload_id = f"upload-{self.upload_count}"
+            self.uploads[upload_id] = {"Bucket": Bucket, "Key": Key, "ContentType": ContentType,
+                                       "parts": {}}
+        return {"UploadId": upload_id}
+
+    def _upload(self, upload_id, operation):
+        try:
+            return self.uploads[upload_id]
+        except KeyError:
+            raise client_error("NoSuchUpload", f"{upload_id} not found", operation) from None
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._request()
+        upload = self._upload(UploadId, "UploadPart")
+        path = self.root / ".parts" / UploadId / str(PartNumber)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(Body if isinstance(Body, (bytes, bytearray)) else Body.read())
+        with self.lock:
+            upload["parts"][PartNumber] = path
+        return {"ETag": f'"{UploadId}-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._request()
+        upload = self._upload(UploadId, "CompleteMultipartUpload")
+        # like S3, parts that were uploaded but not listed are discarded
+        numbers = [part["PartNumber"] for part in MultipartUpload["Parts"]]
+        if numbers != sorted(numbers):
+            raise client_error("InvalidPartOrder", "Parts must be in ascending order",
+                               "CompleteMultipartUpload")
+        if any(number not in upload["parts"] for number in numbers):
+            raise client_error("InvalidPart", "One or more parts were not uploaded",
+                               "CompleteMultipartUpload")
+        with open(self._path(Bucket, Key), "wb") as f:
+            for number in numbers:
+                with open(upload["parts"][number], "rb") as part:
+                    shutil.copyfileobj(part, f)
+        self._store(Bucket, Key, upload["ContentType"])
+        self.abort_multipart_upload(Bucket, Key, UploadId)
+        return {"ETag": f'"{Key}"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        with self.lock:
+            if self.uploads.pop(UploadId, None) is None:
+                raise client_error("NoSuchUpload", f"{UploadId} not found", "AbortMultipartUpload")
+        shutil.rmtree(self.root / ".parts" / UploadId, ignore_errors=True)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600, **kwargs):
+        return f"https://{Params['Bucket']}.s3.local/{Params.get('Key', '')}?X-Amz-Expires={ExpiresIn}"
+
+
+def _split_top_level(expression, separator=","):
+    """Splits on `separator` outside parentheses."""
+    parts, depth, current = [], 0, ""
+    for char in expression:
+        depth += char == "("
+        depth -= char == ")"
+        if char == separator and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _operand(token, item, names, values):
+    token = token.strip()
+    if token.startswith(":"):
+        return values[token]
+    match = re.fullmatch(r"if_not_exists\((.+),(.+)\)", token)
+    if match:
+        current = item.get(names.get(match[1].strip(), match[1].strip()))
+        return current if current is not None else _operand(match[2], item, names, values)
+    if " + " in token:
+        left, right = token.split(" + ", 1)
+        return _operand(left, item, names, values) + _operand(right, item, names, values)
+    return item.get(names.get(token, token))
+
+
+def evaluate_condition(expression, item, names, values):
+    """Evaluates the subset of DynamoDB condition expressions the Lambdas use."""
+    def term(text):
+        text = text.strip()
+        match = re.fullmatch(r"attribute_(not_)?exists\((.+)\)", text)
+        if match:
+            exists = names.get(match[2].strip(), match[2].strip()) in item
+            return exists != bool(match[1])
+        match = re.fullmatch(r"(.+?) IN \((.+)\)", text)
+        if match:
+            options = [_operand(v, item, names, values) for v in match[2].split(",")]
+            return _operand(match[1], item, names, values) in options
+        for op in ("<>", "<=", ">=", "=", "<", ">"):
+            if f" {op} " in text:
+                left, right = (_operand(v, item, names, values) for v in text.split(f" {op} ", 1))
+                if left is None or right is None:
+                    return op == "<>" and left != right
+                return {"<>": left != right, "<=": left <= right, ">=": left >= right,
+                        "=": left == right, "<": left < right, ">": left > right}[op]
+        raise NotImplementedError(text)
+
+    return any(
+        all(term(part) for part in alternative.split(" AND "))
+        for alternative in expression.split(" OR ")
+    )
+
+
+def apply_update(expression, item, names, values):
+    """Applies the SET/ADD/REMOVE clauses of a DynamoDB update expression to `item`."""
+    updated = set()
+    for clause in re.split(r"\b(?=SET |ADD |REMOVE )", expression):
+        action, _, body = clause.strip().partition(" ")
+        for part in _split_top_level(body):
+            if action == "SET":
+                path, value = (v.strip() for v in part.split("=", 1))
+                name = names.get(path, path)
+                item[name] = _operand(value, item, names, values)
+            elif action == "ADD":
+                path, value = part.split()
+                name = names.get(path, path)
+                value = values[value]
+                if isinstance(value, set):
+                    item[name] = set(item.get(name, set())) | value
+                else:
+                    item[name] = item.get(name, 0) + value
+            elif action == "REMOVE":
+                name = names.get(part, part)
+                item.pop(name, None)
+            updated.add(name)
+    return updated
+
+
+class FakeTable:
+    """DynamoDB Table resource backed by a dict, keyed by (job_id, created_at)"""
+
+    def __init__(self, name="DocumentConversionJobs", latency_s=0.0):
+        self.name = name
+        self.table_name = name
+        self.latency_s = latency_s
+        self.items = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.meta = types.SimpleNamespace(client=_FakeDynamoDBClient(self))
+
+    def _request(self):
+        with self.lock:
+            self.requests += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    @staticmethod
+    def _key(item):
+        return item["job_id"], item.get("created_at")
+
+    def _check(self, current, kwargs, operation):
+        condition = kwargs.get("ConditionExpression")
+        names = kwargs.get("ExpressionAttributeNames", {})
+        values = kwargs.get("ExpressionAttributeValues", {})
+        if condition and not evaluate_condition(condition, current or {}, names, values):
+            error = client_error(
+                "ConditionalCheckFailedException", "The conditional request failed", operation
+            )
+            if current is not None and kwargs.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD":
+                error.response["Item"] = copy.deepcopy(current)
+            raise error
+
+    def put_item(self, Item, **kwargs):
+        self._request()
+        with self.lock:
+            self._check(self.items.get(self._key(Item)), kwargs, "PutItem")
+            self.items[self._key(Item)] = copy.deepcopy(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ReturnValues="NONE", **kwargs):
+        self._request()
+        with self.lock:
+            current = self.items.get(self._key(Key))
+            self._check(current, kwargs, "UpdateItem")
+            item = copy.deepcopy(current) if current is not None else dict(Key)
+            updated = apply_update(
+                UpdateExpression, item,
+                kwargs.get("ExpressionAttributeNames", {}),
+                kwargs.get("ExpressionAttributeValues", {}),
+            )
+            self.items[self._key(Key)] = item
+        if ReturnValues == "ALL_NEW":
+            return {"Attributes": copy.deepcopy(item)}
+        if ReturnValues == "UPDATED_NEW":
+            return {"Attributes": {k: copy.deepcopy(item[k]) for k in updated if k in item}}
+        return {}
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self._request()
+        with self.lock:
+            item = copy.deepcopy(self.items.get(self._key(Key)))
+        if item is None:
+            return {}
+        if ProjectionExpression:
+            names = ExpressionAttributeNames or {}
+            wanted = {names.get(p.strip(), p.strip()) for p in ProjectionExpression.split(",")}
+            item = {k: v for k, v in item.items() if k in wanted}
+        return {"Item": item}
+
+    def query(self, KeyConditionExpression, **kwargs):
+        """Only supports an equality condition on job_id."""
+        self._request()
+        job_id = KeyConditionExpression.get_expression()["values"][1]
+        return {"Items": self.records(job_id)}
+
+    def records(self, job_id):
+        """All items of a job (test helper)."""
+        with self.lock:
+            return [
+                copy.deepcopy(item)
+                for (pk, sk), item in sorted(self.items.items(), key=lambda kv: str(kv[0][1]))
+                if pk == job_id
+            ]
+
+
+
+class _FakeDynamoDBClient:
+    """The low-level client of a FakeTable (Table.meta.client), for transactions"""
+
+    def __init__(self, table):
+        self.table = table
+        self.deserialize = TypeDeserializer().deserialize
+
+    def _plain(self, mapping):
+        return {k: self.deserialize(v) for k, v in (mapping or {}).items()}
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        table = self.table
+        table._request()
+        with table.lock:
+            staged, reasons = {}, []
+            for entry in TransactItems:
+                (action, request), = entry.items()
+                if action == "Put":
+                    item = self._plain(request["Item"])
+                    key = table._key(item)
+                else:
+                    key = table._key(self._plain(request["Key"]))
+                current = staged.get(key, table.items.get(key))
+                names = request.get("ExpressionAttributeNames", {})
+                values = self._plain(request.get("ExpressionAttributeValues"))
+                condition = request.get("ConditionExpression")
+                if condition and not evaluate_condition(condition, current or {}, names, values):
+                    reasons.append({"Code": "ConditionalCheckFailed"})
+                    continue
+                reasons.append({"Code": "None"})
+                if action == "Put":
+                    staged[key] = item
+                elif action == "Update":
+                    updated = copy.deepcopy(current) if current is not None else dict(zip(
+                        ("job_id", "created_at"), key))
+                    apply_update(request["UpdateExpression"], updated, names, values)
+                    staged[key] = updated
+            if any(reason["Code"] != "None" for reason in reasons):
+                error = client_error("TransactionCanceledException", "Transaction cancelled",
+                                     "TransactWriteItems")
+                error.response["CancellationReasons"] = reasons
+                raise error
+            table.items.update(staged)
+        return {}
+
+
+class FakeDynamoDB:
+    """DynamoDB service resource holding FakeTables, for batch operations"""
+
+    def __init__(self, *tables, unprocessed_fraction=0.0, seed=0):
+        self.tables = {table.name: table for table in tables}
+        # share of the keys of each BatchGetItem request left unprocessed, like DynamoDB
+        # does when it throttles
+        self.unprocessed_fraction = unprocessed_fraction
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def Table(self, name):
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        if sum(len(request["Keys"]) for request in RequestItems.values()) > 100:
+            raise client_error("ValidationException", "Too many items requested", "BatchGetItem")
+        responses, unprocessed = {}, {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            table._request()
+            names = request.get("ExpressionAttributeNames", {})
+            wanted = None
+            if request.get("ProjectionExpression"):
+                wanted = {names.get(p.strip(), p.strip())
+                          for p in request["ProjectionExpression"].split(",")}
+            items, skipped = [], []
+            for key in request["Keys"]:
+                with self.lock:
+                    skip = self.random.random() < self.unprocessed_fraction
+                if skip:
+                    skipped.append(key)
+                    continue
+                with table.lock:
+                    item = copy.deepcopy(table.items.get(table._key(key)))
+                if item is not None:
+                    items.append(item if wanted is None else
+                                 {k: v for k, v in item.items() if k in wanted})
+            responses[name] = items
+            if skipped:
+                unprocessed[name] = dict(request, Keys=skipped)
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+
+class FakeLambdaContext:
+    """Lambda context object with a running deadline"""
+
+    def __init__(self, timeout_s=30.0):
+        self.deadline = time.monotonic() + timeout_s
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline - time.monotonic()) * 1000))
+
+
+class FakeLambdaClient:
+    """
+    Lambda client that runs `handler(event, context)` in this process. Asynchronous
+    invocations run on a thread pool, each thread standing in for a separate container.
+    """
+
+    def __init__(self, handler, max_workers=8, timeout_s=60.0):
+        self.handler = handler
+        self.timeout_s = timeout_s
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.invocations = 0
+        self.errors = []  # exceptions raised by asynchronous invocations
+
+    def _run(self, event):
+        try:
+            return self.handler(event, FakeLambdaContext(self.timeout_s))
+        except Exception as e:
+            with self.lock:
+                self.errors.append(e)
+            raise
+
+    def invoke(self, FunctionName, InvocationType="RequestResponse", Payload=b"{}", **kwargs):
+        with self.lock:
+            self.invocations += 1
+        event = json.loads(Payload)
+        if InvocationType == "Event":
+            self.pool.submit(self._run, event)
+            return {"StatusCode": 202}
+        return {"StatusCode": 200, "Payload": json.dumps(self._run(event)).encode()}
+
+
+class LocalQueue:
+    """
+    SQS queue stand-in with a visibility timeout, redelivery and a dead-letter list.
+    `poll` delivers a batch of messages to a handler in the Lambda SQS event format and
+    deletes the ones the handler does not report in `batchItemFailures`, as an event
+    source mapping with ReportBatchItemFailures does.
+    """
+
+    def __init__(self, visibility_timeout_s=360.0, max_receive_count=3):
+        self.visibility_timeout_s = visibility_timeout_s
+        self.max_receive_count = max_receive_count
+        self.messages = {}  # message id -> {"body", "receive_count", "visible_at"}
+        self.dead_letters = []
+        self.requests = 0
+        self._ids = iter(range(1, 2 ** 63))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def send(self, body):
+        with self._lock:
+            self.requests += 1
+            message_id = f"msg-{next(self._ids):08d}"
+            self.messages[message_id] = {"body": body, "receive_count": 0, "visible_at": 0.0}
+            return message_id
+
+    def receive(self, max_messages=10):
+        """Up to `max_messages` visible messages, hidden for the visibility timeout."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            records = []
+            for message_id, message in list(self.messages.items()):
+                if len(records) == max_messages:
+                    break
+                if message["visible_at"] > now:
+                    continue
+                if message["receive_count"] >= self.max_receive_count:
+                    self.dead_letters.append(self.messages.pop(message_id)["body"])
+                    continue
+                message["receive_count"] += 1
+                message["visible_at"] = now + self.visibility_timeout_s
+                records.append({
+                    "messageId": message_id,
+                    "receiptHandle": f"{message_id}/{message['receive_count']}",
+                    "body": message["body"],
+                    "attributes": {"ApproximateReceiveCount": str(message["receive_count"])},
+                    "eventSource": "aws:sqs",
+                })
+            return records
+
+    def delete(self, message_id):
+        with self._lock:
+            self.requests += 1
+            self.messages.pop(message_id, None)
+
+    def release(self, message_id):
+        """Makes a received message visible again right away (visibility timeout 0)."""
+        with self._lock:
+            if message_id in self.messages:
+                self.messages[message_id]["visible_at"] = 0.0
+
+    def poll(self, handler, context=None, batch_size=10):
+        """
+        Delivers one batch to `handler(event, context)`. Returns the number of messages
+        delivered and the ids of those reported as failed, which are made visible again.
+        """
+        records = self.receive(batch_size)
+        if not records:
+            return 0, []
+        response = handler({"Records": records}, context) or {}
+        failed = [item["itemIdentifier"] for item in response.get("batchItemFailures", [])]
+        for record in records:
+            if record["messageId"] in failed:
+                self.release(record["messageId"])
+            else:
+                self.delete(record["messageId"])
+        return len(records), failed
+
+
+class LocalHTTPServer:
+    """
+    HTTP server on localhost that serves generated files of any size without storing
+    them: GET /<size in bytes>/<name> returns that many bytes.
+    """
+
+    def __init__(self, content_type="application/pdf", send_length=True, latency_s=0.0):
+        outer = self
+        self.content_type = content_type
+        self.send_length = send_length  # False: chunked responses without Content-Length
+        self.latency_s = latency_s  # before each response, to model a remote server
+        self.active = 0  # requests being served now, and the most at any time
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.block = bytes(range(256)) * 4096  # 1 MiB
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with outer.lock:
+                    outer.active += 1
+                    outer.max_active = max(outer.max_active, outer.active)
+                try:
+                    self.respond()
+                finally:
+                    with outer.lock:
+                        outer.active -= 1
+
+            def respond(self):
+                if outer.latency_s:
+                    time.sleep(outer.latency_s)
+                size = int(self.path.split("/")[1])
+                self.send_response(200)
+                self.send_header("Content-Type", outer.content_type)
+                if outer.send_length:
+                    self.send_header("Content-Length", str(size))
+                else:
+                    self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                remaining = size
+                while remaining:
+                    data = outer.block[:min(remaining, len(outer.block))]
+                    if outer.send_length:
+                        self.wfile.write(data)
+                    else:
+                        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    remaining -= len(data)
+                if not outer.send_length:
+                    self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, size, name="document.pdf"):
+        return f"http://127.0.0.1:{self.server.server_port}/{size}/{name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,153 @@
+"""
+Offline benchmark suite for the document-conversion pipeline
+
+Generates a reproducible corpus (images and PDFs of several sizes, text and scanned),
+drives `convert.app.lambda_handler` with local S3 and DynamoDB stand-ins and reports, per
+document class, throughput, p50/p95/p99 latency and peak memory.
+
+    python benchmarks/run_suite.py --iterations 10 --output results.json
+    python benchmarks/run_suite.py --baseline results.json   # compare with an earlier run
+
+The conversion modes are read from the environment as in the Lambda, e.g.
+`PDF_SINGLE_PASS=true python benchmarks/run_suite.py`. Each class runs in a fresh process,
+so the peak memory figures are per class.
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from common import percentile, write_results
+from corpus import write_scanned_pdf, write_text_images, write_text_pdf
+
+BUCKET = "benchmark-bucket"
+CLASSES = {
+    "image-small": {"kind": "image", "dpi": 75, "lines": 10},
+    "image-page": {"kind": "image", "dpi": 200, "lines": 45},
+    "pdf-text-2p": {"kind": "pdf", "pages": 2},
+    "pdf-text-50p": {"kind": "pdf", "pages": 50},
+    "pdf-scanned-4p": {"kind": "scanned", "pages": 4},
+}
+MODE_VARIABLES = (
+    "PDF_SHARD_PAGES", "PDF_SINGLE_PASS", "OCR_FALLBACK", "CONVERSION_CACHE", "TESSERACT_ENGINE",
+)
+
+
+def make_document(name, directory, seed=0):
+    """Writes the corpus document of a class. Returns (filename, content_type)."""
+    spec = CLASSES[name]
+    if spec["kind"] == "image":
+        image_dir = Path(directory) / name
+        image_dir.mkdir()
+        return write_text_images(image_dir, 1, seed, spec["dpi"], spec["lines"])[0], "image/png"
+    filename = str(Path(directory) / f"{name}.pdf")
+    if spec["kind"] == "scanned":
+        return write_scanned_pdf(filename, spec["pages"], seed), "application/pdf"
+    return write_text_pdf(filename, spec["pages"], seed), "application/pdf"
+
+
+def run_class(name, filename, content_type, iterations, warmup):
+    """Runs in a fresh process: converts one document `iterations` times."""
+    from common import load_convert_app
+    from fakes import FakeS3, FakeTable
+
+    app = load_convert_app()
+    with tempfile.TemporaryDirectory() as root:
+        s3, table = FakeS3(root), FakeTable()
+        app.get_s3 = lambda: s3
+        app.STORE.table = table
+
+        latencies, stages = [], defaultdict(list)
+        metrics = {}
+        for i in range(warmup + iterations):
+            job_id = f"{name}-{i}"
+            key = f"input/{job_id}/{os.path.basename(filename)}"
+            s3.add_file(BUCKET, key, filename, content_type)
+            app.STORE.create_job(job_id, f"s3://{BUCKET}/{key}")  # as start_job does
+            event = {"detail": {"bucket": {"name": BUCKET}, "object": {"key": key}}}
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stderr):  # metric log lines
+                app.lambda_handler(event, None)
+            elapsed = time.perf_counter() - start
+            metrics = table.records(job_id)[-1]["metadata"]["metrics"]
+            if i >= warmup:
+                latencies.append(elapsed)
+                for stage, ms in metrics["stages_ms"].items():
+                    stages[stage].append(ms)
+
+    print(json.dumps({
+        "class": name,
+        "iterations": iterations,
+        "input_bytes": metrics["input_bytes"],
+        "pages": metrics["pages"],
+        "docs_per_s": iterations / sum(latencies),
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "peak_rss_mb": metrics["peak_rss_mb"],
+        "peak_child_rss_mb": metrics["peak_child_rss_mb"],
+        "stage_p50_ms": {stage: percentile(values, 50) for stage, values in stages.items()},
+    }))
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {row["class"]: row for row in baseline["results"]["classes"]}
+    print(f"\nchange vs {baseline_path} (revision {baseline.get('revision')}):")
+    for row in results:
+        old = previous.get(row["class"])
+        if not old:
+            continue
+        deltas = "  ".join(
+            f"{metric} {100 * (row[metric] - old[metric]) / old[metric]:+6.1f}%"
+            for metric in ("p50_s", "p95_s", "p99_s", "peak_rss_mb", "peak_child_rss_mb")
+            if old[metric]
+        )
+        print(f"{row['class']:<16} {deltas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classes", nargs="+", choices=list(CLASSES), default=list(CLASSES))
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs per class")
+    parser.add_argument("--output", help="Save results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the results of an earlier run")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return run_class(*args.child, args.iterations, args.warmup)
+
+    env = dict(os.environ)
+    env.setdefault("OCR_FALLBACK", "true")  # so scanned PDFs produce text
+    results = []
+    print(f"{'class':<16} {'docs/s':>7} {'p50_s':>7} {'p95_s':>7} {'p99_s':>7} {'rss_mb':>7} {'child_mb':>9}")
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        for name in args.classes:
+            filename, content_type = make_document(name, corpus_dir)
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", name, filename, content_type,
+                 "--iterations", str(args.iterations), "--warmup", str(args.warmup)],
+                env=env, stdout=subprocess.PIPE, text=True, check=True,
+            ).stdout
+            row = json.loads(output.strip().splitlines()[-1])
+            results.append(row)
+            print(f"{name:<16} {row['docs_per_s']:>7.2f} {row['p50_s']:>7.3f} {row['p95_s']:>7.3f} "
+                  f"{row['p99_s']:>7.3f} {row['peak_rss_mb']:>7} {row['peak_child_rss_mb']:>9}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+    if args.output:
+        modes = {name: env.get(name) for name in MODE_VARIABLES}
+        write_results(args.output, "suite", {"modes": modes, "classes": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -4,35 +4,181 @@ Convert image and PDF files into text/structured text
 Requires tesseract and poppler lambda layers
 - see https://github.com/jschaub30/lambda-layers
 """
+import io
 import json
 import os
 import logging
+import shutil
 import subprocess
 import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from subprocess import TimeoutExpired, CalledProcessError
 from typing import Dict, Optional, Any
-from datetime import datetime
-import boto3
-from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource('dynamodb')
-table_name = os.environ.get('TABLE_NAME')
-TABLE = dynamodb.Table(table_name)
-TTL_DAYS = 30  # DynamoDB time-to-live
+from startup import StartupProfile
 
-s3 = boto3.client('s3')
+STARTUP = StartupProfile.from_env()  # PROFILE_STARTUP=true logs import and init times
+
+with STARTUP.phase("import boto3"):
+    import boto3
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+
+with STARTUP.phase("import local modules"):
+    from cache import ConversionCache, cache_key
+    import compression
+    from metrics import JobMetrics
+    import ocr_engine
+    from layout import bbox_to_text, hocr_to_bbox_page, merge_bbox_html, replace_bbox_pages
+    import preprocess
+    import wordbox
+
+with STARTUP.phase("import job_store"):
+    from conversion_profile import FORMATS, ConversionProfile  # JobStore layer
+    from job_store import STORE, set_init_phase  # JobStore layer
+set_init_phase(STARTUP.phase)  # times the DynamoDB resource, created on first use
+
+# Shared across warm invocations: S3 transfers of one job (uploads, cache copies) run on
+# this pool, and the client keeps one connection per worker
+S3_MAX_WORKERS = int(os.environ.get("S3_MAX_WORKERS", "8"))
+S3_POOL = ThreadPoolExecutor(max_workers=S3_MAX_WORKERS)
+PRESIGNED_URL_EXPIRY_SEC = 172800  # 2 days
 
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
+# AWS clients are created on first use and shared by later calls and invocations
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _shared_client(name, factory):
+    client = _CLIENTS.get(name)
+    if client is None:
+        # boto3 sessions are not thread safe, so clients are created one at a time
+        with _CLIENTS_LOCK:
+            if name not in _CLIENTS:
+                with STARTUP.phase(f"init {name}"):
+                    _CLIENTS[name] = factory()
+            client = _CLIENTS[name]
+    return client
+
+
+def get_s3():
+    return _shared_client(
+        "s3", lambda: boto3.client('s3', config=Config(max_pool_connections=S3_MAX_WORKERS))
+    )
+
+
+def get_lambda():
+    return _shared_client("lambda", lambda: boto3.client('lambda'))
+
+# Split PDFs into shards of this many pages and convert them in parallel (0 = disabled)
+PDF_SHARD_PAGES = int(os.environ.get("PDF_SHARD_PAGES", "0"))
+# PDFs with fewer pages are converted in one pass, even when sharding is enabled
+PDF_SHARD_MIN_PAGES = int(os.environ.get("PDF_SHARD_MIN_PAGES", "0"))
+# PDFs with at least this many pages are split into chunks of FANOUT_CHUNK_PAGES pages,
+# each converted by its own invocation of this function (0 = disabled)
+FANOUT_MIN_PAGES = int(os.environ.get("FANOUT_MIN_PAGES", "0"))
+FANOUT_CHUNK_PAGES = int(os.environ.get("FANOUT_CHUNK_PAGES", "50"))
+# PDFs with at least this many pages are converted CHECKPOINT_UNIT_PAGES pages at a time,
+# with a checkpoint after each unit; an invocation that runs out of time (or is retried)
+# is continued by another one, from the last checkpoint (0 = disabled)
+CHECKPOINT_MIN_PAGES = int(os.environ.get("CHECKPOINT_MIN_PAGES", "0"))
+CHECKPOINT_UNIT_PAGES = int(os.environ.get("CHECKPOINT_UNIT_PAGES", "10"))
+# time kept for merging the units (and handing over) before the Lambda timeout
+CHECKPOINT_MIN_REMAINING_MS = int(os.environ.get("CHECKPOINT_MIN_REMAINING_SEC", "10")) * 1000
+# invocations that may start from the same checkpoint (i.e. retries of a unit that did not
+# finish); keep it below the deliveries of the event source, so one is left to fail the job
+CHECKPOINT_MAX_ATTEMPTS = int(os.environ.get("CHECKPOINT_MAX_ATTEMPTS", "2"))
+# other conversions still running this long before the Lambda timeout fail their job
+TIMEOUT_MARGIN_MS = int(os.environ.get("CONVERT_TIMEOUT_MARGIN_SEC", "5")) * 1000
+# Only the first 10 pages are converted, unless PDFs may be sharded, fanned out or checkpointed
+PDF_LAST_PAGE = None if (PDF_SHARD_PAGES or FANOUT_MIN_PAGES or CHECKPOINT_MIN_PAGES) else 10
+# Upper bound on concurrent pdftotext processes (0 = one per vCPU)
+PDF_MAX_WORKERS = int(os.environ.get("PDF_MAX_WORKERS", "0"))
+# Derive the PDF text output from the bbox-layout pass instead of running pdftotext twice
+PDF_SINGLE_PASS = os.environ.get("PDF_SINGLE_PASS", "false").lower() == "true"
+# OCR the PDF pages that have no text layer (scanned pages)
+OCR_FALLBACK = os.environ.get("OCR_FALLBACK", "false").lower() == "true"
+OCR_DPI = int(os.environ.get("OCR_DPI", "300"))
+# Upper bound on concurrent tesseract processes (0 = one per vCPU)
+OCR_MAX_WORKERS = int(os.environ.get("OCR_MAX_WORKERS", "0"))
+# Reuse the outputs of identical earlier conversions (see cache.py)
+CONVERSION_CACHE = os.environ.get("CONVERSION_CACHE", "false").lower() == "true"
+# Must match the expiration of the data bucket lifecycle rule
+CACHE_MAX_AGE_DAYS = int(os.environ.get("CACHE_MAX_AGE_DAYS", "2"))
+CONVERTER_VERSION = "2"  # bump to invalidate cached conversions
+# Inputs up to this size are converted in memory: piped to the converter over stdin, with
+# outputs captured and uploaded from memory (0 = always download to disk)
+IN_MEMORY_MAX_BYTES = int(os.environ.get("IN_MEMORY_MAX_BYTES", "0"))
+# Compress the text and html outputs during upload ("gzip", "zstd" or "none"); they are
+# stored with a Content-Encoding, so browsers decode them transparently
+OUTPUT_COMPRESSION = compression.configured_encoding(os.environ.get("OUTPUT_COMPRESSION", "none"))
+OUTPUT_COMPRESSION_LEVEL = int(os.environ["OUTPUT_COMPRESSION_LEVEL"]) \
+    if os.environ.get("OUTPUT_COMPRESSION_LEVEL") else None
+COMPRESSED_CONTENT_TYPES = {'txt': "text/plain; charset=utf-8", 'html': "text/html; charset=utf-8"}
+# Memory-backed scratch space for converters that can only write files (tesseract)
+SCRATCH_DIR = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+# "capi" runs Tesseract in-process (see ocr_engine.py), "subprocess" runs the tesseract command
+TESSERACT_ENGINE = os.environ.get("TESSERACT_ENGINE", "subprocess")
+# Tesseract config (and file extension) of each output format
+TESSERACT_CONFIGS = {'pdf': "pdf", 'html': "hocr", 'txt': "txt"}
+# Jobs started without a conversion profile get every output of every page
+DEFAULT_PROFILE = ConversionProfile()
+# Images are scaled, converted to grayscale, binarized and/or deskewed before OCR, as
+# listed in PREPROCESS_STEPS (see preprocess.py; empty = OCR the upload as-is)
+PREPROCESSOR = preprocess.Preprocessor.from_env()
+
+# Queued dispatch: SQS batches are converted this many documents at a time, and a
+# document is only started with this much time left (the rest go back to the queue)
+BATCH_WORKERS = int(os.environ.get("CONVERT_BATCH_WORKERS", "4"))
+BATCH_MIN_REMAINING_MS = int(os.environ.get("CONVERT_BATCH_MIN_REMAINING_SEC", "20")) * 1000
+BATCH_POOL = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
 
 class SystemCallError(Exception):
     # Raised when calling a system command
     pass
 
 
-def run_command_with_timeout(command, timeout):
+class ConversionError(Exception):
+    # Raised when a conversion fails, after the job has been marked as failed
+    pass
+
+
+def warm_up_tesseract_engine() -> bool:
+    """Loads the in-process Tesseract engine. Returns False if it is not available."""
+    try:
+        ocr_engine.ENGINES.warm_up()
+        return True
+    except ocr_engine.OCREngineError as e:
+        logger.warning(f"In-process Tesseract not available, using the tesseract command: {e}")
+        return False
+
+
+# Load the traineddata once per container, during the init phase
+with STARTUP.phase("init tesseract engine"):
+    TESSERACT_CAPI = TESSERACT_ENGINE == "capi" and warm_up_tesseract_engine()
+
+
+def warm_up_preprocessing() -> bool:
+    """Imports NumPy and Pillow. Returns False if they are not available."""
+    try:
+        preprocess.load_modules()
+        return True
+    except preprocess.PreprocessError as e:
+        logger.warning(f"Image preprocessing disabled: {e}")
+        return False
+
+
+with STARTUP.phase("init preprocessing"):
+    PREPROCESS = PREPROCESSOR.enabled and warm_up_preprocessing()
+
+
+def run_command_with_timeout(command, timeout, input_bytes: Optional[bytes] = None):
     """
     Runs a system command with a specified timeout. Raises SystemCallError if the command
     fails or returns a non-zero exit status.
@@ -40,6 +186,8 @@ def run_command_with_timeout(command, timeout):
     Parameters:
     - command (list): The command to execute and its arguments as a list.
     - timeout (int): The timeout in seconds.
+    - input_bytes (bytes, optional): Data piped to the command's stdin. When given, the
+      output is returned as bytes instead of text.
 
     Returns:
     - The output of the command if successful.
@@ -48,11 +196,16 @@ def run_command_with_timeout(command, timeout):
     - SystemCallError: If the command fails, times out, or returns a non-zero exit status.
     """
     logger.info(f"Running command: {command}")
+    binary = input_bytes is not None
     try:
         result = subprocess.run(
-            command, capture_output=True, text=True, check=True, timeout=timeout
+            command, input=input_bytes, capture_output=True, text=not binary, check=True,
+            timeout=timeout,
         )
-        logger.info(result)
+        if binary:
+            logger.info(f"{command[0]} wrote {len(result.stdout)} bytes to stdout")
+        else:
+            logger.info(result)
         return result.stdout
     except TimeoutExpired as e:
         raise SystemCallError(
@@ -60,6 +213,8 @@ def run_command_with_timeout(command, timeout):
         ) from e
     except CalledProcessError as e:
         error_message = e.stderr.strip() if e.stderr else e.stdout.strip()
+        if binary:
+            error_message = error_message.decode(errors="replace")
         raise SystemCallError(
             f"Command '{' '.join(command)}' failed with exit status {e.returncode}: {error_message}"
         ) from e
@@ -69,8 +224,34 @@ def run_command_with_timeout(command, timeout):
         ) from e
 
 
+def run_commands_concurrently(commands, timeout, input_bytes: Optional[bytes] = None):
+    """
+    Runs several system commands at the same time, each with the given timeout (and the
+    same stdin data, if given).
+
+    Returns:
+    - The outputs of the commands, in the order given.
+
+    Raises:
+    - SystemCallError: If any of the commands fails.
+    """
+    if len(commands) == 1:
+        return [run_command_with_timeout(commands[0], timeout, input_bytes)]
+    with ThreadPoolExecutor(max_workers=len(commands)) as pool:
+        futures = [
+            pool.submit(run_command_with_timeout, command, timeout, input_bytes)
+            for command in commands
+        ]
+        return [future.result() for future in futures]
+
+
 def convert_image_tesseract(
-    image_filename: str, output_base_path: Optional[Path] = None, timeout: int = 60
+    image_filename: str,
+    output_base_path: Optional[Path] = None,
+    timeout: int = 60,
+    formats=FORMATS,
+    lang: Optional[str] = None,
+    dpi: Optional[int] = None,
 ) -> str:
     """
     Converts an image file to a PDF using Tesseract OCR.
@@ -80,6 +261,11 @@ def convert_image_tesseract(
         output_base_path (str, optional): The basename where the output files should be saved.
         If not specified, the PDF will be saved in the same location as the image.
         timeout (int): The timeout in seconds for the Tesseract command.
+        formats (tuple): Outputs to produce, of 'pdf', 'html' (hOCR) and 'txt'; Tesseract
+        only renders these.
+        lang (str, optional): Tesseract language(s), e.g. "eng+deu" (default=eng). Other
+        languages than the in-process engine's run the tesseract command.
+        dpi (int, optional): The resolution of the image, instead of the one it records.
 
     Returns:
         dict: dict with {extension: local_fn} e.g. {'xml': '/tmp/img.xml'}
@@ -95,24 +281,83 @@ def convert_image_tesseract(
         output_base_path = Path(output_base_path).with_suffix("")
 
     # Tesseract adds ".pdf" to the output base name itself
-    command = ["tesseract", image_filename, str(output_base_path), "pdf", "hocr", "txt"]
+    configs = [config for fmt, config in TESSERACT_CONFIGS.items() if fmt in formats]
+    language = ["-l", lang] if lang else []
+    resolution = ["--dpi", str(dpi)] if dpi else []
+    command = ["tesseract", image_filename, str(output_base_path), *language, *resolution, *configs]
 
-    # Execute the command with a timeout
-    run_command_with_timeout(command, timeout)
+    if TESSERACT_CAPI and lang in (None, ocr_engine.ENGINES.language):
+        try:
+            with ocr_engine.ENGINES.engine() as engine:
+                engine.process(image_filename, str(output_base_path), configs, timeout, dpi)
+        except ocr_engine.OCREngineError as e:
+            logger.warning(f"In-process Tesseract failed, retrying with the command: {e}")
+            run_command_with_timeout(command, timeout)
+    else:
+        # Execute the command with a timeout
+        run_command_with_timeout(command, timeout)
 
-    output = {}
-    for ext in ('.pdf', '.txt', '.hocr'):
-        local_fn_pth = str(output_base_path.with_suffix(ext))
-        if ext == '.hocr':
-            key = 'html'
-        else:
-            key = ext.strip('.')
-        output[key] = local_fn_pth
-    return output
+    # tesseract appends the extension, even when the base name already contains dots
+    return {
+        fmt: f"{output_base_path}.{config}"
+        for fmt, config in TESSERACT_CONFIGS.items() if fmt in formats
+    }
+
+
+def available_cpus() -> int:
+    """Returns the number of vCPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_pdf_page_count(pdf_filename: str, timeout: int = 10) -> int:
+    """
+    Reads the number of pages in a PDF file using the Poppler `pdfinfo` command.
+
+    Raises:
+        SystemCallError: If `pdfinfo` fails or does not report a page count.
+    """
+    output = run_command_with_timeout(["pdfinfo", pdf_filename], timeout)
+    for line in output.splitlines():
+        if line.startswith("Pages:"):
+            return int(line.split(":", 1)[1])
+    raise SystemCallError(f"Could not read the page count of {pdf_filename}")
+
+
+def get_pdf_page_count_bytes(pdf_bytes: bytes, timeout: int = 10) -> int:
+    """Like `get_pdf_page_count`, for a PDF held in memory (piped to `pdfinfo` over stdin)."""
+    output = run_command_with_timeout(["pdfinfo", "-"], timeout, pdf_bytes)
+    for line in output.splitlines():
+        if line.startswith(b"Pages:"):
+            return int(line.split(b":", 1)[1])
+    raise SystemCallError("Could not read the page count of the PDF")
+
+
+def pdftotext_page_range(first_page: int, last_page: Optional[int]):
+    """`pdftotext` arguments for a page range; without a last page it converts to the end."""
+    if last_page is None:
+        return ["-f", str(first_page)]
+    return ["-f", str(first_page), "-l", str(last_page)]
+
+
+def page_shards(first_page: int, last_page: int, pages_per_shard: int):
+    """Splits an inclusive page range into (first, last) shards of `pages_per_shard` pages."""
+    return [
+        (start, min(start + pages_per_shard - 1, last_page))
+        for start in range(first_page, last_page + 1, pages_per_shard)
+    ]
 
 
 def convert_pdf_poppler(
-    pdf_filename: str, first_page: int = 1, last_page: int = 10, timeout: int = 60
+    pdf_filename: str,
+    first_page: int = 1,
+    last_page: Optional[int] = PDF_LAST_PAGE,
+    timeout: int = 60,
+    output_base_path: Optional[Path] = None,
+    single_pass: bool = PDF_SINGLE_PASS,
+    formats=("txt", "html"),
 ) -> str:
     """
     Converts a PDF file to text and html files using the Poppler `pdftotext` command.
@@ -120,34 +365,620 @@ def convert_pdf_poppler(
     Args:
         pdf_filename (str): The path to the PDF file to convert.
         first_page (int): First page to convert (default=1)
-        last_page (int): Last page to convert (default=10)
+        last_page (int, optional): Last page to convert (default=PDF_LAST_PAGE; None
+        converts to the end of the document)
         timeout (int): The timeout in seconds for the `pdftotext` command.
+        output_base_path (str, optional): The basename where the output files should be saved.
+        If not specified, the outputs will be saved in the same location as the PDF.
+        single_pass (bool): Run only the `-bbox-layout` pass and derive the text output
+        from it. Otherwise both passes run at the same time.
+        formats (tuple): Outputs to produce, of 'txt' and 'html'; only their passes run.
 
     Returns:
         dict: The path to the generated text file.
     """
-    output = {}
-    
-    # TXT output
-    for ext in ('.txt', '.html'):
-        output_filename = str(Path(pdf_filename).with_suffix(ext))
-        command = ["pdftotext"]
-        if ext == ".html":
-            command.extend(['-bbox-layout'])
-    
-        command.extend(["-f", str(first_page), "-l", str(last_page)])
-        command.extend([pdf_filename, output_filename])
-        
-        try:
-            run_command_with_timeout(command, timeout)
-        except Exception as e:
-            raise SystemCallError(f"Failed to convert {pdf_filename} to text: {str(e)}")
-        output[ext.strip('.')] = output_filename
+    if output_base_path is None:
+        output_base_path = Path(pdf_filename).with_suffix("")
+    output = {fmt: f"{output_base_path}.{fmt}" for fmt in ('txt', 'html') if fmt in formats}
+    single_pass = single_pass and len(output) == 2
+    page_range = pdftotext_page_range(first_page, last_page)
+    commands = []
+    if 'html' in output:
+        commands.append(["pdftotext", "-bbox-layout", *page_range, pdf_filename, output['html']])
+    if 'txt' in output and not single_pass:
+        commands.append(["pdftotext", *page_range, pdf_filename, output['txt']])
+
+    try:
+        run_commands_concurrently(commands, timeout)
+        if single_pass:
+            with open(output['txt'], "w", encoding="utf-8") as out:
+                bbox_to_text(output['html'], out)
+    except Exception as e:
+        raise SystemCallError(f"Failed to convert {pdf_filename} to text: {str(e)}")
+
+    return output
+
+
+def convert_pdf_poppler_sharded(
+    pdf_filename: str,
+    first_page: int = 1,
+    last_page: Optional[int] = None,
+    pages_per_shard: int = 10,
+    max_workers: Optional[int] = None,
+    timeout: int = 60,
+    single_pass: bool = PDF_SINGLE_PASS,
+    formats=("txt", "html"),
+) -> Dict[str, str]:
+    """
+    Converts a PDF file to text and html files by splitting it into page-range shards.
+
+    The page count is read with `pdfinfo`, each shard is converted by its own `pdftotext`
+    processes, and the shard outputs are stitched back together in page order.
+
+    Args:
+        pdf_filename (str): The path to the PDF file to convert.
+        first_page (int): First page to convert (default=1)
+        last_page (int, optional): Last page to convert (default=last page of the document)
+        pages_per_shard (int): Number of pages converted by each `pdftotext` call.
+        max_workers (int, optional): Number of shards converted at the same time
+        (default=one per vCPU).
+        timeout (int): The timeout in seconds for each `pdftotext` command.
+        single_pass (bool): Derive the text of each shard from its bbox-layout output.
+        formats (tuple): Outputs to produce, of 'txt' and 'html'.
+
+    Returns:
+        dict: dict with {extension: local_fn} e.g. {'txt': '/tmp/doc.txt'}
+    """
+    page_count = get_pdf_page_count(pdf_filename)
+    last_page = page_count if last_page is None else min(last_page, page_count)
+    shards = page_shards(first_page, last_page, pages_per_shard)
+    max_workers = max_workers or PDF_MAX_WORKERS or available_cpus()
+    logger.info(f"Converting {len(shards)} shards of {pdf_filename} with {max_workers} workers")
+
+    output_base_path = Path(pdf_filename).with_suffix("")
+    # pdftotext does the work in a child process, so threads are enough to keep
+    # every vCPU busy (multiprocessing pools are not available on Lambda)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(
+                convert_pdf_poppler,
+                pdf_filename,
+                first,
+                last,
+                timeout,
+                f"{output_base_path}-shard{index:04d}",
+                single_pass,
+                formats,
+            )
+            for index, (first, last) in enumerate(shards)
+        ]
+        parts = [future.result() for future in futures]
+
+    output = {fmt: f"{output_base_path}.{fmt}" for fmt in parts[0]}
+    if 'txt' in output:
+        # pdftotext ends every page with a form feed, so the text shards concatenate as-is
+        with open(output['txt'], "wb") as out:
+            for part in parts:
+                with open(part['txt'], "rb") as f:
+                    shutil.copyfileobj(f, out)
+    if 'html' in output:
+        merge_bbox_html([part['html'] for part in parts], output['html'])
+    return output
+
+
+def convert_pdf_poppler_bytes(
+    pdf_bytes: bytes,
+    first_page: int = 1,
+    last_page: Optional[int] = PDF_LAST_PAGE,
+    timeout: int = 60,
+    single_pass: bool = PDF_SINGLE_PASS,
+    formats=("txt", "html"),
+) -> Dict[str, bytes]:
+    """
+    Converts a PDF held in memory, like `convert_pdf_poppler`, without touching the disk:
+    the PDF is piped to `pdftotext` over stdin and the outputs are read from stdout.
+
+    Returns:
+        dict: dict with {extension: content} e.g. {'txt': b'...'}
+    """
+    single_pass = single_pass and 'txt' in formats and 'html' in formats
+    page_range = pdftotext_page_range(first_page, last_page)
+    commands = {}
+    if 'html' in formats:
+        commands['html'] = ["pdftotext", "-bbox-layout", *page_range, "-", "-"]
+    if 'txt' in formats and not single_pass:
+        commands['txt'] = ["pdftotext", *page_range, "-", "-"]
+    try:
+        outputs = dict(zip(
+            commands, run_commands_concurrently(list(commands.values()), timeout, pdf_bytes)
+        ))
+        if single_pass:
+            text = io.StringIO()
+            bbox_to_text(io.BytesIO(outputs['html']), text)
+            outputs['txt'] = text.getvalue().encode("utf-8")
+    except Exception as e:
+        raise SystemCallError(f"Failed to convert PDF to text: {str(e)}")
+    return outputs
+
+
+def convert_image_tesseract_bytes(
+    image_bytes: bytes, timeout: int = 60, formats=FORMATS, lang: Optional[str] = None,
+    dpi: Optional[int] = None,
+) -> Dict[str, bytes]:
+    """
+    Converts an image held in memory, like `convert_image_tesseract`. The image is piped
+    to `tesseract` over stdin; tesseract can only write its outputs to files, so they are
+    written to memory-backed scratch space (when available) and read back.
+
+    Returns:
+        dict: dict with {extension: content} e.g. {'txt': b'...'}
+    """
+    with tempfile.TemporaryDirectory(dir=SCRATCH_DIR) as scratch_dir:
+        output_base_path = Path(scratch_dir) / "image"
+        if TESSERACT_CAPI:
+            # the in-process engine reads files only
+            image_filename = f"{scratch_dir}/input"
+            with open(image_filename, "wb") as f:
+                f.write(image_bytes)
+            output = convert_image_tesseract(
+                image_filename, output_base_path, timeout, formats, lang, dpi
+            )
+        else:
+            configs = {fmt: config for fmt, config in TESSERACT_CONFIGS.items() if fmt in formats}
+            language = ["-l", lang] if lang else []
+            resolution = ["--dpi", str(dpi)] if dpi else []
+            command = [
+                "tesseract", "stdin", str(output_base_path), *language, *resolution, *configs.values()
+            ]
+            run_command_with_timeout(command, timeout, image_bytes)
+            output = {fmt: f"{output_base_path}.{config}" for fmt, config in configs.items()}
+        return {fmt: Path(local_fn).read_bytes() for fmt, local_fn in output.items()}
+
+
+def rasterize_pdf_page(pdf_filename: str, page: int, dpi: int = OCR_DPI, timeout: int = 60) -> str:
+    """
+    Renders one page of a PDF file to a grayscale PNG using the Poppler `pdftoppm` command.
+
+    Returns:
+        str: The path to the PNG file.
+    """
+    output_base_path = f"{Path(pdf_filename).with_suffix('')}-page{page:04d}"
+    command = [
+        "pdftoppm", "-gray", "-png", "-singlefile", "-r", str(dpi),
+        "-f", str(page), "-l", str(page), pdf_filename, output_base_path,
+    ]
+    run_command_with_timeout(command, timeout)
+    return f"{output_base_path}.png"
+
+
+def ocr_pdf_pages(
+    pdf_filename: str,
+    pages,
+    dpi: int = OCR_DPI,
+    max_workers: Optional[int] = None,
+    timeout: int = 60,
+    formats=FORMATS,
+    lang: Optional[str] = None,
+) -> Dict[int, Dict[str, str]]:
+    """
+    Rasterizes PDF pages and OCRs them with Tesseract.
+
+    Rasterizing and OCR run as a pipeline: pages are rendered one at a time while
+    rendered pages are OCR'd on a pool of `max_workers` tesseract processes. At most
+    2 * `max_workers` rendered pages wait for OCR at any time.
+
+    Args:
+        pdf_filename (str): The path to the PDF file.
+        pages (list): Page numbers to OCR.
+        dpi (int): Rasterizing resolution.
+        max_workers (int, optional): Number of pages OCR'd at the same time
+        (default=one per vCPU).
+        timeout (int): The timeout in seconds for each `pdftoppm` and `tesseract` command.
+        formats (tuple): Tesseract outputs of each page, of 'pdf', 'html' and 'txt'.
+        lang (str, optional): Tesseract language(s).
+
+    Returns:
+        dict: {page: {extension: local_fn}} with the Tesseract outputs of each page.
+    """
+    max_workers = max_workers or OCR_MAX_WORKERS or available_cpus()
+    pending = threading.BoundedSemaphore(2 * max_workers)
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for page in pages:
+            pending.acquire()
+            try:
+                image_filename = rasterize_pdf_page(pdf_filename, page, dpi, timeout)
+            except Exception:
+                pending.release()
+                raise
+            future = pool.submit(
+                convert_image_tesseract, image_filename, None, timeout, formats, lang
+            )
+            future.add_done_callback(lambda _: pending.release())
+            futures[page] = future
+        return {page: future.result() for page, future in futures.items()}
+
+
+def ocr_fallback(
+    pdf_filename: str,
+    output: Dict[str, str],
+    first_page: int = 1,
+    dpi: int = OCR_DPI,
+    max_workers: Optional[int] = None,
+    timeout: int = 60,
+    formats=FORMATS,
+    lang: Optional[str] = None,
+) -> Dict[str, str]:
+    """
+    OCRs the pages of a converted PDF that have no text layer, and merges the results
+    into the `pdftotext` outputs.
+
+    The OCR text replaces the empty pages of the txt output and the OCR words are added
+    to the empty pages of the bbox html output (if converted). When any page is OCR'd
+    and 'pdf' is in `formats`, a searchable PDF is also assembled from the original text
+    pages and the Tesseract pages.
 
+    Args:
+        pdf_filename (str): The path to the PDF file.
+        output (dict): Outputs of `convert_pdf_poppler`, {extension: local_fn}
+        first_page (int): First page of the converted range.
+        dpi (int): Rasterizing resolution.
+        max_workers (int, optional): Number of pages OCR'd at the same time.
+        timeout (int): The timeout in seconds for each command.
+        formats (tuple): Requested outputs; a searchable PDF is only made for 'pdf'.
+        lang (str, optional): Tesseract language(s).
+
+    Returns:
+        dict: dict with {extension: local_fn} e.g. {'pdf': '/tmp/doc-ocr.pdf'}
+    """
+    with open(output['txt'], encoding="utf-8") as f:
+        # pdftotext ends every page with a form feed
+        page_texts = f.read().split("\f")[:-1]
+    empty = [index for index, text in enumerate(page_texts) if not text.strip()]
+    if not empty:
+        return output
+    logger.info(f"OCR fallback for {len(empty)} of {len(page_texts)} pages of {pdf_filename}")
+
+    # the text is always OCR'd, to fill in the empty pages
+    ocr_formats = ['txt']
+    if 'html' in output:
+        ocr_formats.append('html')
+    if 'pdf' in formats:
+        ocr_formats.append('pdf')
+    ocr = ocr_pdf_pages(
+        pdf_filename, [first_page + index for index in empty], dpi, max_workers, timeout,
+        ocr_formats, lang,
+    )
+
+    page_contents = {}
+    for index in empty:
+        page_output = ocr[first_page + index]
+        with open(page_output['txt'], encoding="utf-8") as f:
+            page_texts[index] = f.read().rstrip("\f")
+        if 'html' in page_output:
+            page_contents[index] = hocr_to_bbox_page(page_output['html'], dpi)
+
+    output_base_path = Path(pdf_filename).with_suffix("")
+    merged = {fmt: f"{output_base_path}-ocr.{fmt}" for fmt in ocr_formats}
+    with open(merged['txt'], "w", encoding="utf-8") as out:
+        for text in page_texts:
+            out.write(text + "\f")
+    if 'html' in merged:
+        replace_bbox_pages(output['html'], page_contents, merged['html'])
+    if 'pdf' not in merged:
+        return merged
+
+    # searchable PDF: original pages that have text, Tesseract pages for the rest
+    last_page = first_page + len(page_texts) - 1
+    run_command_with_timeout(
+        ["pdfseparate", "-f", str(first_page), "-l", str(last_page),
+         pdf_filename, f"{output_base_path}-split%d.pdf"],
+        timeout,
+    )
+    pdf_pages = [
+        ocr[page]['pdf'] if page in ocr else f"{output_base_path}-split{page}.pdf"
+        for page in range(first_page, last_page + 1)
+    ]
+    run_command_with_timeout(["pdfunite", *pdf_pages, merged['pdf']], timeout)
+    return merged
+
+
+def conversion_settings(
+    content_type: str, profile: ConversionProfile = DEFAULT_PROFILE
+) -> Dict[str, Any]:
+    """The settings that determine the outputs of a conversion (part of the cache key)."""
+    settings = {"version": CONVERTER_VERSION, "content_type": content_type}
+    if profile.as_dict():
+        settings["profile"] = profile.as_dict()
+    if content_type == 'application/pdf':
+        settings.update({
+            "last_page": PDF_LAST_PAGE,
+            "single_pass": PDF_SINGLE_PASS,
+            "ocr_fallback": OCR_FALLBACK,
+            "ocr_dpi": OCR_DPI,
+        })
+    elif PREPROCESS:
+        settings["preprocess"] = PREPROCESSOR.settings()
+    return settings
+
+
+def pdf_text_formats(profile: ConversionProfile):
+    """
+    The pdftotext outputs a profile needs: the text always (pages are counted, and pages
+    to OCR found, from it) and the bbox html if requested (or a wbox, made from it).
+    """
+    return ("txt", "html") if "html" in profile.converter_formats else ("txt",)
+
+
+def convert_file(
+    input_filename: str,
+    content_type: str,
+    page_count: Optional[int] = None,
+    profile: ConversionProfile = DEFAULT_PROFILE,
+) -> Dict[str, str]:
+    """
+    Converts an image or PDF file with the converter for its content type.
+
+    Args:
+        page_count (int, optional): The page count of a PDF, if already known; PDFs with
+        fewer than PDF_SHARD_MIN_PAGES pages are not sharded.
+        profile (ConversionProfile): The outputs, pages, language and OCR resolution of the
+        job; outputs it does not request may still be returned (e.g. the text of a PDF).
+
+    Returns:
+        dict: dict with {extension: local_fn} e.g. {'txt': '/tmp/doc.txt'}
+    """
+    if content_type.startswith('image'):
+        dpi = profile.dpi
+        if PREPROCESS:
+            image_bytes = preprocess.preprocess_image(
+                PREPROCESSOR, Path(input_filename).read_bytes(), profile.dpi
+            )
+            if image_bytes is not None:
+                input_filename = f"{Path(input_filename).with_suffix('')}-preprocessed.png"
+                Path(input_filename).write_bytes(image_bytes)
+                dpi = None  # the preprocessed image records its (possibly scaled) resolution
+        # tesseract can do it all
+        return convert_image_tesseract(
+            input_filename, formats=profile.converter_formats, lang=profile.lang, dpi=dpi
+        )
+    first_page, last_page = profile.page_range(page_count, PDF_LAST_PAGE)
+    return convert_pdf_pages(input_filename, first_page, last_page, profile)
+
+
+def convert_pdf_pages(
+    pdf_filename: str,
+    first_page: int,
+    last_page: Optional[int],
+    profile: ConversionProfile = DEFAULT_PROFILE,
+) -> Dict[str, str]:
+    """
+    Converts a page range of a PDF file (None as the last page converts to the end), in
+    shards if it is longer than PDF_SHARD_PAGES and has at least PDF_SHARD_MIN_PAGES
+    pages, OCRing the pages without text when OCR_FALLBACK is set.
+
+    Returns:
+        dict: dict with {extension: local_fn} e.g. {'txt': '/tmp/doc.txt'}
+    """
+    formats = pdf_text_formats(profile)
+    pages = None if last_page is None else last_page - first_page + 1
+    shard = pages is None or (pages > PDF_SHARD_PAGES and pages >= PDF_SHARD_MIN_PAGES)
+    if PDF_SHARD_PAGES and shard:
+        output = convert_pdf_poppler_sharded(
+            pdf_filename, first_page, last_page, pages_per_shard=PDF_SHARD_PAGES, formats=formats
+        )
+    else:
+        output = convert_pdf_poppler(pdf_filename, first_page, last_page, formats=formats)
+    if OCR_FALLBACK:
+        output = ocr_fallback(
+            pdf_filename, output, first_page, profile.dpi or OCR_DPI,
+            formats=profile.converter_formats, lang=profile.lang,
+        )
     return output
-        
 
-def process_file(bucket_name: str, object_key: str, job_id, config: Dict[str, Any]):
+
+def convert_bytes(
+    input_bytes: bytes, content_type: str, profile: ConversionProfile = DEFAULT_PROFILE
+) -> Optional[Dict[str, bytes]]:
+    """
+    Converts an image or PDF file held in memory.
+
+    Returns:
+        dict: dict with {extension: content}, or None when the file needs the disk path
+        (a PDF with pages to OCR).
+    """
+    if content_type.startswith('image'):
+        dpi = profile.dpi
+        if PREPROCESS:
+            preprocessed = preprocess.preprocess_image(PREPROCESSOR, input_bytes, profile.dpi)
+            if preprocessed is not None:
+                input_bytes, dpi = preprocessed, None  # the image records its resolution
+        return convert_image_tesseract_bytes(
+            input_bytes, formats=profile.converter_formats, lang=profile.lang, dpi=dpi
+        )
+    first_page, last_page = profile.page_range(None, PDF_LAST_PAGE)
+    output = convert_pdf_poppler_bytes(
+        input_bytes, first_page, last_page, formats=pdf_text_formats(profile)
+    )
+    if OCR_FALLBACK and any(not page.strip() for page in output['txt'].split(b"\f")[:-1]):
+        return None
+    return output
+
+
+def upload_compressed(source, bucket_name: str, object_key: str, encoding: str, content_type: str):
+    """Uploads a file (path) or content (bytes), compressed while it is read."""
+    with io.BytesIO(source) if isinstance(source, bytes) else open(source, "rb") as f:
+        reader = compression.CompressingReader(f, encoding, OUTPUT_COMPRESSION_LEVEL)
+        get_s3().upload_fileobj(
+            reader, bucket_name, object_key,
+            ExtraArgs={"ContentType": content_type, "ContentEncoding": encoding},
+        )
+    logger.info(
+        f"Uploaded s3://{bucket_name}/{object_key}: {reader.bytes_in} bytes, "
+        f"{reader.bytes_out} with {encoding}"
+    )
+
+
+def upload_outputs(
+    output: Dict[str, Any], bucket_name: str, output_prefix: str, compress: bool = True
+) -> Dict[str, str]:
+    """
+    Uploads output files to S3 concurrently.
+
+    Args:
+        output (dict): {extension: local_fn}, or {extension: content} for outputs held in memory
+        bucket_name (str): The name of the S3 bucket.
+        output_prefix (str): Object key prefix; each file is stored at <prefix>.<extension>
+        compress (bool): Compress the text and html outputs with OUTPUT_COMPRESSION. Off for
+        intermediate files that are downloaded again (fanned-out chunks).
+
+    Returns:
+        dict: {extension: object key}
+    """
+    result = {fmt: f"{output_prefix}.{fmt}" for fmt in output}
+    futures = []
+    for fmt, local_fn_pth in output.items():
+        if compress and OUTPUT_COMPRESSION and fmt in COMPRESSED_CONTENT_TYPES:
+            futures.append(S3_POOL.submit(
+                upload_compressed, local_fn_pth, bucket_name, result[fmt],
+                OUTPUT_COMPRESSION, COMPRESSED_CONTENT_TYPES[fmt],
+            ))
+            continue
+        if isinstance(local_fn_pth, bytes):
+            logger.info(f"Uploading {len(local_fn_pth)} bytes to s3://{bucket_name}/{result[fmt]}")
+            futures.append(S3_POOL.submit(
+                get_s3().put_object, Bucket=bucket_name, Key=result[fmt], Body=local_fn_pth
+            ))
+            continue
+        logger.info(f"Uploading {local_fn_pth!r} to s3://{bucket_name}/{result[fmt]}")
+        futures.append(S3_POOL.submit(get_s3().upload_file, local_fn_pth, bucket_name, result[fmt]))
+    for future in futures:
+        future.result()
+    return result
+
+
+def presign_urls(bucket_name: str, object_keys: Dict[str, str]) -> Dict[str, str]:
+    """Signs a GET URL for each {name: object key}; signing is local, no request is made."""
+    return {
+        name: get_s3().generate_presigned_url(
+            ClientMethod='get_object',
+            Params={
+                'Bucket': bucket_name,
+                'Key': object_key,
+            },
+            ExpiresIn=PRESIGNED_URL_EXPIRY_SEC,
+        )
+        for name, object_key in object_keys.items()
+    }
+
+
+def add_wordbox(output: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adds the word boxes of the html output as the 'wbox' output (see wordbox.py), in
+    memory for an html output held in memory, else in a file next to it.
+    """
+    html = output['html']
+    if isinstance(html, bytes):
+        buffer = io.BytesIO()
+        wordbox.write_wordbox(io.BytesIO(html), buffer)
+        output['wbox'] = buffer.getvalue()
+    else:
+        output['wbox'] = f"{os.path.splitext(html)[0]}.wbox"
+        with open(output['wbox'], "wb") as f:
+            wordbox.write_wordbox(html, f)
+    return output
+
+
+def requested_outputs(output: Dict[str, Any], profile: ConversionProfile) -> Dict[str, Any]:
+    """
+    The outputs the profile asks for.
+
+    Raises:
+        ValueError: If there are none, e.g. only a searchable PDF was asked for a PDF with
+        a text layer (it is only made of pages that are OCR'd).
+    """
+    output = {fmt: out for fmt, out in output.items() if profile.wants(fmt)}
+    if not output:
+        raise ValueError(
+            f"The document has none of the requested outputs ({', '.join(profile.formats)}); "
+            "searchable PDFs are only made of pages that are OCR'd"
+        )
+    return output
+
+
+def count_pages(output: Dict[str, Any], content_type: str) -> int:
+    """Number of pages converted, from the form feeds that end each page of the text output."""
+    if content_type.startswith('image'):
+        return 1
+    if isinstance(output['txt'], bytes):
+        return output['txt'].count(b"\f")
+    with open(output['txt'], "rb") as f:
+        return sum(chunk.count(b"\f") for chunk in iter(lambda: f.read(1024 * 1024), b""))
+
+
+def route(content_type: str, size: int, page_count: Optional[int] = None) -> str:
+    """
+    Picks how a document is converted, from its size and, for PDFs, its page count:
+
+    - "fanout": PDFs of at least FANOUT_MIN_PAGES pages are split into chunks, each
+      converted by its own invocation (see `fan_out`)
+    - "checkpointed": PDFs of at least CHECKPOINT_MIN_PAGES pages are converted in units,
+      continued by further invocations if needed (see `convert_checkpointed`)
+    - "inline": other inputs up to IN_MEMORY_MAX_BYTES are converted in memory, in one
+      pass; so when PDFs may be sharded, fanned out or checkpointed, a small PDF only
+      goes inline once its page count shows it is too short for any of them
+    - "local": everything else is converted from disk by this invocation, in shards for
+      PDFs of at least PDF_SHARD_MIN_PAGES pages when PDF_SHARD_PAGES is set
+
+    The page count is only known once the PDF is read, so PDFs are routed again then.
+    """
+    pdf = content_type == 'application/pdf'
+    if pdf and FANOUT_MIN_PAGES and page_count is not None and page_count >= FANOUT_MIN_PAGES:
+        return "fanout"
+    if (
+        pdf and CHECKPOINT_MIN_PAGES
+        and page_count is not None and page_count >= CHECKPOINT_MIN_PAGES
+    ):
+        return "checkpointed"
+    if 0 < size <= IN_MEMORY_MAX_BYTES:
+        if not pdf or PDF_LAST_PAGE is not None:
+            return "inline"  # only the first pages of a PDF are converted
+        sharded = PDF_SHARD_PAGES and page_count is not None and (
+            page_count > PDF_SHARD_PAGES and page_count >= PDF_SHARD_MIN_PAGES
+        )
+        if page_count is not None and not sharded:
+            return "inline"
+    return "local"
+
+
+def timeout_watchdog(job_id, context) -> Optional[threading.Timer]:
+    """
+    Starts a timer that fails the job TIMEOUT_MARGIN_MS before the Lambda timeout, so a
+    conversion cut off by the timeout does not stay 'started'. Cancel it once done.
+    """
+    if context is None:
+        return None
+    delay_s = (context.get_remaining_time_in_millis() - TIMEOUT_MARGIN_MS) / 1000
+    timer = threading.Timer(
+        max(0.0, delay_s), STORE.update_job, args=(job_id, "error"),
+        kwargs={"message": "The conversion did not finish before the Lambda timeout"},
+    )
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def process_file(
+    bucket_name: str,
+    object_key: str,
+    job_id,
+    config: Optional[Dict[str, Any]],
+    metadata: Optional[Dict[str, Any]] = None,
+    metrics: Optional[JobMetrics] = None,
+    context=None,
+    continuations: int = 0,
+    has_state: bool = True,
+):
     """
     Download a file from S3. 
     
@@ -156,11 +987,30 @@ def process_file(bucket_name: str, object_key: str, job_id, config: Dict[str, An
     Args:
         bucket_name (str): The name of the S3 bucket.
         object_key (str): The key of the object in the S3 bucket.
-        config (Dict[str, Any]): Configuration options
+        config (Dict[str, Any]): The conversion profile of the job (see conversion_profile.py),
+        or None to convert everything: only the requested outputs and pages are converted
+        metadata (Dict[str, Any], optional): Filled with job metadata, e.g. the cache status
+        metrics (JobMetrics, optional): Records stage timings, sizes and page count
+        context (optional): The Lambda context, for the time left to a checkpointed conversion
+        continuations (int): Invocations that continued a checkpointed conversion before this one
+        has_state (bool): False for a job created before the state item, which is always
+        converted by this invocation: it cannot count chunks or record checkpoints
+
+    Returns:
+        dict: {extension: object key} of the outputs, or None when the PDF was fanned out
+        in chunks (the invocation of the last chunk finishes the job) or the rest of a
+        checkpointed conversion was handed to another invocation.
     """
     logger.info(f"Start processing {object_key}")
+    if metadata is None:
+        metadata = {}
+    if metrics is None:
+        metrics = JobMetrics(job_id)
+    watchdog = None
     try:
-        head_response = s3.head_object(Bucket=bucket_name, Key=object_key)
+        profile = ConversionProfile.from_dict(config)
+        with metrics.stage("head_object"):
+            head_response = get_s3().head_object(Bucket=bucket_name, Key=object_key)
         content_type = head_response['ContentType']
         logger.info(f"content_type={content_type}")
 
@@ -169,47 +1019,550 @@ def process_file(bucket_name: str, object_key: str, job_id, config: Dict[str, An
             content_type == 'application/pdf' or content_type.startswith('image')
             ):
             message = f"File {object_key} is not an image or PDF, skipping processing."
-            update_job(job_id, "error", message=message)
+            STORE.update_job(job_id, "error", message=message)
             logger.error(message)
             return {
                 'statusCode': 400,
                 'body': message
             }
+        metrics.dimensions['ContentClass'] = "pdf" if content_type == 'application/pdf' else "image"
+        metrics.set("input_bytes", head_response['ContentLength'])
+        size = head_response['ContentLength']
+        routing = route(content_type, size)
+
+        input_bytes = None
+        if 0 < size <= IN_MEMORY_MAX_BYTES:
+            # for PDFs, the page count read from memory decides whether they stay there
+            logger.info(f"Reading s3://{bucket_name}/{object_key} into memory")
+            with metrics.stage("download"):
+                response = get_s3().get_object(Bucket=bucket_name, Key=object_key)
+                input_bytes = response['Body'].read()
 
         with tempfile.TemporaryDirectory() as temp_dir:
             input_filename = f"{temp_dir}/{os.path.basename(object_key)}"
-            logger.info(f"Downloading from s3: {input_filename}")
-            s3.download_file(bucket_name, object_key, input_filename)
+            if input_bytes is None:
+                logger.info(f"Downloading from s3: {input_filename}")
+                with metrics.stage("download"):
+                    get_s3().download_file(bucket_name, object_key, input_filename)
+
+            output_prefix = output_prefix_for(object_key)
+            cache = None
+            if CONVERSION_CACHE:
+                cache = ConversionCache(
+                    get_s3(), bucket_name, CACHE_MAX_AGE_DAYS * 24 * 60 * 60, S3_POOL
+                )
+                with metrics.stage("cache_lookup"):
+                    key = cache_key(
+                        input_filename if input_bytes is None else input_bytes,
+                        conversion_settings(content_type, profile),
+                    )
+                    result = cache.restore(key, output_prefix)
+                metadata['cache'] = "miss" if result is None else "hit"
+                if result is not None:
+                    logger.info(f"Cache hit for {object_key}, skipping conversion")
+                    return result
+
+            page_count = None
+            if routing != "inline" and content_type == 'application/pdf' and (
+                FANOUT_MIN_PAGES or PDF_SHARD_MIN_PAGES or CHECKPOINT_MIN_PAGES
+                or (input_bytes is not None and PDF_SHARD_PAGES)
+            ):
+                with metrics.stage("page_count"):
+                    if input_bytes is not None:
+                        page_count = get_pdf_page_count_bytes(input_bytes)
+                    else:
+                        page_count = get_pdf_page_count(input_filename)
+                first_page, last_page = profile.page_range(page_count, PDF_LAST_PAGE)
+                routing = route(content_type, size, last_page - first_page + 1)
+            if routing in ("fanout", "checkpointed") and not has_state:
+                logger.info(f"Job {job_id} has no state item, converting it locally")
+                routing = "local"
+            if routing != "inline" and input_bytes is not None:
+                with open(input_filename, "wb") as f:
+                    f.write(input_bytes)
+                input_bytes = None
+            metadata['route'] = routing
+            if routing == "fanout":
+                with metrics.stage("fan_out"):
+                    fan_out(bucket_name, object_key, job_id, page_count,
+                            key if cache is not None else None, profile)
+                return None
+            if routing != "checkpointed":  # checkpointed conversions hand over in time
+                watchdog = timeout_watchdog(job_id, context)
 
-            output_prefix = str(Path(object_key.replace('input', 'output', 1)).with_suffix(""))
-            result = {}
-            if content_type.startswith('image'):
-                # tesseract can do it all
-                output = convert_image_tesseract(input_filename)
-            else:
-                output = convert_pdf_poppler(input_filename)
+            with metrics.stage("convert"):
+                output = None
+                if routing == "checkpointed":
+                    metadata['continuations'] = continuations
+                    output = convert_checkpointed(
+                        input_filename, bucket_name, object_key, job_id, page_count,
+                        context, continuations, profile,
+                    )
+                    if output is None:
+                        return None  # continued by another invocation
+                elif input_bytes is not None:
+                    output = convert_bytes(input_bytes, content_type, profile)
+                if output is None:
+                    if input_bytes is not None:
+                        # the in-memory path handed over, e.g. for OCR of scanned pages
+                        with open(input_filename, "wb") as f:
+                            f.write(input_bytes)
+                    output = convert_file(input_filename, content_type, page_count, profile)
+            metrics.set("pages", count_pages(output, content_type))
+            if profile.wants("wbox"):
+                with metrics.stage("wordbox"):
+                    add_wordbox(output)
+            output = requested_outputs(output, profile)
+            metrics.set("output_bytes", sum(
+                len(out) if isinstance(out, bytes) else os.path.getsize(out)
+                for out in output.values()
+            ))
 
             # upload output files to S3
-            for fmt, local_fn_pth in output.items():
-                object_key = f"{output_prefix}.{fmt}"
-                logger.info(f"Uploading {local_fn_pth!r} to s3://{bucket_name}/{object_key}")
-                s3.upload_file(local_fn_pth, bucket_name, object_key)
-                result[fmt] = object_key
+            with metrics.stage("upload"):
+                result = upload_outputs(output, bucket_name, output_prefix)
+
+            if cache is not None:
+                try:
+                    with metrics.stage("cache_store"):
+                        cache.store(key, result)
+                except ClientError as e:
+                    # the job itself succeeded, only the cache entry is missing
+                    logger.warning(f"Failed to store cache entry {key}: {str(e)}")
         return result
 
     except Exception as e:
         message = f"Failed to process the file: {str(e)}"
-        update_job(job_id, "error", message=message)
+        STORE.update_job(job_id, "error", message=message, metadata={"metrics": metrics.as_metadata()})
         logger.error(message)
-        raise Exception(message)
+        raise ConversionError(message) from e
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
     return result
 
 
+def output_prefix_for(object_key: str) -> str:
+    """The outputs of an input are stored at <prefix>.<extension>."""
+    return str(Path(object_key.replace('input', 'output', 1)).with_suffix(""))
+
+
+def chunk_prefix(job_id: str, index: int) -> str:
+    # outside input/, so chunk outputs do not start conversions; the bucket lifecycle rule
+    # removes them
+    return f"work/{job_id}/chunk{index:04d}"
+
+
+def fan_out(
+    bucket_name: str,
+    object_key: str,
+    job_id: str,
+    page_count: int,
+    cache_key=None,
+    profile: ConversionProfile = DEFAULT_PROFILE,
+) -> int:
+    """
+    Splits the pages of a PDF the profile asks for into chunks of FANOUT_CHUNK_PAGES
+    pages and starts an asynchronous invocation of this function for each (see
+    `convert_chunk`).
+
+    Returns:
+        int: The number of chunks.
+    """
+    page_range = profile.page_range(page_count)
+    chunks = page_shards(*page_range, FANOUT_CHUNK_PAGES)
+    STORE.start_chunks(job_id, len(chunks))
+    function_name = os.environ["AWS_LAMBDA_FUNCTION_NAME"]
+    with ThreadPoolExecutor(max_workers=min(len(chunks), 10)) as pool:
+        futures = [
+            pool.submit(
+                get_lambda().invoke,
+                FunctionName=function_name,
+                InvocationType="Event",
+                Payload=json.dumps({"chunk": {
+                    "bucket": bucket_name, "key": object_key, "job_id": job_id,
+                    "index": index, "count": len(chunks), "page_count": page_count,
+                    "first_page": first, "last_page": last, "chunk_pages": FANOUT_CHUNK_PAGES,
+                    "page_range": page_range, "profile": profile.as_dict(), "cache_key": cache_key,
+                }}),
+            )
+            for index, (first, last) in enumerate(chunks)
+        ]
+        for future in futures:
+            future.result()
+    logger.info(f"Job {job_id}: {page_count} pages fanned out in {len(chunks)} chunks")
+    return len(chunks)
+
+
+def convert_chunk(chunk: Dict[str, Any]):
+    """
+    Converts the pages of one chunk of a fanned-out PDF to work/<job_id>/chunkNNNN.*. The
+    invocation that completes the last chunk merges them all and finishes the job.
+    """
+    job_id, index = chunk["job_id"], chunk["index"]
+    job = STORE.get_job(job_id)
+    if job is None:
+        # chunks are counted in the state item, which jobs created before it do not have
+        message = f"Job {job_id} has no state item, so it cannot be converted in chunks"
+        STORE.update_job(job_id, "error", message=message)
+        logger.error(message)
+        return None
+    if job["status"] != "started":
+        # e.g. a retried invocation after another chunk failed
+        logger.warning(f"Job {job_id} is not started, skipping chunk {index}")
+        return None
+    pages = f"pages {chunk['first_page']}-{chunk['last_page']}"
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_filename = f"{temp_dir}/{os.path.basename(chunk['key'])}"
+            get_s3().download_file(chunk["bucket"], chunk["key"], input_filename)
+            output = convert_pdf_pages(
+                input_filename, chunk["first_page"], chunk["last_page"],
+                ConversionProfile.from_dict(chunk.get("profile")),
+            )
+            upload_outputs(output, chunk["bucket"], chunk_prefix(job_id, index), compress=False)
+    except Exception as e:
+        message = f"Failed to process the file ({pages}): {str(e)}"
+        STORE.update_job(job_id, "error", message=message)
+        logger.error(message)
+        raise ConversionError(message) from e
+
+    try:
+        merge = STORE.chunk_done(job_id, index)
+    except ClientError as e:
+        if e.response['Error']['Code'] != "ConditionalCheckFailedException":
+            raise
+        logger.warning(f"Job {job_id} failed in another chunk, dropping chunk {index}")
+        return None
+    logger.info(f"Job {job_id}: chunk {index} ({pages}) converted")
+    if merge:
+        return merge_chunks(chunk)
+    return None
+
+
+def chunk_formats(profile: ConversionProfile):
+    """The outputs each chunk of a job with this profile has (a 'pdf' only if pages were OCR'd)."""
+    formats = pdf_text_formats(profile)
+    return formats + ("pdf",) if OCR_FALLBACK and profile.wants("pdf") else formats
+
+
+def download_chunk_outputs(
+    bucket_name: str,
+    job_id: str,
+    count: int,
+    temp_dir: str,
+    local: Optional[Dict[int, Dict]] = None,
+    formats=None,
+):
+    """
+    Downloads the outputs of every chunk of a job, except those in `local`.
+
+    Args:
+        local (dict, optional): {index: {extension: local_fn}} of chunks converted by this
+        invocation, whose outputs are still on disk
+        formats (tuple, optional): The outputs of the chunks (see `chunk_formats`), all of
+        them by default
+
+    Returns:
+        list: {extension: local_fn} per chunk, in page order. Only chunks with OCR'd pages
+        have a 'pdf'.
+    """
+    local = local or {}
+    formats = formats or chunk_formats(DEFAULT_PROFILE)
+
+    def download(index, fmt):
+        local_fn = f"{temp_dir}/chunk{index:04d}.{fmt}"
+        try:
+            get_s3().download_file(bucket_name, f"{chunk_prefix(job_id, index)}.{fmt}", local_fn)
+        except ClientError as e:
+            if fmt == 'pdf' and e.response['Error']['Code'] in ("404", "NoSuchKey"):
+                return None
+            raise
+        return local_fn
+
+    futures = {
+        (index, fmt): S3_POOL.submit(download, index, fmt)
+        for index in range(count) if index not in local for fmt in formats
+    }
+    parts = [dict(local.get(index, {})) for index in range(count)]
+    for (index, fmt), future in futures.items():
+        local_fn = future.result()
+        if local_fn is not None:
+            parts[index][fmt] = local_fn
+    return parts
+
+
+def extract_pdf_pages(pdf_filename: str, first_page: int, last_page: int, output_filename: str,
+                      timeout: int = 60) -> str:
+    """Copies a page range of a PDF file to a new PDF file with `pdfseparate` and `pdfunite`."""
+    base_path = f"{Path(output_filename).with_suffix('')}-page"
+    run_command_with_timeout(
+        ["pdfseparate", "-f", str(first_page), "-l", str(last_page), pdf_filename, f"{base_path}%d.pdf"],
+        timeout,
+    )
+    pages = [f"{base_path}{page}.pdf" for page in range(first_page, last_page + 1)]
+    run_command_with_timeout(["pdfunite", *pages, output_filename], timeout)
+    return output_filename
+
+
+def merge_chunk_outputs(
+    chunk: Dict[str, Any], parts, temp_dir: str, input_filename: Optional[str] = None
+) -> Dict[str, str]:
+    """
+    Stitches the chunk outputs of a job together, like `convert_pdf_poppler_sharded`.
+    The input PDF (for the pages of a searchable PDF) is downloaded unless `input_filename`
+    is given.
+    """
+    output = {fmt: f"{temp_dir}/merged.{fmt}" for fmt in ('txt', 'html') if fmt in parts[0]}
+    with open(output['txt'], "wb") as out:
+        for part in parts:
+            with open(part['txt'], "rb") as f:
+                shutil.copyfileobj(f, out)
+    if 'html' in output:
+        merge_bbox_html([part['html'] for part in parts], output['html'])
+
+    if any('pdf' in part for part in parts):
+        # searchable PDF: chunks without OCR'd pages contribute their original pages
+        if input_filename is None:
+            input_filename = f"{temp_dir}/{os.path.basename(chunk['key'])}"
+            get_s3().download_file(chunk["bucket"], chunk["key"], input_filename)
+        first_page, last_page = chunk.get("page_range", (1, chunk["page_count"]))
+        ranges = page_shards(first_page, last_page, chunk.get("chunk_pages", FANOUT_CHUNK_PAGES))
+        pdfs = [
+            part.get('pdf') or extract_pdf_pages(
+                input_filename, *ranges[index], f"{temp_dir}/chunk{index:04d}-input.pdf"
+            )
+            for index, part in enumerate(parts)
+        ]
+        output['pdf'] = f"{temp_dir}/merged.pdf"
+        run_command_with_timeout(["pdfunite", *pdfs, output['pdf']], 60)
+    return output
+
+
+def merge_chunks(chunk: Dict[str, Any]):
+    """
+    Merges the chunk outputs of a fanned-out job into its output files and finishes the
+    job, as `handle_s3_event` does for a job converted by one invocation.
+    """
+    bucket_name, object_key, job_id = chunk["bucket"], chunk["key"], chunk["job_id"]
+    profile = ConversionProfile.from_dict(chunk.get("profile"))
+    metrics = JobMetrics(job_id)
+    metrics.dimensions['ContentClass'] = "pdf"
+    metadata = {"route": "fanout", "chunks": chunk["count"]}
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with metrics.stage("download"):
+                parts = download_chunk_outputs(
+                    bucket_name, job_id, chunk["count"], temp_dir, formats=chunk_formats(profile)
+                )
+            with metrics.stage("merge"):
+                output = merge_chunk_outputs(chunk, parts, temp_dir)
+            metrics.set("pages", count_pages(output, 'application/pdf'))
+            if profile.wants("wbox"):
+                with metrics.stage("wordbox"):
+                    add_wordbox(output)
+            output = requested_outputs(output, profile)
+            metrics.set("output_bytes", sum(os.path.getsize(out) for out in output.values()))
+            with metrics.stage("upload"):
+                result = upload_outputs(output, bucket_name, output_prefix_for(object_key))
+
+        if chunk.get("cache_key"):
+            metadata['cache'] = "miss"
+            try:
+                with metrics.stage("cache_store"):
+                    ConversionCache(
+                        get_s3(), bucket_name, CACHE_MAX_AGE_DAYS * 24 * 60 * 60, S3_POOL
+                    ).store(chunk["cache_key"], result)
+            except ClientError as e:
+                logger.warning(f"Failed to store cache entry {chunk['cache_key']}: {str(e)}")
+
+        with metrics.stage("presign"):
+            urls = presign_urls(bucket_name, {'input': object_key, **result})
+        metadata["metrics"] = metrics.as_metadata()
+        with metrics.stage("update_job"):
+            STORE.update_job(job_id, "success", urls=urls, message=None, metadata=metadata)
+    except Exception as e:
+        message = f"Failed to merge the converted pages: {str(e)}"
+        STORE.update_job(job_id, "error", message=message, metadata={"metrics": metrics.as_metadata()})
+        logger.error(message)
+        raise ConversionError(message) from e
+    finally:
+        metrics.emit()
+    return urls
+
+
+def convert_checkpointed(
+    input_filename: str,
+    bucket_name: str,
+    object_key: str,
+    job_id: str,
+    page_count: int,
+    context=None,
+    continuations: int = 0,
+    profile: ConversionProfile = DEFAULT_PROFILE,
+) -> Optional[Dict[str, str]]:
+    """
+    Converts the pages of a PDF the profile asks for CHECKPOINT_UNIT_PAGES pages at a
+    time. The outputs of each unit are uploaded to work/<job_id>/chunkNNNN.* and the job
+    records the pages done, so an invocation that times out and is retried resumes after
+    the last unit done instead of starting over. When the next unit might not finish in
+    the time left, the rest is handed to a new invocation of this function (see
+    `continue_conversion`).
+
+    Every invocation converts at least one unit, so a conversion needs at most one
+    continuation per unit. The job fails instead of being continued again past that, or
+    when CHECKPOINT_MAX_ATTEMPTS invocations already started from the same checkpoint
+    (a unit that does not finish within an invocation).
+
+    Returns:
+        dict: {extension: local_fn} of the merged outputs, or None when another invocation
+        continues the conversion (or the job is no longer started).
+
+    Raises:
+        ValueError: If the job has no state item (created before it), so the caller
+        fails the job instead of leaving it 'started'.
+    """
+    page_range = profile.page_range(page_count)
+    units = page_shards(*page_range, CHECKPOINT_UNIT_PAGES)
+    pages_total = page_range[1] - page_range[0] + 1
+    job = STORE.get_job(job_id)
+    if job is None:
+        # jobs created before the state item have nowhere to record the pages done
+        raise ValueError(f"Job {job_id} has no state item, so it cannot be checkpointed")
+    if job["status"] != "started":
+        logger.warning(f"Job {job_id} is not started, skipping it")
+        return None
+    pages_done = int(job.get("pages_done", 0))
+    if "pages_done" not in job and not STORE.checkpoint(job_id, 0, pages_total):
+        logger.warning(f"Job {job_id} is already being converted by another invocation")
+        return None
+    if pages_done:
+        logger.info(f"Job {job_id}: resuming after {pages_done} of {pages_total} pages")
+    attempt = STORE.checkpoint_attempt(job_id, pages_done)
+    if attempt == 0:
+        logger.warning(f"Job {job_id} is no longer started, skipping it")
+        return None
+    if attempt > CHECKPOINT_MAX_ATTEMPTS:
+        raise TimeoutError(
+            f"Pages after {pages_done} of {pages_total} were not converted in "
+            f"{CHECKPOINT_MAX_ATTEMPTS} invocations"
+        )
+
+    def hand_over():
+        if continuations >= len(units):
+            raise TimeoutError(f"Not converted after {continuations} continuations")
+        continue_conversion(bucket_name, object_key, job_id, continuations)
+
+    def out_of_time(needed_ms):
+        return context is not None and context.get_remaining_time_in_millis() < needed_ms
+
+    temp_dir = os.path.dirname(input_filename)
+    converted = {}  # index -> outputs of the units converted by this invocation
+    slowest_ms = 0
+    for index, (first, last) in enumerate(units):
+        if last - page_range[0] + 1 <= pages_done:
+            continue
+        # every invocation converts at least one unit; the next one may take longer than
+        # the slowest so far
+        if converted and out_of_time(1.5 * slowest_ms + CHECKPOINT_MIN_REMAINING_MS):
+            hand_over()
+            return None
+        start = time.perf_counter()
+        # each unit in its own directory, so the converters' output files don't collide
+        unit_dir = f"{temp_dir}/unit{index:04d}"
+        os.mkdir(unit_dir)
+        unit_filename = f"{unit_dir}/{os.path.basename(input_filename)}"
+        os.symlink(input_filename, unit_filename)
+        output = convert_pdf_pages(unit_filename, first, last, profile)
+        upload_outputs(output, bucket_name, chunk_prefix(job_id, index), compress=False)
+        if not STORE.checkpoint(job_id, last - page_range[0] + 1, pages_total):
+            logger.warning(f"Job {job_id} is no longer started or converted elsewhere, stopping")
+            return None
+        converted[index] = output
+        slowest_ms = max(slowest_ms, (time.perf_counter() - start) * 1000)
+        logger.info(f"Job {job_id}: pages {first}-{last} of {page_count} converted")
+
+    if converted and out_of_time(CHECKPOINT_MIN_REMAINING_MS):
+        hand_over()
+        return None
+    merge_dir = f"{temp_dir}/merge"
+    os.mkdir(merge_dir)
+    parts = download_chunk_outputs(
+        bucket_name, job_id, len(units), merge_dir, converted, chunk_formats(profile)
+    )
+    chunk = {
+        "bucket": bucket_name, "key": object_key, "page_count": page_count,
+        "chunk_pages": CHECKPOINT_UNIT_PAGES, "page_range": page_range,
+    }
+    return merge_chunk_outputs(chunk, parts, merge_dir, input_filename)
+
+
+def continue_conversion(bucket_name: str, object_key: str, job_id: str, continuations: int):
+    """Starts an asynchronous invocation of this function that resumes the conversion."""
+    get_lambda().invoke(
+        FunctionName=os.environ["AWS_LAMBDA_FUNCTION_NAME"],
+        InvocationType="Event",
+        Payload=json.dumps({
+            "detail": {"bucket": {"name": bucket_name}, "object": {"key": object_key}},
+            "continuations": continuations + 1,
+        }),
+    )
+    logger.info(f"Job {job_id}: out of time, continued by invocation {continuations + 1}")
+
+
 def lambda_handler(event, context):
-    logging.debug(json.dumps(event, indent=2))  # use to create test cases
-    logging.debug(os.listdir("/opt"))
-    logging.debug(os.listdir("/opt/lib"))
-    logging.debug(os.listdir("/opt/lib64"))
+    try:
+        return handle_event(event, context)
+    finally:
+        # after the first invocation, which created the clients it needed
+        STARTUP.report_once(logger)
+
+
+def handle_event(event, context):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(json.dumps(event, indent=2))  # use to create test cases
+        for path in ("/opt", "/opt/lib", "/opt/lib64"):
+            logger.debug(os.listdir(path))
+    if "Records" in event:
+        return handle_queue_batch(event["Records"], context)
+    if "chunk" in event:
+        return convert_chunk(event["chunk"])
+    return handle_s3_event(event, context)
+
+
+def handle_queue_batch(records, context):
+    """
+    Converts a batch of SQS records, each holding an S3 "Object Created" EventBridge
+    event, BATCH_WORKERS at a time in this container.
+
+    Returns:
+        dict: The partial batch response: the records to deliver again. These are
+        records that failed before their job was marked as failed (e.g. throttling) and
+        records not started because the invocation was running out of time. A failed
+        conversion is not retried, since its job is already marked as failed.
+    """
+    def convert(record):
+        if context is not None and context.get_remaining_time_in_millis() < BATCH_MIN_REMAINING_MS:
+            return record["messageId"]
+        try:
+            handle_s3_event(json.loads(record["body"]), context)
+        except ConversionError:
+            pass
+        except Exception:
+            logger.exception(f"Message {record['messageId']} failed, returning it to the queue")
+            return record["messageId"]
+        return None
+
+    failed = [message_id for message_id in BATCH_POOL.map(convert, records) if message_id]
+    logger.info(f"Converted {len(records) - len(failed)} of {len(records)} queued documents")
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failed]}
+
+
+def handle_s3_event(event, context=None):
+    """
+    Converts the object of an S3 "Object Created" EventBridge event, or continues a
+    checkpointed conversion (the same event, with the number of `continuations` so far).
+    """
     if 'bucket' in event['detail']:
         bucket_name = event['detail']['bucket']['name']
         object_key = event['detail']['object']['key']
@@ -217,58 +1570,34 @@ def lambda_handler(event, context):
     else:
         logging.info(json.dumps(event, indent=2))
         raise Exception("Not Implemented")
-    result = process_file(bucket_name, object_key, job_id, None)
-    expiration_time_sec = 172800  # 2 days
-    urls = {}
+    metadata = {}
+    metrics = JobMetrics(job_id)
     try:
-        url = s3.generate_presigned_url(
-            ClientMethod='get_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': object_key,
-            },
-            ExpiresIn=expiration_time_sec,
+        with metrics.stage("get_job"):
+            job = STORE.get_job(job_id)
+        if job is not None and job.get("status") not in (None, "started"):
+            # e.g. a retry of an invocation that timed out, after the job was failed
+            logger.warning(f"Job {job_id} already has status={job['status']!r}, skipping it")
+            return None
+        result = process_file(
+            bucket_name, object_key, job_id, job.get("profile") if job else None, metadata,
+            metrics, context, event.get("continuations", 0), job is not None,
         )
-        urls['input'] = url
-        for ext, object_key in result.items():
-            url = s3.generate_presigned_url(
-                ClientMethod='get_object',
-                Params={
-                    'Bucket': bucket_name,
-                    'Key': object_key,
-                },
-                ExpiresIn=expiration_time_sec,
-            )
-            urls[ext] = url
-        update_job(job_id, "success", urls=urls, message=None, metadata=None)
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'message': f'Error generating presigned URL: {str(e)}'})
-        }
+        if result is None:
+            return None  # fanned out or continued; another invocation finishes the job
+        try:
+            # sign every URL in one pass, then write the job record once
+            with metrics.stage("presign"):
+                urls = presign_urls(bucket_name, {'input': object_key, **result})
+            metadata["metrics"] = metrics.as_metadata()
+            with metrics.stage("update_job"):
+                STORE.update_job(job_id, "success", urls=urls, message=None, metadata=metadata)
+        except Exception as e:
+            return {
+                'statusCode': 500,
+                'body': json.dumps({'message': f'Error generating presigned URL: {str(e)}'})
+            }
+    finally:
+        metrics.emit()
     return urls
 
-
-def update_job(job_id, status, urls=None, message=None, metadata=None):
-    try:
-        item = {
-            "job_id": job_id,
-            "created_at": datetime.utcnow().isoformat(),
-            "status": status,
-            "ttl": int(time.time()) + (TTL_DAYS * 24 * 60 * 60),
-        }
-
-        if status == "success" and urls:
-            item["urls"] = urls
-        elif message:
-            item["message"] = message
-
-        if metadata:
-            item["metadata"] = metadata
-
-        _ = TABLE.put_item(Item=item)
-        logger.info(f"Job {job_id} with status={status!r} updated successfully")
-    except ClientError as e:
-        msg = f"Error updating job {job_id}: {e.response['Error']['Message']}"
-        logger.error(msg)
-        raise
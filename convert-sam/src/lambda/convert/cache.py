@@ -0,0 +1,115 @@
+"""
+Content-addressed cache of conversion outputs
+
+Entries are stored in the data bucket under cache/<key>/, where the key is a hash of the
+input file and the conversion settings. Each entry holds copies of the output files and
+a manifest that is written last, so an entry only becomes visible once it is complete.
+
+The bucket lifecycle rule expires cache objects like any other object. An entry is only
+used while its manifest is younger than `max_age_seconds` (the lifecycle window); older
+or partially expired entries are evicted and reported as a miss.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Union
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+CACHE_PREFIX = "cache"
+MISSING_KEY_ERRORS = ("404", "NoSuchKey")
+
+
+def cache_key(source: Union[str, bytes], settings: Dict[str, Any]) -> str:
+    """SHA-256 of the file contents (file name, or the contents) and the conversion settings."""
+    digest = hashlib.sha256()
+    if isinstance(source, bytes):
+        digest.update(source)
+    else:
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    def __init__(self, s3, bucket_name: str, max_age_seconds: int, pool=None):
+        self.s3 = s3
+        self.bucket_name = bucket_name
+        self.max_age_seconds = max_age_seconds
+        self.pool = pool  # optional executor, to run the copies of an entry concurrently
+
+    def _copy_all(self, copies: Dict[str, str]) -> None:
+        """Server-side copies {destination key: source key}."""
+        def copy(item):
+            destination, source = item
+            self.s3.copy_object(
+                Bucket=self.bucket_name,
+                Key=destination,
+                CopySource={'Bucket': self.bucket_name, 'Key': source},
+            )
+        if self.pool is None:
+            list(map(copy, copies.items()))
+        else:
+            list(self.pool.map(copy, copies.items()))
+
+    def _manifest_key(self, key: str) -> str:
+        return f"{CACHE_PREFIX}/{key}/manifest.json"
+
+    def lookup(self, key: str) -> Optional[Dict[str, str]]:
+        """Returns {format: cached object key} for a valid entry, or None."""
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=self._manifest_key(key))
+        except ClientError as e:
+            if e.response['Error']['Code'] in MISSING_KEY_ERRORS:
+                return None
+            raise
+        age = (datetime.now(timezone.utc) - response['LastModified']).total_seconds()
+        manifest = json.loads(response['Body'].read())
+        if age > self.max_age_seconds:
+            logger.info(f"Cache entry {key} is {age:.0f}s old, evicting")
+            self.evict(key, manifest['outputs'])
+            return None
+        return manifest['outputs']
+
+    def restore(self, key: str, output_prefix: str) -> Optional[Dict[str, str]]:
+        """
+        Copies the outputs of a cache entry to `output_prefix`.
+
+        Returns:
+            dict: {format: object key} of the copies, or None on a cache miss.
+        """
+        outputs = self.lookup(key)
+        if outputs is None:
+            return None
+        result = {fmt: f"{output_prefix}.{fmt}" for fmt in outputs}
+        try:
+            self._copy_all({result[fmt]: cached_key for fmt, cached_key in outputs.items()})
+        except ClientError as e:
+            if e.response['Error']['Code'] not in MISSING_KEY_ERRORS:
+                raise
+            logger.info(f"Cache entry {key} is partially expired, evicting")
+            self.evict(key, outputs)
+            return None
+        return result
+
+    def store(self, key: str, result: Dict[str, str]) -> None:
+        """Copies the outputs {format: object key} of a conversion into a new cache entry."""
+        outputs = {fmt: f"{CACHE_PREFIX}/{key}/output.{fmt}" for fmt in result}
+        self._copy_all({outputs[fmt]: object_key for fmt, object_key in result.items()})
+        self.s3.put_object(
+            Bucket=self.bucket_name,
+            Key=self._manifest_key(key),
+            Body=json.dumps({'outputs': outputs}),
+            ContentType='application/json',
+        )
+        logger.info(f"Stored cache entry {key}")
+
+    def evict(self, key: str, outputs: Dict[str, str]) -> None:
+        """Deletes a cache entry, manifest first so it stops being visible."""
+        for object_key in [self._manifest_key(key), *outputs.values()]:
+            self.s3.delete_object(Bucket=self.bucket_name, Key=object_key)
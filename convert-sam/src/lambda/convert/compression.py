@@ -0,0 +1,92 @@
+"""
+Streaming compression of output files for upload
+
+The text and html outputs are compressed while the uploader reads them, one chunk at a
+time, so neither the output nor its compressed form is ever held in memory whole. The
+objects are stored with a Content-Encoding, so browsers (and most HTTP clients) decode
+the presigned downloads transparently.
+
+gzip uses zlib from the standard library. zstd needs the `zstandard` package, which is
+not part of the Lambda runtime; without it, zstd falls back to gzip.
+"""
+import io
+import logging
+import zlib
+
+logger = logging.getLogger()
+
+ENCODINGS = ("gzip", "zstd")
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+CHUNK_SIZE = 1024 * 1024  # bytes read from the source per compress call
+
+
+def zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def configured_encoding(name: str):
+    """
+    The Content-Encoding for the OUTPUT_COMPRESSION setting, or None for "none".
+
+    Raises:
+        ValueError: For an unknown setting.
+    """
+    name = name.strip().lower()
+    if name in ("", "none"):
+        return None
+    if name not in ENCODINGS:
+        raise ValueError(f"Unknown output compression {name!r}, expected one of none, {', '.join(ENCODINGS)}")
+    if name == "zstd" and not zstd_available():
+        logger.warning("zstandard is not installed, compressing outputs with gzip instead")
+        return "gzip"
+    return name
+
+
+def compressor(encoding: str, level=None):
+    """A streaming compressor (`compress(data)`, then `flush()`) for a Content-Encoding."""
+    level = DEFAULT_LEVELS[encoding] if level is None else level
+    if encoding == "gzip":
+        # wbits 16 + 15 writes the gzip header and trailer
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise ValueError(f"Unknown encoding {encoding!r}")
+
+
+class CompressingReader(io.RawIOBase):
+    """
+    Read-only stream of the compressed bytes of `source` (a binary file object). At most
+    one chunk of input and its compressed output are buffered at a time.
+    """
+
+    def __init__(self, source, encoding: str, level=None, chunk_size: int = CHUNK_SIZE):
+        self.source = source
+        self.chunk_size = chunk_size
+        self._compressor = compressor(encoding, level)
+        self._buffer = bytearray()
+        self._eof = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self._buffer) < len(b) and not self._eof:
+            chunk = self.source.read(self.chunk_size)
+            if chunk:
+                self.bytes_in += len(chunk)
+                self._buffer += self._compressor.compress(chunk)
+            else:
+                self._buffer += self._compressor.flush()
+                self._eof = True
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        del self._buffer[:size]
+        self.bytes_out += size
+        return size
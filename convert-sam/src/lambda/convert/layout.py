@@ -0,0 +1,178 @@
+"""
+Helpers for the XHTML layout files written by `pdftotext -bbox-layout` (bbox) and
+`tesseract ... hocr` (hOCR)
+"""
+import xml.etree.ElementTree as ET
+from typing import BinaryIO, Dict, List, TextIO, Union
+from xml.sax.saxutils import escape
+
+
+def _local_name(tag: str) -> str:
+    """Strips the XHTML namespace from an element tag."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def bbox_to_text(source: Union[str, BinaryIO], out: TextIO) -> None:
+    """
+    Writes the plain text of a bbox-layout document, in reading order.
+
+    The document is read with a streaming parser and every page is discarded once its
+    text is written, so memory use does not grow with the page count. Words of a line are
+    separated by spaces, flows by a blank line and pages by a form feed, like the
+    plain `pdftotext` output.
+
+    Args:
+        source (str or file): bbox-layout file name or binary file object.
+        out (file): Text file object the plain text is written to.
+    """
+    words = []
+    for _, elem in ET.iterparse(source, events=("end",)):
+        name = _local_name(elem.tag)
+        if name == "word":
+            words.append(elem.text or "")
+        elif name == "line":
+            out.write(" ".join(words) + "\n")
+            words = []
+            elem.clear()
+        elif name == "flow":
+            out.write("\n")
+            elem.clear()
+        elif name == "page":
+            out.write("\f")
+            elem.clear()
+
+
+def merge_bbox_html(part_filenames: List[str], output_filename: str) -> str:
+    """
+    Stitches several bbox-layout files (one per page range) into a single document.
+
+    The header is taken from the first part and the trailer from the last part; the
+    <page> elements of every part are copied in order. Files are streamed line by line,
+    so memory use does not grow with the page count.
+
+    Args:
+        part_filenames (list): bbox-layout files, in page order.
+        output_filename (str): Path of the merged file.
+
+    Returns:
+        str: The path of the merged file.
+    """
+    last_index = len(part_filenames) - 1
+    with open(output_filename, "w", encoding="utf-8") as out:
+        for index, part_filename in enumerate(part_filenames):
+            section = "head"
+            with open(part_filename, encoding="utf-8") as part:
+                for line in part:
+                    stripped = line.strip()
+                    if section == "head":
+                        if index == 0:
+                            out.write(line)
+                        if stripped == "<doc>":
+                            section = "pages"
+                    elif section == "pages":
+                        if stripped == "</doc>":
+                            section = "tail"
+                            if index == last_index:
+                                out.write(line)
+                        else:
+                            out.write(line)
+                    elif index == last_index:
+                        out.write(line)
+    return output_filename
+
+
+def hocr_bbox(title: str):
+    """Parses the "bbox x0 y0 x1 y1" property of an hOCR title attribute."""
+    for prop in title.split(";"):
+        fields = prop.split()
+        if fields and fields[0] == "bbox":
+            return [float(v) for v in fields[1:5]]
+    return None
+
+
+def _bbox_attrs(bbox, scale: float) -> str:
+    x0, y0, x1, y1 = (v * scale for v in bbox)
+    return f'xMin="{x0:f}" yMin="{y0:f}" xMax="{x1:f}" yMax="{y1:f}"'
+
+
+def hocr_to_bbox_page(source: Union[str, BinaryIO], dpi: int) -> str:
+    """
+    Converts the words of a single-page hOCR document to bbox-layout page content.
+
+    hOCR content areas, paragraphs, lines and words map to bbox flows, blocks, lines and
+    words. hOCR coordinates are pixels at `dpi`; they are scaled to PDF points to match
+    the coordinates written by `pdftotext -bbox-layout`.
+
+    Args:
+        source (str or file): hOCR file name or binary file object.
+        dpi (int): Resolution the page image was OCR'd at.
+
+    Returns:
+        str: The flows of the page, to be placed inside a bbox <page> element.
+    """
+    scale = 72.0 / dpi
+    line_classes = ("ocr_line", "ocr_caption", "ocr_header", "ocr_textfloat")
+    parts = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        ocr_class = elem.get("class")
+        bbox = hocr_bbox(elem.get("title", ""))
+        attrs = f" {_bbox_attrs(bbox, scale)}" if bbox else ""
+        if event == "start":
+            if ocr_class == "ocr_carea":
+                parts.append("<flow>\n")
+            elif ocr_class == "ocr_par":
+                parts.append(f"<block{attrs}>\n")
+            elif ocr_class in line_classes:
+                parts.append(f"<line{attrs}>\n")
+        elif ocr_class == "ocrx_word":
+            text = "".join(elem.itertext()).strip()
+            if text:
+                parts.append(f"<word{attrs}>{escape(text)}</word>\n")
+            elem.clear()
+        elif ocr_class == "ocr_carea":
+            parts.append("</flow>\n")
+        elif ocr_class == "ocr_par":
+            parts.append("</block>\n")
+        elif ocr_class in line_classes:
+            parts.append("</line>\n")
+    return "".join(parts)
+
+
+def replace_bbox_pages(
+    html_filename: str, page_contents: Dict[int, str], output_filename: str
+) -> str:
+    """
+    Copies a bbox-layout document, replacing the content of some of its pages.
+
+    Args:
+        html_filename (str): bbox-layout file to copy.
+        page_contents (dict): {page index (0-based, in document order): new page content}
+        output_filename (str): Path of the new file.
+
+    Returns:
+        str: The path of the new file.
+    """
+    page_index = -1
+    skipping = False
+    with open(html_filename, encoding="utf-8") as src, \
+            open(output_filename, "w", encoding="utf-8") as out:
+        for line in src:
+            stripped = line.strip()
+            if stripped.startswith("<page "):
+                page_index += 1
+                if page_index not in page_contents:
+                    out.write(line)
+                    continue
+                # an empty page may be written as <page ...></page> on a single line
+                out.write(line[:line.index(">") + 1] + "\n")
+                out.write(page_contents[page_index])
+                if stripped.endswith("</page>"):
+                    out.write("</page>\n")
+                else:
+                    skipping = True
+                continue
+            if stripped == "</page>":
+                skipping = False
+            if not skipping:
+                out.write(line)
+    return output_filename
@@ -0,0 +1,85 @@
+"""
+Per-job latency and resource metrics
+
+Metrics are printed as one CloudWatch Embedded Metric Format (EMF) line per job, so
+CloudWatch turns them into metrics and the log line stays machine-parsable, and they are
+stored (as integers, which DynamoDB accepts) in the job record's `metadata`.
+"""
+import json
+import resource
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+NAMESPACE = "DocumentConversion"
+UNITS = {
+    "input_bytes": "Bytes",
+    "output_bytes": "Bytes",
+    "pages": "Count",
+    "peak_rss_mb": "Megabytes",
+    "peak_child_rss_mb": "Megabytes",
+}
+
+
+def peak_rss_mb() -> Dict[str, int]:
+    """
+    Peak resident memory of this process and of its largest child process (tesseract,
+    pdftotext, ...). Both are high-water marks over the lifetime of the container.
+    """
+    # ru_maxrss is in kilobytes on Linux
+    return {
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+        "peak_child_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // 1024,
+    }
+
+
+class JobMetrics:
+    """Collects the duration of each stage of a job, plus sizes and peak memory"""
+
+    def __init__(self, job_id: str = None):
+        self.job_id = job_id
+        self.stages = {}
+        self.values = {}
+        self.dimensions = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """Context manager that records the wall time of `name`, in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = (time.perf_counter() - start) * 1000
+
+    def set(self, name: str, value: int) -> None:
+        self.values[name] = value
+
+    def as_metadata(self) -> Dict[str, object]:
+        """The metrics in the form stored in the job record."""
+        return {
+            "stages_ms": {name: round(ms) for name, ms in self.stages.items()},
+            **self.values,
+            **peak_rss_mb(),
+        }
+
+    def emit(self) -> None:
+        """Prints the metrics as a CloudWatch EMF log line."""
+        values = {**self.values, **peak_rss_mb()}
+        definitions = [{"Name": f"{name}_ms", "Unit": "Milliseconds"} for name in self.stages]
+        definitions += [{"Name": name, "Unit": UNITS.get(name, "None")} for name in values]
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [list(self.dimensions)],
+                    "Metrics": definitions,
+                }],
+            },
+            "job_id": self.job_id,
+            **self.dimensions,
+            **{f"{name}_ms": round(ms, 1) for name, ms in self.stages.items()},
+            **values,
+        }
+        # EMF must be the whole log line, so bypass the logging formatter
+        print(json.dumps(record), flush=True)
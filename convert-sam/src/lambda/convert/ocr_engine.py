@@ -0,0 +1,158 @@
+"""
+In-process Tesseract OCR through the Tesseract C API (libtesseract)
+
+Loading the traineddata takes longer than recognizing a small image, so engines are
+created once per container and reused by later (warm) invocations. The outputs are
+written by the same renderers the `tesseract` command uses.
+
+A TessBaseAPI handle must only be used by one thread at a time; ENGINES hands out idle
+engines and creates a new one when all of them are busy.
+"""
+import ctypes
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+logger = logging.getLogger()
+
+LIBRARY_NAMES = ("libtesseract.so.5", "libtesseract.so.4", "libtesseract.so")
+
+_lib = None
+_lib_lock = threading.Lock()
+
+
+class OCREngineError(Exception):
+    # Raised when libtesseract cannot be loaded or fails to process an image
+    pass
+
+
+def _declare(lib):
+    vp, cp, c_int = ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int
+    signatures = {
+        "TessBaseAPICreate": ([], vp),
+        "TessBaseAPIInit3": ([vp, cp, cp], c_int),
+        "TessBaseAPIGetDatapath": ([vp], cp),
+        "TessBaseAPIDelete": ([vp], None),
+        "TessBaseAPIProcessPages": ([vp, cp, cp, c_int, vp], c_int),
+        "TessBaseAPISetVariable": ([vp, cp, cp], c_int),
+        "TessHOcrRendererCreate": ([cp], vp),
+        "TessPDFRendererCreate": ([cp, cp, c_int], vp),
+        "TessTextRendererCreate": ([cp], vp),
+        "TessResultRendererInsert": ([vp, vp], None),
+        "TessDeleteResultRenderer": ([vp], None),
+    }
+    for name, (argtypes, restype) in signatures.items():
+        func = getattr(lib, name)
+        func.argtypes = argtypes
+        func.restype = restype
+
+
+def load_library():
+    """Loads libtesseract (TESSERACT_LIBRARY, or the first of LIBRARY_NAMES found)."""
+    global _lib
+    with _lib_lock:
+        if _lib is None:
+            names = [os.environ["TESSERACT_LIBRARY"]] if os.environ.get("TESSERACT_LIBRARY") \
+                else LIBRARY_NAMES
+            errors = []
+            for name in names:
+                try:
+                    lib = ctypes.CDLL(name)
+                    break
+                except OSError as e:
+                    errors.append(str(e))
+            else:
+                raise OCREngineError(f"Could not load libtesseract: {'; '.join(errors)}")
+            _declare(lib)
+            _lib = lib
+    return _lib
+
+
+class TesseractEngine:
+    """One initialized TessBaseAPI handle"""
+
+    def __init__(self, language: str = "eng", datapath: Optional[str] = None):
+        self.lib = load_library()
+        self.handle = self.lib.TessBaseAPICreate()
+        datapath = datapath or os.environ.get("TESSDATA_PREFIX")
+        if self.lib.TessBaseAPIInit3(
+            self.handle, datapath.encode() if datapath else None, language.encode()
+        ) != 0:
+            self.lib.TessBaseAPIDelete(self.handle)
+            raise OCREngineError(f"Could not initialize tesseract for language {language!r}")
+        self.language = language
+        self.datapath = self.lib.TessBaseAPIGetDatapath(self.handle)
+
+    def _renderer(self, fmt: str, output_base: bytes):
+        if fmt == "hocr":
+            return self.lib.TessHOcrRendererCreate(output_base)
+        if fmt == "pdf":
+            return self.lib.TessPDFRendererCreate(output_base, self.datapath, 0)
+        if fmt == "txt":
+            return self.lib.TessTextRendererCreate(output_base)
+        raise OCREngineError(f"Unsupported output format {fmt!r}")
+
+    def process(
+        self, image_filename: str, output_base: str, formats: Sequence[str], timeout: int = 60,
+        dpi: Optional[int] = None,
+    ) -> None:
+        """
+        OCRs an image and writes <output_base>.<format> for each of `formats`
+        ("pdf", "hocr", "txt"). `dpi` overrides the resolution recorded in the image, as
+        the command's --dpi does.
+
+        Raises:
+            OCREngineError: If the image cannot be processed.
+        """
+        first = None
+        for fmt in formats:
+            renderer = self._renderer(fmt, output_base.encode())
+            if not renderer:
+                raise OCREngineError(f"Could not create the {fmt} renderer")
+            if first is None:
+                first = renderer
+            else:
+                self.lib.TessResultRendererInsert(first, renderer)
+        # engines are reused, so the variable is set (or reset to 0, unset) every time
+        self.lib.TessBaseAPISetVariable(self.handle, b"user_defined_dpi", str(dpi or 0).encode())
+        try:
+            ok = self.lib.TessBaseAPIProcessPages(
+                self.handle, image_filename.encode(), None, timeout * 1000, first
+            )
+        finally:
+            # deleting the first renderer deletes the whole chain
+            self.lib.TessDeleteResultRenderer(first)
+        if not ok:
+            raise OCREngineError(f"Tesseract failed to process {image_filename}")
+
+    def close(self):
+        self.lib.TessBaseAPIDelete(self.handle)
+
+
+class EnginePool:
+    """Idle engines, kept for the lifetime of the container"""
+
+    def __init__(self, language: str = "eng"):
+        self.language = language
+        self._idle = queue.SimpleQueue()
+
+    def warm_up(self) -> None:
+        """Creates an engine ahead of the first request."""
+        self._idle.put(TesseractEngine(self.language))
+
+    @contextmanager
+    def engine(self):
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            engine = TesseractEngine(self.language)
+        try:
+            yield engine
+        finally:
+            self._idle.put(engine)
+
+
+ENGINES = EnginePool()
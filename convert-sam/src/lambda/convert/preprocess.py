@@ -0,0 +1,225 @@
+"""
+Image preprocessing ahead of Tesseract
+
+Phone photos are often 12+ megapixel RGB images, far more than Tesseract needs: OCR time
+and memory grow with the pixel count, not with the text. Preprocessing decodes the image,
+scales it down to a target resolution, converts it to grayscale, binarizes it (Otsu) and
+straightens it (projection-profile deskew), then hands Tesseract a compact PNG.
+
+Each step is enabled separately with PREPROCESS_STEPS (comma separated; empty disables
+preprocessing). The searchable PDF and the hOCR coordinates are then those of the
+preprocessed image.
+
+Requires NumPy and Pillow, which are not part of the Lambda runtime (add them with a
+layer). When they are missing, or an image cannot be decoded, the original image is OCR'd.
+"""
+import io
+import logging
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger()
+
+STEPS = ("resize", "grayscale", "binarize", "deskew")
+# at most this many dark pixels are sampled to estimate the skew
+DESKEW_SAMPLE_PIXELS = 200_000
+
+_modules = None
+_modules_lock = threading.Lock()
+
+
+class PreprocessError(Exception):
+    # Raised when NumPy or Pillow is missing or an image cannot be preprocessed
+    pass
+
+
+def load_modules():
+    """Imports NumPy and Pillow on first use, so containers that don't preprocess don't pay for them."""
+    global _modules
+    with _modules_lock:
+        if _modules is None:
+            try:
+                import numpy
+                from PIL import Image
+            except ImportError as e:
+                raise PreprocessError(f"Image preprocessing needs numpy and Pillow: {e}") from e
+            _modules = (numpy, Image)
+    return _modules
+
+
+def otsu_threshold(gray) -> int:
+    """The gray level that best separates dark and light pixels (Otsu's method)."""
+    np, _ = load_modules()
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight_dark = np.cumsum(histogram)
+    weight_light = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(histogram * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    between_class_variance = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return int(np.argmax(between_class_variance))
+
+
+def estimate_skew(dark, max_angle: float, step: float) -> float:
+    """
+    Skew of the text lines in a boolean mask of dark pixels, in degrees (counterclockwise).
+
+    For each candidate angle the dark pixels are projected onto the rotated vertical axis;
+    aligned text lines give the most sharply peaked profile (largest sum of squares). All
+    candidate angles are evaluated in one vectorized pass over a sample of the pixels.
+    """
+    np, _ = load_modules()
+    ys, xs = np.nonzero(dark)
+    if len(ys) == 0:
+        return 0.0
+    if len(ys) > DESKEW_SAMPLE_PIXELS:
+        keep = np.random.default_rng(0).choice(len(ys), DESKEW_SAMPLE_PIXELS, replace=False)
+        ys, xs = ys[keep], xs[keep]
+    angles = np.arange(-max_angle, max_angle + step / 2, step)
+    radians = np.deg2rad(angles)[:, None]
+    rows = np.rint(ys * np.cos(radians) + xs * np.sin(radians)).astype(np.int64)
+    rows -= rows.min(axis=1, keepdims=True)
+    width = int(rows.max()) + 1
+    # one bincount for all angles: offset each angle's rows into its own range
+    offsets = (np.arange(len(angles)) * width)[:, None]
+    profiles = np.bincount((rows + offsets).ravel(), minlength=len(angles) * width)
+    scores = (profiles.reshape(len(angles), width).astype(np.float64) ** 2).sum(axis=1)
+    return float(angles[int(np.argmax(scores))])
+
+
+class Preprocessor:
+    def __init__(
+        self,
+        steps=(),
+        target_dpi: int = 300,
+        page_short_side_in: float = 8.5,
+        max_skew_deg: float = 5.0,
+        skew_step_deg: float = 0.25,
+    ):
+        unknown = set(steps) - set(STEPS)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing steps {sorted(unknown)}, expected {STEPS}")
+        self.steps = tuple(step for step in STEPS if step in steps)
+        self.target_dpi = target_dpi
+        self.page_short_side_in = page_short_side_in
+        self.max_skew_deg = max_skew_deg
+        self.skew_step_deg = skew_step_deg
+
+    @classmethod
+    def from_env(cls):
+        steps = os.environ.get("PREPROCESS_STEPS", "")
+        return cls(
+            steps=[step.strip() for step in steps.split(",") if step.strip()],
+            target_dpi=int(os.environ.get("PREPROCESS_TARGET_DPI", "300")),
+            page_short_side_in=float(os.environ.get("PREPROCESS_PAGE_SHORT_SIDE_IN", "8.5")),
+            max_skew_deg=float(os.environ.get("PREPROCESS_MAX_SKEW_DEG", "5")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.steps)
+
+    def settings(self) -> dict:
+        """The settings that change the preprocessed image (part of the cache key)."""
+        return {
+            "steps": list(self.steps),
+            "target_dpi": self.target_dpi,
+            "page_short_side_in": self.page_short_side_in,
+            "max_skew_deg": self.max_skew_deg,
+        }
+
+    def source_dpi(self, image, dpi: Optional[int] = None) -> float:
+        """
+        Resolution of an image: `dpi` if given (the job's profile), else the recorded one.
+        Scanners record it; cameras record a nominal 72 dpi or nothing, so below 150 dpi
+        the image is assumed to show a page whose short side is `page_short_side_in` inches.
+        """
+        if dpi:
+            return float(dpi)
+        dpi = image.info.get("dpi", (0, 0))[0]
+        if dpi and dpi >= 150:
+            return float(dpi)
+        return min(image.size) / self.page_short_side_in
+
+    def process(self, data: bytes, dpi: Optional[int] = None) -> bytes:
+        """
+        Preprocesses an encoded image, of resolution `dpi` if given (see `source_dpi`).
+
+        Returns:
+            bytes: A PNG image with the resolution recorded, for Tesseract.
+
+        Raises:
+            PreprocessError: If NumPy or Pillow is missing or the image cannot be decoded.
+        """
+        np, Image = load_modules()
+        to_gray = "grayscale" in self.steps or "binarize" in self.steps
+        try:
+            image = Image.open(io.BytesIO(data))
+            if getattr(image, "n_frames", 1) > 1:
+                raise PreprocessError("Multi-page images are OCR'd as uploaded")
+            dpi = self.source_dpi(image, dpi)
+            scale = min(1.0, self.target_dpi / dpi) if "resize" in self.steps else 1.0
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            if scale < 1.0:
+                # JPEG images can be decoded at 1/2, 1/4 or 1/8 size directly
+                image.draft("L" if to_gray else None, size)
+            if image.mode not in ("L", "RGB"):
+                # palette, LA, RGBA, CMYK... images keep their colour unless made gray
+                gray_only = image.mode in ("1", "I", "I;16", "F")
+                image = image.convert("L" if to_gray or gray_only else "RGB")
+            if scale < 1.0:
+                image = image.resize(size, Image.BOX if image.width >= 2 * size[0] else Image.BILINEAR)
+                dpi *= scale
+            pixels = np.asarray(image)
+        except PreprocessError:
+            raise
+        except Exception as e:
+            raise PreprocessError(f"Cannot decode the image: {e}") from e
+
+        gray = pixels
+        if pixels.ndim == 3 and (to_gray or "deskew" in self.steps):
+            # ITU-R BT.601 luma in 8.8 fixed point, one 16-bit plane at a time
+            gray = pixels[..., 0].astype(np.uint16) * 77
+            gray += pixels[..., 1].astype(np.uint16) * 150
+            gray += pixels[..., 2].astype(np.uint16) * 29
+            gray = (gray >> 8).astype(np.uint8)
+        if to_gray:
+            pixels = gray
+
+        dark = None
+        if "binarize" in self.steps or "deskew" in self.steps:
+            dark = gray <= otsu_threshold(gray)
+        if "binarize" in self.steps:
+            pixels = np.where(dark, 0, 255).astype(np.uint8)
+
+        fill = 255 if pixels.ndim == 2 else (255, 255, 255)
+        image = Image.fromarray(pixels)
+        if "deskew" in self.steps:
+            angle = estimate_skew(dark, self.max_skew_deg, self.skew_step_deg)
+            if angle:
+                logger.info(f"Deskewing the image by {angle:.2f} degrees")
+                image = image.rotate(-angle, resample=Image.BILINEAR, expand=True, fillcolor=fill)
+        if "binarize" in self.steps:
+            # 1 bit per pixel PNG; also re-thresholds the gray edges left by rotating
+            image = image.convert("1", dither=Image.Dither.NONE)
+
+        out = io.BytesIO()
+        image.save(out, format="PNG", dpi=(round(dpi), round(dpi)), compress_level=1)
+        logger.info(
+            f"Preprocessed a {len(data)} byte image to {len(out.getvalue())} bytes "
+            f"({image.width}x{image.height} at {dpi:.0f} dpi)"
+        )
+        return out.getvalue()
+
+
+def preprocess_image(
+    preprocessor: Preprocessor, data: bytes, dpi: Optional[int] = None
+) -> Optional[bytes]:
+    """`preprocessor.process(data, dpi)`, or None (OCR the original) if it fails."""
+    try:
+        return preprocessor.process(data, dpi)
+    except PreprocessError as e:
+        logger.warning(f"Image not preprocessed: {e}")
+        return None
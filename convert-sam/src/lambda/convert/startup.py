@@ -0,0 +1,54 @@
+"""
+Startup profiling for the convert Lambda
+
+With PROFILE_STARTUP=true the time spent importing each dependency and creating each
+client is recorded, and logged once at the end of the first invocation of the container
+(clients are created on first use, so during it). Phases that finish later, e.g. a client
+first used by a later invocation, are logged on their own. When profiling is off, `phase`
+is a no-op.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class StartupProfile:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.timings = {}
+        self.reported = False
+        self.logger = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.environ.get("PROFILE_STARTUP", "false").lower() == "true")
+
+    def phase(self, name: str):
+        """Context manager that records the duration of `name`, in milliseconds."""
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 1)
+            if self.reported:
+                self.logger.info(f"Startup profile (ms): {json.dumps({name: self.timings[name]})}")
+
+    def report_once(self, logger: logging.Logger) -> None:
+        """Logs the profile, on the first call only."""
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        self.logger = logger
+        logger.info("Startup profile (ms): " + json.dumps({
+            "since_module_load": round((time.perf_counter() - self.started) * 1000, 1),
+            **self.timings,
+        }))
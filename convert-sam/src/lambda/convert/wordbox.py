@@ -0,0 +1,261 @@
+"""
+Word boxes: a compact columnar form of the words in a layout file
+
+The html outputs (`pdftotext -bbox-layout` for PDFs, hOCR for images) are parsed once,
+with a streaming parser, into fixed-width columns:
+
+- pages: width, height
+- lines: page id, bounding box
+- words: page id, line id, text id, bounding box, confidence (0-100, -1 when unknown)
+
+and a string table of the distinct word texts. Ids are indexes into the columns, in
+document order. Coordinates are as in the source: PDF points for bbox-layout, pixels for
+hOCR (see `WordBoxes.unit`).
+
+The file is a header followed by the columns, each a little-endian array of 4-byte
+values starting at a multiple of 4, and the string table (offsets into a UTF-8 blob), so
+`WordBoxes` reads the columns in place as memoryviews of the bytes or of a memory-mapped
+file, without parsing or copying them.
+"""
+import mmap
+import struct
+import sys
+import xml.etree.ElementTree as ET
+from array import array
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Tuple, Union
+
+from layout import _local_name, hocr_bbox
+
+MAGIC = b"WBOX"
+VERSION = 1
+UNITS = ("pt", "px")
+# magic, version, unit, then the number of pages, lines, words and strings, and the
+# size of the string blob
+HEADER = struct.Struct("<4sHHIIIII")
+NO_CONFIDENCE = -1.0
+LINE_CLASSES = ("ocr_line", "ocr_caption", "ocr_header", "ocr_textfloat")
+
+# (name, typecode, values per row, row count index in the header counts)
+COLUMNS = (
+    ("page_size", "f", 2, 0),
+    ("line_page", "I", 1, 1),
+    ("line_bbox", "f", 4, 1),
+    ("word_page", "I", 1, 2),
+    ("word_line", "I", 1, 2),
+    ("word_text", "I", 1, 2),
+    ("word_bbox", "f", 4, 2),
+    ("word_conf", "f", 1, 2),
+)
+
+
+class WordBoxError(ValueError):
+    # Raised for a file that is not a word box file of a supported version
+    pass
+
+
+class Word(NamedTuple):
+    page: int
+    line: int
+    text: str
+    bbox: Tuple[float, float, float, float]
+    conf: float
+
+
+class _Columns:
+    """The columns of a document being parsed, as arrays of 4-byte values."""
+
+    def __init__(self):
+        for name, typecode, _, _ in COLUMNS:
+            setattr(self, name, array(typecode))
+        self.strings = {}
+
+    def page(self, width: float, height: float):
+        self.page_size.extend((width, height))
+
+    def line(self, bbox):
+        self.line_page.append(len(self.page_size) // 2 - 1)
+        self.line_bbox.extend(bbox or (0.0, 0.0, 0.0, 0.0))
+
+    def word(self, text: str, bbox, conf: float):
+        if not self.line_page or self.line_page[-1] != len(self.page_size) // 2 - 1:
+            self.line(bbox)  # a word outside any line gets a line of its own
+        self.word_page.append(len(self.page_size) // 2 - 1)
+        self.word_line.append(len(self.line_page) - 1)
+        self.word_text.append(self.strings.setdefault(text, len(self.strings)))
+        self.word_bbox.extend(bbox or (0.0, 0.0, 0.0, 0.0))
+        self.word_conf.append(conf)
+
+
+def _bbox_layout_box(elem):
+    return [float(elem.get(attr, 0)) for attr in ("xMin", "yMin", "xMax", "yMax")]
+
+
+def _hocr_conf(title: str) -> float:
+    for prop in title.split(";"):
+        fields = prop.split()
+        if len(fields) == 2 and fields[0] == "x_wconf":
+            return float(fields[1])
+    return NO_CONFIDENCE
+
+
+def parse_layout(source: Union[str, BinaryIO]) -> Tuple[_Columns, str]:
+    """
+    Reads the pages, lines and words of a bbox-layout or hOCR document.
+
+    The document is read with a streaming parser and every word and line is discarded
+    once it is added to the columns, so only the columns grow with the document.
+
+    Returns:
+        tuple: (columns, unit)
+    """
+    columns = _Columns()
+    unit = "pt"
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        ocr_class = elem.get("class")
+        if event == "start":
+            name = _local_name(elem.tag)
+            if name == "page":
+                columns.page(float(elem.get("width", 0)), float(elem.get("height", 0)))
+            elif name == "line":
+                columns.line(_bbox_layout_box(elem))
+            elif ocr_class == "ocr_page":
+                unit = "px"
+                bbox = hocr_bbox(elem.get("title", "")) or (0.0, 0.0, 0.0, 0.0)
+                columns.page(bbox[2], bbox[3])
+            elif ocr_class in LINE_CLASSES:
+                columns.line(hocr_bbox(elem.get("title", "")))
+            continue
+        name = _local_name(elem.tag)
+        if name == "word":
+            columns.word(elem.text or "", _bbox_layout_box(elem), NO_CONFIDENCE)
+            elem.clear()
+        elif ocr_class == "ocrx_word":
+            text = "".join(elem.itertext()).strip()
+            if text:
+                title = elem.get("title", "")
+                columns.word(text, hocr_bbox(title), _hocr_conf(title))
+            elem.clear()
+        elif name in ("line", "page") or ocr_class in LINE_CLASSES or ocr_class == "ocr_page":
+            elem.clear()
+    return columns, unit
+
+
+def write_wordbox(source: Union[str, BinaryIO], out: BinaryIO) -> int:
+    """
+    Writes the word boxes of a bbox-layout or hOCR document.
+
+    Args:
+        source (str or file): Layout file name or binary file object.
+        out (file): Binary file object the word boxes are written to.
+
+    Returns:
+        int: The number of words.
+    """
+    columns, unit = parse_layout(source)
+    strings = [text.encode("utf-8") for text in columns.strings]  # in id order
+    offsets = array("I", [0])
+    for text in strings:
+        offsets.append(offsets[-1] + len(text))
+    counts = (len(columns.page_size) // 2, len(columns.line_page), len(columns.word_page))
+    out.write(HEADER.pack(MAGIC, VERSION, UNITS.index(unit), *counts, len(strings), offsets[-1]))
+    for values in [getattr(columns, name) for name, _, _, _ in COLUMNS] + [offsets]:
+        if sys.byteorder != "little":
+            values.byteswap()
+        out.write(values)
+    out.write(b"".join(strings))
+    return counts[2]
+
+
+class WordBoxes:
+    """
+    Reads a word box file in place. The columns are memoryviews of 4-byte values
+    (typecode 'I' or 'f'); bounding boxes are 4 values per row (x0, y0, x1, y1) and page
+    sizes 2 (width, height).
+
+        with WordBoxes.open("doc.wbox") as boxes:
+            for word in boxes.words(page=0):
+                ...
+    """
+
+    def __init__(self, buffer):
+        self._mmap = None
+        view = memoryview(buffer).cast("B")
+        if len(view) < HEADER.size:
+            raise WordBoxError("Not a word box file")
+        magic, version, unit, *counts, string_count, blob_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION or unit >= len(UNITS):
+            raise WordBoxError(f"Not a word box file of version {VERSION}")
+        if sys.byteorder != "little":
+            raise WordBoxError("Word box files are only read in place on little-endian machines")
+        self.unit = UNITS[unit]
+        self.page_count, self.line_count, self.word_count = counts
+        position = HEADER.size
+        for name, typecode, width, count_index in COLUMNS + (("_offsets", "I", 1, None),):
+            rows = counts[count_index] if count_index is not None else string_count + 1
+            end = position + 4 * width * rows
+            if end > len(view):
+                raise WordBoxError("Word box file is truncated")
+            setattr(self, name, view[position:end].cast(typecode))
+            position = end
+        if position + blob_size > len(view):
+            raise WordBoxError("Word box file is truncated")
+        self._blob = view[position:position + blob_size]
+        self.string_count = string_count
+
+    @classmethod
+    def open(cls, filename: str) -> "WordBoxes":
+        """Memory-maps a word box file; close it (or use `with`) to unmap it."""
+        with open(filename, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            boxes = cls(mapped)
+        except Exception:
+            mapped.close()
+            raise
+        boxes._mmap = mapped
+        return boxes
+
+    def close(self):
+        """Releases the columns (and unmaps the file); they cannot be used afterwards."""
+        for name, _, _, _ in COLUMNS + (("_offsets", None, None, None),):
+            getattr(self, name).release()
+        self._blob.release()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def string(self, text_id: int) -> str:
+        return str(self._blob[self._offsets[text_id]:self._offsets[text_id + 1]], "utf-8")
+
+    def word(self, word_id: int) -> Word:
+        return Word(
+            self.word_page[word_id], self.word_line[word_id],
+            self.string(self.word_text[word_id]),
+            tuple(self.word_bbox[4 * word_id:4 * word_id + 4]), self.word_conf[word_id],
+        )
+
+    def page_words(self, page: int) -> range:
+        """The ids of the words on a page (words are in document order)."""
+        return range(_bisect(self.word_page, page), _bisect(self.word_page, page + 1))
+
+    def words(self, page: Optional[int] = None) -> Iterator[Word]:
+        """The words of the document, or of one page."""
+        ids = range(self.word_count) if page is None else self.page_words(page)
+        return (self.word(word_id) for word_id in ids)
+
+
+def _bisect(column, value: int) -> int:
+    """The first index of a sorted column holding a value >= `value`."""
+    low, high = 0, len(column)
+    while low < high:
+        middle = (low + high) // 2
+        if column[middle] < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low
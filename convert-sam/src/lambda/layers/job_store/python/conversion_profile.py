@@ -0,0 +1,146 @@
+"""
+Conversion profiles: what a job asks the convert Lambda to produce
+
+A profile is given when a job is started and stored in its state item (`profile`).
+Every key is optional:
+
+- formats: the outputs to produce, any of "txt", "html" (hOCR for images, bbox-layout
+  for PDFs), "pdf" (searchable PDF; for PDF inputs only when pages are OCR'd, so a job
+  that gets none of the outputs it asks for fails) and "wbox"
+  (the word boxes of the html output, in a compact binary form; see convert/wordbox.py)
+- first_page, last_page: the pages of a PDF to convert, within the pages the deployment
+  converts (the first 10 unless PDFs are sharded, fanned out or checkpointed)
+- lang: the Tesseract language(s), e.g. "eng" or "eng+deu"
+- dpi: the resolution PDF pages are rendered at for OCR, or the resolution of an image
+  input (instead of the one recorded in the file)
+
+The convert Lambda only runs the passes that the requested outputs need. Without a
+profile, a job gets every output of every page, as configured for the deployment.
+"""
+import re
+from decimal import Decimal
+from typing import Optional, Tuple
+
+# the outputs of the converters
+FORMATS = ("txt", "html", "pdf")
+# outputs made from another output after conversion: {format: the output it is made from}
+DERIVED_FORMATS = {"wbox": "html"}
+OUTPUT_FORMATS = FORMATS + tuple(DERIVED_FORMATS)
+MIN_DPI = 72
+MAX_DPI = 600
+LANG_PATTERN = re.compile(r"[A-Za-z0-9_]+(\+[A-Za-z0-9_]+)*")
+
+
+class ProfileError(ValueError):
+    # Raised for a profile that is not valid
+    pass
+
+
+def whole_number(profile: dict, name: str, minimum: int = 1, maximum: Optional[int] = None):
+    value = profile.get(name)
+    if value is None:
+        return None
+    # JSON numbers may be floats (2.0), those read back from DynamoDB are Decimal; bool is
+    # an int subclass
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) and value % 1 == 0:
+        value = int(value)
+        if value >= minimum and (maximum is None or value <= maximum):
+            return value
+    bounds = f"from {minimum} to {maximum}" if maximum is not None else f"of at least {minimum}"
+    raise ProfileError(f"Profile '{name}' must be a whole number {bounds}")
+
+
+class ConversionProfile:
+    def __init__(
+        self,
+        formats=OUTPUT_FORMATS,
+        first_page: int = 1,
+        last_page: Optional[int] = None,
+        lang: Optional[str] = None,
+        dpi: Optional[int] = None,
+    ):
+        self.formats = tuple(fmt for fmt in OUTPUT_FORMATS if fmt in formats)
+        self.first_page = first_page
+        self.last_page = last_page
+        self.lang = lang
+        self.dpi = dpi
+
+    @classmethod
+    def from_dict(cls, profile: Optional[dict]) -> "ConversionProfile":
+        """
+        Reads a profile, as given to start_job or stored in a job item (None for the
+        default profile).
+
+        Raises:
+            ProfileError: If the profile is not valid.
+        """
+        if profile is None:
+            return cls()
+        if not isinstance(profile, dict):
+            raise ProfileError("Profile must be an object")
+        unknown = set(profile) - {"formats", "first_page", "last_page", "lang", "dpi"}
+        if unknown:
+            raise ProfileError(f"Unknown profile keys {sorted(unknown)}")
+
+        formats = profile.get("formats", OUTPUT_FORMATS)
+        if (
+            not isinstance(formats, (list, tuple, set)) or not formats
+            or not all(isinstance(fmt, str) and fmt in OUTPUT_FORMATS for fmt in formats)
+        ):
+            raise ProfileError(f"Profile 'formats' must be a list of {', '.join(OUTPUT_FORMATS)}")
+        first_page = whole_number(profile, "first_page") or 1
+        last_page = whole_number(profile, "last_page")
+        if last_page is not None and last_page < first_page:
+            raise ProfileError("Profile 'last_page' must not be before 'first_page'")
+        lang = profile.get("lang")
+        if lang is not None and not (isinstance(lang, str) and LANG_PATTERN.fullmatch(lang)):
+            raise ProfileError("Profile 'lang' must be Tesseract languages, e.g. 'eng' or 'eng+deu'")
+        dpi = whole_number(profile, "dpi", MIN_DPI, MAX_DPI)
+        return cls(formats, first_page, last_page, lang, dpi)
+
+    def as_dict(self) -> dict:
+        """The settings that differ from the default profile (empty for the default)."""
+        profile = {}
+        if self.formats != OUTPUT_FORMATS:
+            profile["formats"] = list(self.formats)
+        if self.first_page != 1:
+            profile["first_page"] = self.first_page
+        for name in ("last_page", "lang", "dpi"):
+            if getattr(self, name) is not None:
+                profile[name] = getattr(self, name)
+        return profile
+
+    def wants(self, fmt: str) -> bool:
+        return fmt in self.formats
+
+    @property
+    def converter_formats(self) -> tuple:
+        """The converter outputs the requested outputs need (e.g. the html for a wbox)."""
+        needed = {DERIVED_FORMATS.get(fmt, fmt) for fmt in self.formats}
+        return tuple(fmt for fmt in FORMATS if fmt in needed)
+
+    def page_range(
+        self, page_count: Optional[int] = None, last_page: Optional[int] = None
+    ) -> Tuple[int, Optional[int]]:
+        """
+        The (first, last) pages to convert of a PDF with `page_count` pages (if known),
+        when the deployment converts up to `last_page` (None = to the end). The last page
+        is None when it is the end of a document of unknown length.
+
+        Raises:
+            ProfileError: If the range is empty: the profile starts after the end of the
+            document or after the last page the deployment converts.
+        """
+        last = min(
+            (limit for limit in (self.last_page, last_page, page_count) if limit is not None),
+            default=None,
+        )
+        if last is not None and self.first_page > last:
+            if page_count is not None and self.first_page > page_count:
+                raise ProfileError(
+                    f"The document has {page_count} pages, the profile starts at page {self.first_page}"
+                )
+            raise ProfileError(
+                f"Only pages up to {last} are converted, the profile starts at page {self.first_page}"
+            )
+        return self.first_page, last
@@ -0,0 +1,422 @@
+"""
+Job records in the DocumentConversionJobs table, shared by the convert-sam Lambdas
+
+Deployed as the JobStore layer, so it is importable as `job_store` in every function.
+Each job has one state item (sort key JOB_STATE_KEY), created with status 'started' and
+moved forward once to 'success' or 'error'. Jobs created before the state item have one
+record per status change instead; updates for them still append a record. A job
+converted in chunks also counts its chunks in the state item (`start_chunks`,
+`chunk_done`), so the last chunk to finish can merge them, and a job converted in
+checkpointed units records the pages done so far (`checkpoint`), so a later invocation
+can resume it. A job started with a conversion profile (see conversion_profile.py) keeps
+it in the state item as `profile`.
+
+The DynamoDB client is created once per container with a bigger connection pool, short
+timeouts, TCP keep-alive and adaptive retries. Writes can be grouped (`JobWriteGroup`),
+so related writes of an invocation go out in one round trip, or submitted in the
+background (`*_async`), so they overlap with S3 work.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, Optional
+
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+TTL_DAYS = 30  # DynamoDB time-to-live
+# Sort key of the single item that holds the current state of a job
+JOB_STATE_KEY = "state"
+TRANSACT_MAX_ITEMS = 100  # DynamoDB limit per TransactWriteItems request
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=int(os.environ.get("JOB_STORE_MAX_CONNECTIONS", "16")),
+    connect_timeout=1,
+    read_timeout=3,
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "max_attempts": 5},
+)
+
+_resource = None
+_resource_lock = threading.Lock()
+_init_phase = None  # see set_init_phase
+
+
+class JobExistsError(Exception):
+    # Raised when creating a job whose job_id is already in use
+    pass
+
+
+def set_init_phase(phase) -> None:
+    """
+    Times the creation of the DynamoDB resource with `phase(name)`, a context manager
+    factory such as a startup profile's `phase`.
+    """
+    global _init_phase
+    _init_phase = phase
+
+
+def dynamodb_resource():
+    """The DynamoDB resource of this container, created on first use."""
+    global _resource
+    if _resource is None:
+        # boto3 sessions are not thread safe, so the resource is created once, under a lock
+        with _resource_lock:
+            if _resource is None:
+                with _init_phase("init dynamodb") if _init_phase else nullcontext():
+                    _resource = boto3.resource("dynamodb", config=CLIENT_CONFIG)
+    return _resource
+
+
+def new_job_item(
+    job_id: str, url: str, metadata: Optional[dict] = None, profile: Optional[dict] = None
+) -> dict:
+    item = {
+        "job_id": job_id,
+        "created_at": JOB_STATE_KEY,
+        "started_at": datetime.utcnow().isoformat(),
+        "url": url,
+        "status": "started",
+        "ttl": int(time.time()) + (TTL_DAYS * 24 * 60 * 60),
+    }
+    if metadata:
+        item["metadata"] = metadata
+    if profile:
+        item["profile"] = profile
+    return item
+
+
+def finished_attributes(status, urls=None, message=None, metadata=None) -> dict:
+    """The attributes a status change sets on the state item."""
+    attributes = {"status": status, "completed_at": datetime.utcnow().isoformat()}
+    if status == "success" and urls:
+        attributes["urls"] = urls
+    elif message:
+        attributes["message"] = message
+    if metadata:
+        attributes["metadata"] = metadata
+    return attributes
+
+
+def update_arguments(job_id: str, attributes: dict) -> dict:
+    """UpdateItem arguments that set `attributes` if the job is still 'started'."""
+    names = {f"#a{i}": name for i, name in enumerate(attributes)}
+    values = {f":a{i}": value for i, value in enumerate(attributes.values())}
+    values[":started"] = "started"
+    return {
+        "Key": {"job_id": job_id, "created_at": JOB_STATE_KEY},
+        "UpdateExpression": "SET " + ", ".join(f"#a{i} = :a{i}" for i in range(len(attributes))),
+        "ConditionExpression": "#status = :started",
+        "ExpressionAttributeNames": {**names, "#status": "status"},
+        "ExpressionAttributeValues": values,
+    }
+
+
+class JobStore:
+    def __init__(self, table_name: Optional[str] = None, max_workers: int = 4):
+        self.table_name = table_name or os.environ.get("TABLE_NAME")
+        self._table = None
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = dynamodb_resource().Table(self.table_name)
+        return self._table
+
+    @table.setter
+    def table(self, table):
+        self._table = table
+
+    def create_job(
+        self, job_id: str, url: str, metadata: Optional[dict] = None, profile: Optional[dict] = None
+    ) -> None:
+        """
+        Creates the job's state item, with status 'started' and the conversion profile
+        (`ConversionProfile.as_dict()`), if any.
+
+        Raises:
+            JobExistsError: If the job_id is already in use.
+        """
+        self._put_new(new_job_item(job_id, url, metadata, profile))
+        logger.info(f"Job {job_id} created successfully")
+
+    def _put_new(self, item: dict) -> None:
+        try:
+            self.table.put_item(Item=item, ConditionExpression="attribute_not_exists(job_id)")
+        except ClientError as e:
+            if e.response['Error']['Code'] == "ConditionalCheckFailedException":
+                raise JobExistsError(f"Job {item['job_id']} already exists") from e
+            logger.error(f"Error creating job {item['job_id']} record: {e.response['Error']['Message']}")
+            raise
+
+    def update_job(self, job_id, status, urls=None, message=None, metadata=None) -> None:
+        """
+        Moves the job's state item from 'started' to `status`. States only move forward: a
+        write for a job that already finished is ignored.
+        """
+        self._update(job_id, finished_attributes(status, urls, message, metadata))
+
+    def _update(self, job_id: str, attributes: dict) -> None:
+        status = attributes["status"]
+        try:
+            self.table.update_item(
+                **update_arguments(job_id, attributes),
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            logger.info(f"Job {job_id} with status={status!r} updated successfully")
+        except ClientError as e:
+            if e.response['Error']['Code'] != "ConditionalCheckFailedException":
+                logger.error(f"Error updating job {job_id}: {e.response['Error']['Message']}")
+                raise
+            if "Item" in e.response:
+                logger.warning(f"Job {job_id} already finished, ignoring status={status!r}")
+            else:
+                # job created before the single-item layout
+                self.put_legacy_record(job_id, attributes)
+
+    def put_legacy_record(self, job_id: str, attributes: dict) -> None:
+        """Appends a status record in the multi-row layout used before the state item."""
+        item = {
+            "job_id": job_id,
+            "created_at": attributes["completed_at"],
+            "ttl": int(time.time()) + (TTL_DAYS * 24 * 60 * 60),
+            **{k: v for k, v in attributes.items() if k != "completed_at"},
+        }
+        try:
+            self.table.put_item(Item=item)
+            logger.info(f"Job {job_id} with status={item['status']!r} updated successfully")
+        except ClientError as e:
+            logger.error(f"Error updating job {job_id}: {e.response['Error']['Message']}")
+            raise
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """The job's state item (strongly consistent), or None."""
+        response = self.table.get_item(
+            Key={"job_id": job_id, "created_at": JOB_STATE_KEY}, ConsistentRead=True
+        )
+        return response.get("Item")
+
+    def start_chunks(self, job_id: str, count: int) -> None:
+        """Records that the job is converted as `count` separate chunks."""
+        self.table.update_item(
+            Key={"job_id": job_id, "created_at": JOB_STATE_KEY},
+            UpdateExpression="SET chunks_total = :count",
+            ConditionExpression="#status = :started",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":count": count, ":started": "started"},
+        )
+
+    def chunk_done(self, job_id: str, index: int) -> bool:
+        """
+        Records chunk `index` of the job as converted.
+
+        Returns:
+            bool: True for exactly one caller, once every chunk is done: the one that
+            merges the chunks. A chunk converted twice (a retried invocation) also
+            completes the set, so completing it is not enough; the merge is claimed.
+
+        Raises:
+            ClientError: ConditionalCheckFailedException if the job is no longer 'started'
+            (another chunk failed).
+        """
+        key = {"job_id": job_id, "created_at": JOB_STATE_KEY}
+        item = self.table.update_item(
+            Key=key,
+            UpdateExpression="ADD chunks_done :chunk",
+            ConditionExpression="#status = :started",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":chunk": {str(index)}, ":started": "started"},
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+        if len(item["chunks_done"]) < item["chunks_total"]:
+            return False
+        try:
+            self.table.update_item(
+                Key=key,
+                UpdateExpression="SET merge_claimed = :true",
+                ConditionExpression="attribute_not_exists(merge_claimed)",
+                ExpressionAttributeValues={":true": True},
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != "ConditionalCheckFailedException":
+                raise
+            return False
+        return True
+
+    def checkpoint(self, job_id: str, pages_done: int, pages_total: int) -> bool:
+        """
+        Records that the first `pages_done` of the job's `pages_total` pages are converted.
+        The count only moves forward.
+
+        Returns:
+            bool: False if the job is no longer 'started', or another invocation already
+            recorded as many pages (the same document converted twice at once).
+        """
+        try:
+            self.table.update_item(
+                Key={"job_id": job_id, "created_at": JOB_STATE_KEY},
+                UpdateExpression="SET pages_done = :done, pages_total = :total",
+                ConditionExpression=(
+                    "#status = :started AND attribute_not_exists(pages_done)"
+                    " OR #status = :started AND pages_done < :done"
+                ),
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues={
+                    ":done": pages_done, ":total": pages_total, ":started": "started",
+                },
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != "ConditionalCheckFailedException":
+                raise
+            return False
+        return True
+
+    def checkpoint_attempt(self, job_id: str, pages_done: int) -> int:
+        """
+        Counts an invocation that starts converting the job after its first `pages_done`
+        pages. Invocations retried after a timeout resume from the same page, so the count
+        shows how often the same unit was tried.
+
+        Returns:
+            int: The attempts from `pages_done` so far, this one included, or 0 if the job
+            is no longer 'started'.
+        """
+        try:
+            response = self.table.update_item(
+                Key={"job_id": job_id, "created_at": JOB_STATE_KEY},
+                UpdateExpression="ADD #attempts :one",
+                ConditionExpression="#status = :started",
+                ExpressionAttributeNames={
+                    "#status": "status", "#attempts": f"attempts_from_{pages_done}",
+                },
+                ExpressionAttributeValues={":one": 1, ":started": "started"},
+                ReturnValues="UPDATED_NEW",
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != "ConditionalCheckFailedException":
+                raise
+            return 0
+        return int(response["Attributes"][f"attempts_from_{pages_done}"])
+
+    def create_job_async(self, *args, **kwargs) -> Future:
+        """`create_job` in the background; the Future raises what create_job raises."""
+        return self._pool.submit(self.create_job, *args, **kwargs)
+
+    def update_job_async(self, *args, **kwargs) -> Future:
+        """`update_job` in the background."""
+        return self._pool.submit(self.update_job, *args, **kwargs)
+
+    def group(self) -> "JobWriteGroup":
+        return JobWriteGroup(self)
+
+    def flush_async(self, group: "JobWriteGroup") -> Future:
+        """`group.flush()` in the background; the Future's result is what flush returns."""
+        return self._pool.submit(group.flush)
+
+
+class JobWriteGroup:
+    """
+    Job writes collected during an invocation and sent together by `flush`. Writes for
+    the same job are merged first: a job created and then failed in the same invocation
+    is one conditional put of its final state. The remaining writes go out in one
+    TransactWriteItems request per 100 jobs; if a transaction is cancelled (a job_id is
+    taken, a job already finished), its jobs are written one at a time instead, so each
+    gets the outcome of a single write.
+    """
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self.writes = {}  # job_id -> {"item": new item} or {"attributes": update}
+
+    def create_job(
+        self, job_id: str, url: str, metadata: Optional[dict] = None, profile: Optional[dict] = None
+    ) -> None:
+        self.writes[job_id] = {"item": new_job_item(job_id, url, metadata, profile)}
+
+    def update_job(self, job_id, status, urls=None, message=None, metadata=None) -> None:
+        attributes = finished_attributes(status, urls, message, metadata)
+        write = self.writes.setdefault(job_id, {})
+        if "item" in write:
+            write["item"].update(attributes)
+        else:
+            write["attributes"] = {**write.get("attributes", {}), **attributes}
+
+    def __len__(self):
+        return len(self.writes)
+
+    def flush(self) -> Dict[str, Optional[Exception]]:
+        """
+        Sends the collected writes.
+
+        Returns:
+            dict: job_id -> None if its write succeeded, or the exception it raised
+            (JobExistsError for a job_id in use).
+        """
+        writes, self.writes = list(self.writes.items()), {}
+        results = {}
+        for start in range(0, len(writes), TRANSACT_MAX_ITEMS):
+            chunk = writes[start:start + TRANSACT_MAX_ITEMS]
+            if len(chunk) > 1 and self._transact(chunk):
+                results.update((job_id, None) for job_id, _ in chunk)
+                continue
+            for job_id, write in chunk:
+                try:
+                    self._write_one(job_id, write)
+                    results[job_id] = None
+                except (JobExistsError, ClientError) as e:
+                    results[job_id] = e
+        return results
+
+    def _write_one(self, job_id: str, write: dict) -> None:
+        if "item" in write:
+            self.store._put_new(write["item"])
+        else:
+            self.store._update(job_id, write["attributes"])
+
+    def _transact(self, chunk) -> bool:
+        """Writes the chunk in one transaction. Returns False if it was cancelled."""
+        table = self.store.table
+        serialize = TypeSerializer().serialize
+
+        def av(mapping):
+            return {k: serialize(v) for k, v in mapping.items()}
+
+        items = []
+        for job_id, write in chunk:
+            if "item" in write:
+                items.append({"Put": {
+                    "TableName": table.name,
+                    "Item": av(write["item"]),
+                    "ConditionExpression": "attribute_not_exists(job_id)",
+                }})
+            else:
+                arguments = update_arguments(job_id, write["attributes"])
+                items.append({"Update": {
+                    "TableName": table.name,
+                    "Key": av(arguments["Key"]),
+                    "UpdateExpression": arguments["UpdateExpression"],
+                    "ConditionExpression": arguments["ConditionExpression"],
+                    "ExpressionAttributeNames": arguments["ExpressionAttributeNames"],
+                    "ExpressionAttributeValues": av(arguments["ExpressionAttributeValues"]),
+                }})
+        try:
+            table.meta.client.transact_write_items(TransactItems=items)
+        except ClientError as e:
+            if e.response['Error']['Code'] != "TransactionCanceledException":
+                raise
+            logger.info(f"Grouped write of {len(items)} jobs cancelled, writing them one at a time")
+            return False
+        logger.info(f"{len(items)} jobs written in one transaction")
+        return True
+
+
+STORE = JobStore()
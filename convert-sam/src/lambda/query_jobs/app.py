@@ -1,13 +1,167 @@
+import hashlib
 import json
 import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 from botocore.exceptions import ClientError
 
+from job_store import JOB_STATE_KEY, dynamodb_resource  # JobStore layer
+from state_cache import StateCache
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
-dynamodb = boto3.resource('dynamodb')
-table_name = "DocumentConversionJobs"
+dynamodb = dynamodb_resource()
+table_name = os.environ.get("TABLE_NAME", "DocumentConversionJobs")
 TABLE = dynamodb.Table(table_name)
+STATE_ATTRIBUTES = (
+    "job_id", "status", "started_at", "completed_at", "url", "urls", "message",
+    "pages_done", "pages_total", "chunks_done", "chunks_total",
+)
+PROJECTION_NAMES = {f"#a{i}": name for i, name in enumerate(STATE_ATTRIBUTES)}
+
+# Batch status requests
+BATCH_MAX_JOBS = int(os.environ.get("BATCH_MAX_JOBS", "1000"))
+BATCH_GET_MAX_KEYS = 100  # DynamoDB limit per BatchGetItem request
+BATCH_MAX_ATTEMPTS = 6
+BATCH_BACKOFF_BASE_SEC = 0.05
+BATCH_BACKOFF_MAX_SEC = 1.0
+# BatchGetItem pages of one request are read in parallel; kept across warm invocations
+BATCH_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get("BATCH_MAX_WORKERS", "8")))
+
+# Terminal job states cached by warm containers. Cached states hold presigned URLs, so the
+# TTL is kept below their expiry (PRESIGNED_URL_EXPIRY_SEC in the convert Lambda).
+PRESIGNED_URL_EXPIRY_SEC = 172800
+STATE_CACHE_TTL_SEC = min(
+    float(os.environ.get("STATE_CACHE_TTL_SEC", "3600")), PRESIGNED_URL_EXPIRY_SEC / 2
+)
+STATE_CACHE = StateCache(int(os.environ.get("STATE_CACHE_MAX_ENTRIES", "1024")), STATE_CACHE_TTL_SEC)
+
+# Long polling (?wait=<seconds>&last_status=<status>): the state is re-read after 0.25 s,
+# then 1.5x longer each time, up to 2 s between reads
+LONG_POLL_MAX_WAIT_SEC = float(os.environ.get("LONG_POLL_MAX_WAIT_SEC", "20"))
+LONG_POLL_FIRST_DELAY_SEC = 0.25
+LONG_POLL_BACKOFF = 1.5
+LONG_POLL_MAX_DELAY_SEC = 2.0
+LONG_POLL_SAFETY_SEC = 1.0  # time left for responding before the Lambda timeout
+
+
+def progress_from_item(item):
+    """
+    Progress of a job converted in checkpointed units (pages done) or fanned-out chunks
+    (chunks done), or None for a job converted in one go.
+    """
+    if "pages_total" in item:
+        return {"pages_done": int(item.get("pages_done", 0)), "pages_total": int(item["pages_total"])}
+    if "chunks_total" in item:
+        return {"chunks_done": len(item.get("chunks_done", ())), "chunks_total": int(item["chunks_total"])}
+    return None
+
+
+def state_from_item(item):
+    return {
+        "status": item.get("status"),
+        "message": item.get("message"),
+        "started": item.get("started_at"),
+        "completed": item.get("completed_at"),
+        "input": item.get("url"),
+        "urls": item.get("urls"),
+        "progress": progress_from_item(item),
+    }
+
+
+def get_job_state(job_id):
+    """Reads the state item of a job (strongly consistent). Returns None if there is none."""
+    try:
+        response = TABLE.get_item(
+            Key={"job_id": job_id, "created_at": JOB_STATE_KEY},
+            ConsistentRead=True,
+            ProjectionExpression=", ".join(PROJECTION_NAMES),
+            ExpressionAttributeNames=PROJECTION_NAMES,
+        )
+    except ClientError as e:
+        logger.error(f"Error reading job {job_id}: {e.response['Error']['Message']}")
+        return None
+    item = response.get('Item')
+    if item is None:
+        return None
+    return state_from_item(item)
+
+
+def batch_get_page(job_ids):
+    """
+    Reads the state items of up to BATCH_GET_MAX_KEYS jobs with BatchGetItem. Keys that
+    DynamoDB leaves unprocessed (throttling, 16 MB response limit) are requested again
+    after an exponential backoff with full jitter.
+
+    Returns:
+        dict: job_id -> state, for the jobs that have a state item.
+    """
+    request = {
+        TABLE.name: {
+            "Keys": [{"job_id": job_id, "created_at": JOB_STATE_KEY} for job_id in job_ids],
+            "ConsistentRead": True,
+            "ProjectionExpression": ", ".join(PROJECTION_NAMES),
+            "ExpressionAttributeNames": PROJECTION_NAMES,
+        }
+    }
+    states = {}
+    for attempt in range(BATCH_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(
+                0, min(BATCH_BACKOFF_MAX_SEC, BATCH_BACKOFF_BASE_SEC * 2 ** attempt)
+            ))
+        response = dynamodb.batch_get_item(RequestItems=request)
+        for item in response.get("Responses", {}).get(TABLE.name, []):
+            states[item["job_id"]] = state_from_item(item)
+        request = response.get("UnprocessedKeys")
+        if not request:
+            return states
+    unprocessed = len(request[TABLE.name]["Keys"])
+    raise RuntimeError(f"{unprocessed} job states still unprocessed after {BATCH_MAX_ATTEMPTS} attempts")
+
+
+def read_job_states(job_ids):
+    """
+    Current state of many jobs. State items are read in parallel BatchGetItem pages; jobs
+    without one are looked up in the legacy layout.
+
+    Returns:
+        dict: job_id -> state, for the jobs that were found.
+    """
+    states = {}
+    uncached = []
+    for job_id in dict.fromkeys(job_ids):  # drop duplicates, which BatchGetItem rejects
+        state = STATE_CACHE.get(job_id)
+        if state is not None:
+            states[job_id] = state
+        else:
+            uncached.append(job_id)
+    job_ids = uncached
+    pages = [job_ids[i:i + BATCH_GET_MAX_KEYS] for i in range(0, len(job_ids), BATCH_GET_MAX_KEYS)]
+    for page_states in BATCH_POOL.map(batch_get_page, pages):
+        states.update(page_states)
+
+    missing = [job_id for job_id in job_ids if job_id not in states]
+    for job_id, records in zip(missing, BATCH_POOL.map(query_records_by_job_id, missing)):
+        if records:
+            states[job_id] = replay_legacy_records(records)
+    for job_id in job_ids:
+        state = states.get(job_id)
+        if state is None:
+            continue
+        if state["status"] == "error" and not state["message"]:
+            state["message"] = 'No error message provided'
+        STATE_CACHE.put(job_id, state)
+    return states
+
+
+def compact_state(state):
+    """A job state without its empty fields."""
+    return {key: value for key, value in state.items() if value is not None}
+
 
 def query_records_by_job_id(job_id):
     """ query records by job_id """
@@ -25,13 +179,168 @@ def query_records_by_job_id(job_id):
         return None
 
 
+def replay_legacy_records(records):
+    """
+    Works out the state of a job stored in the multi-row layout used before the state
+    item, where every status change appended a record.
+    """
+    status = None
+    started = None
+    completed = None
+    url = None
+    urls = None
+    message = None
+
+    for record in records:
+        if record["status"] == "started":
+            if status is None:
+                status = "started"
+                started = record["created_at"]
+                url = record['url']
+        elif record["status"] == "success":
+            status = "success"
+            completed = record["created_at"]
+            urls = record.get('urls')
+        elif record["status"] == "error":
+            status = "error"
+            completed = record["created_at"]
+            message = record.get('message', 'No error message provided')
+
+    return {
+        "status": status,
+        "message": message,
+        "started": started,
+        "completed": completed,
+        "input": url,
+        "urls": urls,
+        "progress": None,
+    }
+
+
+def read_job_state(job_id):
+    """Current state of a job in either layout, or None if the job is not found."""
+    state = STATE_CACHE.get(job_id)
+    if state is not None:
+        return state
+    state = get_job_state(job_id)
+    if state is None:
+        records = query_records_by_job_id(job_id)
+        if records:
+            state = replay_legacy_records(records)
+    if state is not None and state["status"] == "error" and not state["message"]:
+        state["message"] = 'No error message provided'
+    if state is not None:
+        STATE_CACHE.put(job_id, state)
+    return state
+
+
+def wait_for_change(job_id, last_status, wait_sec, context=None):
+    """
+    Reads the state of a job until its status differs from `last_status` or `wait_sec`
+    have passed, re-reading on a backoff schedule so a job that changes soon is reported
+    quickly and a long wait costs few reads.
+
+    Returns:
+        The last state read (None if the job is not found).
+    """
+    deadline = time.monotonic() + min(wait_sec, LONG_POLL_MAX_WAIT_SEC)
+    if context is not None:
+        deadline = min(
+            deadline,
+            time.monotonic() + context.get_remaining_time_in_millis() / 1000 - LONG_POLL_SAFETY_SEC,
+        )
+    delay = LONG_POLL_FIRST_DELAY_SEC
+    while True:
+        state = read_job_state(job_id)
+        if state is None or state["status"] != last_status:
+            return state
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return state
+        time.sleep(min(delay, remaining))
+        delay = min(delay * LONG_POLL_BACKOFF, LONG_POLL_MAX_DELAY_SEC)
+
+
+def etag(body):
+    return '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+
+
+def ok_response(event, headers, body):
+    """A 200 response with an ETag, or 304 with an empty body if the client has it already."""
+    tag = etag(body)
+    if tag in if_none_match(event):
+        return {'statusCode': 304, "headers": {**headers, "ETag": tag}, "body": ""}
+    return {'statusCode': 200, "headers": {**headers, "ETag": tag}, "body": body}
+
+
+def if_none_match(event):
+    """The ETags of the If-None-Match request header (header names are case-insensitive)."""
+    for name, value in (event.get("headers") or {}).items():
+        if name.lower() == "if-none-match" and value:
+            return {tag.strip().removeprefix("W/") for tag in value.split(",")}
+    return set()
+
+
+def parse_job_ids(event):
+    """
+    The job ids of a batch request: a JSON body {"job_ids": [...]}, or a comma-separated
+    `job_ids` query parameter. Returns None if the request is not a batch request.
+    """
+    if event.get("body"):
+        try:
+            body = json.loads(event["body"])
+        except json.JSONDecodeError:
+            raise ValueError("Request body must be valid JSON")
+        job_ids = body.get("job_ids") if isinstance(body, dict) else None
+        if not isinstance(job_ids, list) or not all(isinstance(j, str) and j for j in job_ids):
+            raise ValueError("'job_ids' must be a list of job ids")
+        return job_ids
+    query_params = event.get('queryStringParameters') or {}
+    if query_params.get('job_ids'):
+        return [job_id for job_id in query_params['job_ids'].split(",") if job_id]
+    return None
+
+
+def batch_handler(event, job_ids, headers):
+    if len(job_ids) > BATCH_MAX_JOBS:
+        return {
+            'statusCode': 400,
+            "headers": headers,
+            'body': json.dumps({'message': f"At most {BATCH_MAX_JOBS} job ids per request"})
+        }
+    try:
+        states = read_job_states(job_ids)
+    except (ClientError, RuntimeError) as e:
+        # throttled beyond the retries; the client can ask again
+        logger.error(f"Error reading {len(job_ids)} job states: {str(e)}")
+        return {
+            'statusCode': 503,
+            "headers": {**headers, "Retry-After": "1"},
+            'body': json.dumps({'message': "Job states could not be read, try again"})
+        }
+    logger.info(f"State cache: {json.dumps(STATE_CACHE.stats())}")
+    job_ids = list(dict.fromkeys(job_ids))
+    return ok_response(event, headers, json.dumps({
+        "jobs": {job_id: compact_state(states[job_id]) for job_id in job_ids if job_id in states},
+        "not_found": [job_id for job_id in job_ids if job_id not in states],
+    }, separators=(",", ":")))
+
+
 def lambda_handler(event, context):
     headers = {
         "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Methods": "GET,OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type"
+        "Access-Control-Allow-Methods": "GET,POST,OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type,If-None-Match",
+        "Access-Control-Expose-Headers": "ETag,Retry-After",
     }
     # logger.debug(json.dumps(event, indent=2))
+    try:
+        job_ids = parse_job_ids(event)
+    except ValueError as e:
+        return {'statusCode': 400, "headers": headers, 'body': json.dumps({'message': str(e)})}
+    if job_ids is not None:
+        return batch_handler(event, job_ids, headers)
+
     query_params = event.get('queryStringParameters')
 
     if not query_params or not query_params.get('job_id'):
@@ -43,44 +352,23 @@ def lambda_handler(event, context):
 
     job_id = query_params.get('job_id')
 
-    records = query_records_by_job_id(job_id)
-    
-    if records:
-        status = None
-        started = None
-        completed = None
-        url = None
-        urls = None
-        message = None
-        
-        for record in records:
-            if record["status"] == "started":
-                if status is None:
-                    status = "started"
-                    started = record["created_at"]
-                    url = record['url']
-            elif record["status"] == "success":
-                status = "success"
-                completed = record["created_at"]
-                urls = record.get('urls')
-            elif record["status"] == "error":
-                status = "error"
-                completed = record["created_at"]
-                message = record.get('message', 'No error message provided')
-    
-        return {
-            'statusCode': 200,
-            "headers": headers,
-            "body": json.dumps({
-                "job_id": job_id,
-                "status": status,
-                "message": message,
-                "started": started,
-                "completed": completed,
-                "input": url,
-                "urls": urls
-            })
-        }
+    if query_params.get('wait'):
+        try:
+            wait_sec = max(0.0, float(query_params['wait']))
+        except ValueError:
+            return {
+                'statusCode': 400,
+                "headers": headers,
+                'body': json.dumps({'message': "'wait' must be a number of seconds"})
+            }
+        state = wait_for_change(job_id, query_params.get('last_status'), wait_sec, context)
+    else:
+        state = read_job_state(job_id)
+
+    logger.info(f"State cache: {json.dumps(STATE_CACHE.stats())}")
+
+    if state:
+        return ok_response(event, headers, json.dumps({"job_id": job_id, **state}))
     else:
         return {
             'statusCode': 200,
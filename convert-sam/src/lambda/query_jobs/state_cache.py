@@ -0,0 +1,64 @@
+"""
+In-process cache of finished job states
+
+A job in a terminal status ('success' or 'error') is never updated again, so its state
+can be served from memory by a warm container instead of being read from DynamoDB on
+every poll. The cache is bounded (least recently used entries are evicted first) and
+entries expire after a TTL, which must stay below the expiry of the presigned URLs the
+states hold.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+TERMINAL_STATUSES = ("success", "error")
+
+
+class StateCache:
+    def __init__(self, max_entries: int, ttl_sec: float):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries = OrderedDict()  # job_id -> (expires_at, state)
+        self._lock = threading.Lock()  # batch reads run on a thread pool
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, job_id: str):
+        """The cached state of a job, or None."""
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, state = entry
+            if expires_at <= time.monotonic():
+                del self._entries[job_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(job_id)
+            self.hits += 1
+            return state
+
+    def put(self, job_id: str, state: dict) -> None:
+        """Caches the state of a job if it is terminal."""
+        if self.max_entries <= 0 or state.get("status") not in TERMINAL_STATUSES:
+            return
+        with self._lock:
+            self._entries[job_id] = (time.monotonic() + self.ttl_sec, state)
+            self._entries.move_to_end(job_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -1,28 +1,86 @@
 """
 Creates job in DDB table, and either:
 - generates a presigned URL for the client to upload, or 
-- downloads from an existing URL, and uploads to the input bucket
+- starts a multipart upload and presigns a URL per part (large files); the client
+  uploads the parts in parallel (getting fresh URLs from /job/parts if they expire),
+  then calls /job/complete, or
+- hands an existing URL to the IngestUrl function (ingest_handler), which downloads it
+  and uploads it to the input bucket, or
+- does the same for a list of URLs (bulk mode), with one job and one IngestUrl
+  invocation per URL
+
+A request may give a conversion "profile" (see conversion_profile.py), stored with the
+job; in bulk mode it applies to every URL, unless an entry gives its own.
 """
 import json
 import logging
 import os
-import time
 import uuid
 import mimetypes
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
 import boto3
 import requests
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from conversion_profile import ConversionProfile, ProfileError  # JobStore layer
+from job_store import STORE, JobExistsError  # JobStore layer
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-dynamodb = boto3.resource("dynamodb")
-s3_client = boto3.client("s3")
-table_name = os.environ.get("TABLE_NAME")
-TABLE = dynamodb.Table(table_name)
-TTL_DAYS = 30  # DynamoDB data time-to-live
+# Files of at least MULTIPART_MIN_SIZE_MB (by the "size" given in the request) are
+# uploaded in parts, sized for about MULTIPART_TARGET_PARTS parts of at least 8 MB
+MULTIPART_MIN_SIZE = int(os.environ.get("MULTIPART_MIN_SIZE_MB", "16")) * 1024 * 1024
+MULTIPART_MIN_PART_SIZE = 8 * 1024 * 1024
+MULTIPART_TARGET_PARTS = 64
+MAX_PART_SIZE = 5 * 1024 ** 3  # S3 limit
+PRESIGNED_URL_EXPIRY_SEC = 3600
+# Part URLs stay valid long enough to upload the whole file at MULTIPART_MIN_KBPS, up to
+# MULTIPART_MAX_EXPIRY_SEC (clients on slower links refresh them through /job/parts)
+MULTIPART_MIN_KBPS = 100
+MULTIPART_MAX_EXPIRY_SEC = 12 * 3600
+
+# The last page the Convert function converts (0 = to the end); profiles that start after
+# it are rejected
+PDF_LAST_PAGE = int(os.environ.get("PDF_LAST_PAGE", "0")) or None
+
+# Bulk mode: URLs per request, and IngestUrl invocations sent at the same time
+BULK_MAX_URLS = int(os.environ.get("BULK_MAX_URLS", "100"))
+BULK_MAX_WORKERS = int(os.environ.get("BULK_MAX_WORKERS", "8"))
+
+# source_url files are streamed to S3 in parts of INGEST_PART_SIZE_MB, uploaded while the
+# next part downloads
+INGEST_PART_SIZE = int(os.environ.get("INGEST_PART_SIZE_MB", "8")) * 1024 * 1024
+INGEST_UPLOAD_CONCURRENCY = int(os.environ.get("INGEST_UPLOAD_CONCURRENCY", "2"))
+INGEST_READ_CHUNK = 1024 * 1024
+MAX_PARTS = 10000  # S3 limit per multipart upload
+# source_url copies run in asynchronous IngestUrl invocations (ingest_handler), which give
+# up (and fail the job) with less than INGEST_MIN_REMAINING_SEC left before their timeout
+INGEST_FUNCTION_NAME = os.environ.get("INGEST_FUNCTION_NAME")
+INGEST_MIN_REMAINING_MS = int(os.environ.get("INGEST_MIN_REMAINING_SEC", "60")) * 1000
+CONNECT_TIMEOUT_SEC = 5
+READ_TIMEOUT_SEC = 30  # between bytes, not for the whole download
+INVOKE_POOL = ThreadPoolExecutor(max_workers=BULK_MAX_WORKERS)
+# one connection per part upload, and one to create and complete the upload
+s3_client = boto3.client("s3", config=Config(max_pool_connections=INGEST_UPLOAD_CONCURRENCY + 1))
+lambda_client = boto3.client("lambda", config=Config(max_pool_connections=BULK_MAX_WORKERS))
+
+# Pooled HTTP connections, kept across warm invocations. Failed connections and gateway
+# errors are retried before any of the body is read.
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    max_retries=Retry(
+        total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",)
+    ),
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
 
 
 def lambda_handler(event, context):
@@ -46,6 +104,15 @@ def lambda_handler(event, context):
     if isinstance(body, str):
         body = json.loads(body)
 
+    if event.get("path", "").rstrip("/").endswith("/job/complete"):
+        return complete_multipart_upload(body or {}, bucket_name, headers)
+
+    if event.get("path", "").rstrip("/").endswith("/job/parts"):
+        return refresh_part_urls(body or {}, bucket_name, headers)
+
+    if body is not None and "source_urls" in body:
+        return bulk_copy_to_bucket(body, bucket_name, headers)
+
     if body is None or ("filename" not in body and "source_url" not in body):
         return {
             "statusCode": 400,
@@ -53,24 +120,57 @@ def lambda_handler(event, context):
             "body": json.dumps(
                 {
                     "message": "Must provide 'filename' and 'content_type' "
-                    + "OR 'source_url' in body"
+                    + "OR 'source_url' OR 'source_urls' in body"
                 }
             ),
         }
 
+    try:
+        profile = valid_profile(body.get("profile"))
+    except ProfileError as e:
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": str(e)}),
+        }
+
     job_id = body["job_id"] if "job_id" in body else str(uuid.uuid4())[:8]
 
-    if "filename" in body:
-        return gen_presigned_url(body, job_id, bucket_name, headers)
-    elif "source_url" in body:
-        return copy_to_bucket(body, job_id, bucket_name, headers)
+    try:
+        if "filename" in body:
+            return gen_presigned_url(body, job_id, bucket_name, headers, profile)
+        elif "source_url" in body:
+            return copy_to_bucket(body, job_id, bucket_name, headers, profile)
+    except JobExistsError as e:
+        return {
+            "statusCode": 409,
+            "headers": headers,
+            "body": json.dumps({"message": str(e)}),
+        }
+
+
+def valid_profile(config):
+    """
+    The stored form of a conversion profile, checked against the pages the Convert
+    function converts.
 
+    Raises:
+        ProfileError: If the profile is not valid, or starts after PDF_LAST_PAGE.
+    """
+    profile = ConversionProfile.from_dict(config)
+    profile.page_range(None, PDF_LAST_PAGE)
+    return profile.as_dict()
 
-def gen_presigned_url(body, job_id, bucket_name, headers):
+
+def gen_presigned_url(body, job_id, bucket_name, headers, profile=None):
     """Handles the file upload from filename and content_type."""
+    if isinstance(body.get("size"), int) and body["size"] >= MULTIPART_MIN_SIZE:
+        return gen_presigned_multipart(body, job_id, bucket_name, headers, profile)
     object_key = f"input/{job_id}/{body['filename']}"
     content_type = body["content_type"]
-    create_job(job_id, bucket_name, object_key)
+    # the job record is written once, after presigning, with its final status
+    jobs = STORE.group()
+    jobs.create_job(job_id, f"s3://{bucket_name}/{object_key}", profile=profile)
 
     try:
         presigned_url = s3_client.generate_presigned_url(
@@ -80,148 +180,499 @@ def gen_presigned_url(body, job_id, bucket_name, headers):
                 "Key": object_key,
                 "ContentType": content_type,
             },
-            ExpiresIn=3600,  # URL expiration time in seconds
+            ExpiresIn=PRESIGNED_URL_EXPIRY_SEC,
             HttpMethod="PUT",
         )
     except Exception as e:
         message = f"Error generating presigned URL: {str(e)}"
-        update_job(job_id, "error", message=message)
+        jobs.update_job(job_id, "error", message=message)
+        raise_write_error(jobs.flush())
         return {
             "statusCode": 500,
             "headers": headers,
             "body": json.dumps({"message": message}),
         }
 
+    raise_write_error(jobs.flush())
     result = {"presigned_url": presigned_url, "job_id": job_id}
     return {"statusCode": 200, "headers": headers, "body": json.dumps(result)}
 
 
-def copy_to_bucket(body, job_id, bucket_name, headers):
-    """Handles the download from source_url and upload to the bucket."""
-    source_url = body["source_url"]
-    fname = source_url.split("?")[0].rsplit("/", 1)[1]
-    object_key = f"input/{job_id}/{fname}"
-    create_job(job_id, bucket_name, object_key)
+def multipart_part_size(size):
+    """Part size for a file: about MULTIPART_TARGET_PARTS parts, whole MiB, at least 8 MB."""
+    mib = 1024 * 1024
+    part_size = -(-size // MULTIPART_TARGET_PARTS)
+    return max(MULTIPART_MIN_PART_SIZE, -(-part_size // mib) * mib)
+
+
+def multipart_url_expiry(size):
+    """Seconds the part URLs of a file of `size` bytes stay valid."""
+    seconds = size // (MULTIPART_MIN_KBPS * 1024)
+    return min(MULTIPART_MAX_EXPIRY_SEC, max(PRESIGNED_URL_EXPIRY_SEC, seconds))
+
+
+def presign_parts(bucket_name, object_key, upload_id, part_numbers, expiry):
+    """PUT URLs for parts of a multipart upload; presigning is local, no request per part."""
+    return [
+        {
+            "part_number": number,
+            "url": s3_client.generate_presigned_url(
+                ClientMethod="upload_part",
+                Params={
+                    "Bucket": bucket_name,
+                    "Key": object_key,
+                    "UploadId": upload_id,
+                    "PartNumber": number,
+                },
+                ExpiresIn=expiry,
+                HttpMethod="PUT",
+            ),
+        }
+        for number in part_numbers
+    ]
 
-    try:
-        # Download the file from source_url
-        result = download_file_from_url(source_url)
-        file_content = result["content"]
-        if file_content is None:
-            message = f"Error downloading file from {source_url}: no content"
-            update_job(job_id, "error", message=message)
-            return {
-                "statusCode": 500,
-                "headers": headers,
-                "body": json.dumps({"message": message}),
-            }
 
-        # Upload the file to S3
-        upload_file_to_s3(bucket_name, object_key, file_content, result["content_type"])
+def gen_presigned_multipart(body, job_id, bucket_name, headers, profile=None):
+    """
+    Starts a multipart upload for a large file and presigns a PUT URL for each part. The
+    job record is written while S3 creates the upload.
+    """
+    object_key = f"input/{job_id}/{body['filename']}"
+    size = body["size"]
+    part_size = multipart_part_size(size)
+    if part_size > MAX_PART_SIZE:
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": f"File too large: {size} bytes"}),
+        }
+    part_count = -(-size // part_size)
+    created = STORE.create_job_async(
+        job_id, f"s3://{bucket_name}/{object_key}",
+        metadata={"upload_parts": part_count, "upload_size": size}, profile=profile,
+    )
 
+    try:
+        upload_id = s3_client.create_multipart_upload(
+            Bucket=bucket_name, Key=object_key, ContentType=body["content_type"]
+        )["UploadId"]
     except Exception as e:
-        message = f"Error processing source_url: {str(e)}"
-        update_job(job_id, "error", message=message)
+        created.result()
+        message = f"Error starting multipart upload: {str(e)}"
+        STORE.update_job(job_id, "error", message=message)
         return {
             "statusCode": 500,
             "headers": headers,
             "body": json.dumps({"message": message}),
         }
 
-    result = {"job_id": job_id}
+    parts = presign_parts(
+        bucket_name, object_key, upload_id, range(1, part_count + 1), multipart_url_expiry(size)
+    )
+    try:
+        created.result()
+    except JobExistsError:
+        s3_client.abort_multipart_upload(Bucket=bucket_name, Key=object_key, UploadId=upload_id)
+        raise
+
+    result = {"job_id": job_id, "upload_id": upload_id, "part_size": part_size, "parts": parts}
     return {"statusCode": 200, "headers": headers, "body": json.dumps(result)}
 
 
-def download_file_from_url(source_url):
-    """Downloads file from the source URL and returns its content."""
-    result = {}
+def complete_multipart_upload(body, bucket_name, headers):
+    """
+    Completes (or, with "abort": true, aborts) the multipart upload of a job, given
+    {"job_id", "upload_id", "parts": [{"part_number", "etag"}, ...]}. Completing the
+    upload starts the conversion. An upload that S3 rejects (a part missing or not
+    matching its ETag) is left open, so the client can upload the part again and retry.
+    A retry of a completed upload (S3 no longer knows the upload, but the object exists)
+    succeeds again.
+    """
+    job_id = body.get("job_id")
+    upload_id = body.get("upload_id")
+    if not job_id or not upload_id:
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": "Must provide 'job_id' and 'upload_id' in body"}),
+        }
+    job = STORE.get_job(job_id)
+    if job is None or job.get("status") != "started":
+        return {
+            "statusCode": 404,
+            "headers": headers,
+            "body": json.dumps({"message": f"No upload in progress for job {job_id}"}),
+        }
+    object_key = job["url"].split(f"s3://{bucket_name}/", 1)[-1]
+    target = {"Bucket": bucket_name, "Key": object_key, "UploadId": upload_id}
+
+    if body.get("abort"):
+        try:
+            s3_client.abort_multipart_upload(**target)
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchUpload":
+                raise
+            return {
+                "statusCode": 404,
+                "headers": headers,
+                "body": json.dumps({"message": f"No upload {upload_id} for job {job_id}"}),
+            }
+        STORE.update_job(job_id, "error", message="Upload aborted by the client")
+        return {"statusCode": 200, "headers": headers,
+                "body": json.dumps({"job_id": job_id, "aborted": True})}
+
     try:
-        response = requests.get(source_url)
-        response.raise_for_status()
-        result["content"] = response.content
-    except requests.RequestException as e:
-        msg = f"Error downloading file from {source_url}: {str(e)}"
-        logger.error(msg)
-        raise Exception(msg) from e
+        parts = sorted(
+            ({"PartNumber": int(part["part_number"]), "ETag": str(part["etag"])}
+             for part in body["parts"]),
+            key=lambda part: part["PartNumber"],
+        )
+    except (KeyError, TypeError, ValueError):
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": "'parts' must be a list of {part_number, etag}"}),
+        }
+    # S3 completes an upload from any subset of its parts, so check that none is missing
+    expected = int(job.get("metadata", {}).get("upload_parts", 0))
+    missing = sorted(set(range(1, expected + 1)) - {part["PartNumber"] for part in parts})
+    if missing:
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": "Parts missing", "missing_parts": missing}),
+        }
+    try:
+        s3_client.complete_multipart_upload(**target, MultipartUpload={"Parts": parts})
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code not in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall", "NoSuchUpload"):
+            raise
+        if code == "NoSuchUpload" and object_exists(bucket_name, object_key):
+            logger.info(f"Upload of s3://{bucket_name}/{object_key} was already completed")
+            return {"statusCode": 200, "headers": headers, "body": json.dumps({"job_id": job_id})}
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": f"Could not complete the upload: {e.response['Error']['Message']}"}),
+        }
+    logger.info(f"Multipart upload of s3://{bucket_name}/{object_key} completed ({len(parts)} parts)")
+    return {"statusCode": 200, "headers": headers, "body": json.dumps({"job_id": job_id})}
+
+
+def refresh_part_urls(body, bucket_name, headers):
+    """
+    Presigns the parts of a job's multipart upload again, given {"job_id", "upload_id",
+    "part_numbers"}, for clients whose part URLs expired before they were used.
+    """
+    job_id = body.get("job_id")
+    upload_id = body.get("upload_id")
+    numbers = body.get("part_numbers")
+    if not job_id or not upload_id or not isinstance(numbers, list):
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps(
+                {"message": "Must provide 'job_id', 'upload_id' and 'part_numbers' in body"}
+            ),
+        }
+    job = STORE.get_job(job_id)
+    if job is None or job.get("status") != "started" or "upload_parts" not in job.get("metadata", {}):
+        return {
+            "statusCode": 404,
+            "headers": headers,
+            "body": json.dumps({"message": f"No upload in progress for job {job_id}"}),
+        }
+    part_count = int(job["metadata"]["upload_parts"])
+    if not all(isinstance(n, int) and 1 <= n <= part_count for n in numbers):
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": f"Part numbers must be 1 to {part_count}"}),
+        }
+    object_key = job["url"].split(f"s3://{bucket_name}/", 1)[-1]
+    size = int(job["metadata"].get("upload_size", 0))
+    parts = presign_parts(bucket_name, object_key, upload_id, numbers, multipart_url_expiry(size))
+    return {"statusCode": 200, "headers": headers,
+            "body": json.dumps({"job_id": job_id, "parts": parts})}
 
-    content_type = None
 
-    # Try to get the content type from the HTTP response headers
-    if source_url:
-        response = requests.head(source_url)  # Perform a HEAD request to get headers
-        content_type = response.headers.get("Content-Type")
-        logger.info(f"Read content_type={content_type} from headers")
-    
-    # infer it based on the file extension
-    if not content_type:
-        fname = source_url.split("?")[0].rsplit("/", 1)[1]
-        guessed_type, _ = mimetypes.guess_type(fname)
-        content_type = guessed_type if guessed_type else "application/octet-stream"
-        logger.info(f"Inferred content_type={content_type} from filename")
-    result["content_type"] = content_type
-    return result
-    
-
-def upload_file_to_s3(bucket_name, object_key, file_content, content_type):
-    """Uploads the file content to the specified S3 bucket."""
+def object_exists(bucket_name, object_key):
     try:
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=object_key,
-            Body=file_content,
-            ContentType=content_type  # Set the content type here
-        )
-        logger.info(f"File successfully uploaded to s3://{bucket_name}/{object_key}")
+        s3_client.head_object(Bucket=bucket_name, Key=object_key)
     except ClientError as e:
-        logger.error(
-            f"Error uploading file to s3://{bucket_name}/{object_key}: "
-            + f"{e.response['Error']['Message']}"
-        )
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return False
         raise
+    return True
 
 
-def create_job(job_id, bucket_name, object_key, metadata=None):
-    s3_url = f"s3://{bucket_name}/{object_key}"
+def copy_to_bucket(body, job_id, bucket_name, headers, profile=None):
+    """
+    Handles a source_url: creates the job and hands the copy to an IngestUrl invocation,
+    so the request returns before the download, whatever the file size.
+    """
+    source_url = body["source_url"]
+    object_key = object_key_for(job_id, source_url)
+    STORE.create_job(job_id, f"s3://{bucket_name}/{object_key}", profile=profile)
+
     try:
-        item = {
-            "job_id": job_id,
-            "created_at": datetime.utcnow().isoformat(),
-            "url": s3_url,
-            "status": "started",
-            "ttl": int(time.time()) + (TTL_DAYS * 24 * 60 * 60),
+        start_ingest(job_id, source_url, object_key)
+    except Exception as e:
+        message = f"Error starting the copy of source_url: {str(e)}"
+        STORE.update_job(job_id, "error", message=message)
+        return {
+            "statusCode": 500,
+            "headers": headers,
+            "body": json.dumps({"message": message}),
         }
 
-        if metadata:
-            item["metadata"] = metadata
+    result = {"job_id": job_id}
+    return {"statusCode": 200, "headers": headers, "body": json.dumps(result)}
+
+
+def start_ingest(job_id, source_url, object_key):
+    """Invokes IngestUrl asynchronously to copy source_url to object_key."""
+    lambda_client.invoke(
+        FunctionName=INGEST_FUNCTION_NAME,
+        InvocationType="Event",
+        Payload=json.dumps({"job_id": job_id, "source_url": source_url, "object_key": object_key}),
+    )
+
+
+def ingest_handler(event, context):
+    """
+    IngestUrl entry point: copies the source_url of a job into the input bucket, which
+    starts its conversion. A copy that fails, or that is still running
+    INGEST_MIN_REMAINING_SEC before the timeout, is aborted and its job marked as failed.
+    """
+    bucket_name = os.environ["BUCKET_NAME"]
+    job_id = event["job_id"]
+    deadline = None
+    if context is not None:
+        deadline = time.monotonic() + (
+            context.get_remaining_time_in_millis() - INGEST_MIN_REMAINING_MS
+        ) / 1000
+    try:
+        stream_url_to_s3(event["source_url"], bucket_name, event["object_key"], deadline=deadline)
+    except Exception as e:
+        message = f"Error processing source_url: {str(e)}"
+        logger.error(f"Job {job_id}: {message}")
+        STORE.update_job(job_id, "error", message=message)
+        return {"job_id": job_id, "status": "error"}
+    return {"job_id": job_id, "status": "copied"}
 
-        _ = TABLE.put_item(Item=item)
-        logger.info(f"Job {job_id} created successfully")
-    except ClientError as e:
-        msg = f"Error creating job {job_id} record: {e.response['Error']['Message']}"
-        logger.error(msg)
-        raise
+
+def object_key_for(job_id, source_url):
+    fname = source_url.split("?")[0].rsplit("/", 1)[1]
+    return f"input/{job_id}/{fname}"
 
 
-def update_job(job_id, status, urls=None, message=None, metadata=None):
+def bulk_copy_to_bucket(body, bucket_name, headers):
+    """
+    Handles a list of source URLs, given as strings or as {"source_url", "job_id",
+    "profile"} objects. All job records are created with grouped writes, then each URL is
+    handed to its own IngestUrl invocation, BULK_MAX_WORKERS invocations sent at a time.
+
+    The response lists, in request order, the job_id of each URL, or its error. Copies
+    that fail later mark their job as failed.
+    """
+    entries = body["source_urls"]
+    if not isinstance(entries, list) or not entries or len(entries) > BULK_MAX_URLS:
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps(
+                {"message": f"'source_urls' must be a list of 1 to {BULK_MAX_URLS} URLs"}
+            ),
+        }
     try:
-        item = {
-            "job_id": job_id,
-            "created_at": datetime.utcnow().isoformat(),
-            "status": status,
-            "ttl": int(time.time()) + (TTL_DAYS * 24 * 60 * 60),
+        default_profile = valid_profile(body.get("profile"))
+    except ProfileError as e:
+        return {
+            "statusCode": 400,
+            "headers": headers,
+            "body": json.dumps({"message": str(e)}),
         }
 
-        if status == "success" and urls:
-            item["urls"] = urls
-        elif message:
-            item["message"] = message
+    items = []
+    jobs = STORE.group()
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"source_url": entry}
+        source_url = entry.get("source_url") if isinstance(entry, dict) else None
+        entry = entry if isinstance(entry, dict) else {}
+        item = {"source_url": source_url, "job_id": entry.get("job_id") or str(uuid.uuid4())[:8]}
+        items.append(item)
+        parsed = urlparse(source_url if isinstance(source_url, str) else "")
+        profile, error = default_profile, None
+        if parsed.scheme not in ("http", "https") or not parsed.path.rsplit("/", 1)[-1]:
+            error = "Must be an http(s) URL of a file"
+        elif "profile" in entry:
+            try:
+                profile = valid_profile(entry["profile"])
+            except ProfileError as e:
+                error = str(e)
+        if error:
+            item["error"] = error
+            if not entry.get("job_id"):
+                del item["job_id"]  # no job was created
+        elif item["job_id"] in jobs.writes:
+            item["error"] = f"Job {item['job_id']} appears more than once"
+        else:
+            item["object_key"] = object_key_for(item["job_id"], source_url)
+            jobs.create_job(
+                item["job_id"], f"s3://{bucket_name}/{item['object_key']}", profile=profile
+            )
+    created = jobs.flush()
+    for item in items:
+        if "object_key" in item and created[item["job_id"]] is not None:
+            item["error"] = str(created[item["job_id"]])
+            del item["object_key"]
+
+    def dispatch(item):
+        try:
+            start_ingest(item["job_id"], item["source_url"], item["object_key"])
+        except Exception as e:
+            item["error"] = f"Error starting the copy of source_url: {str(e)}"
+            return item
+        return None
+
+    # jobs whose record was written but whose copy could not be started
+    failures = STORE.group()
+    for item in INVOKE_POOL.map(dispatch, [item for item in items if "object_key" in item]):
+        if item is not None:
+            failures.update_job(item["job_id"], "error", message=item["error"])
+    if len(failures):
+        for job_id, error in failures.flush().items():
+            if error is not None:
+                logger.error(f"Could not record the failure of job {job_id}: {error}")
+
+    result = {"jobs": [
+        {k: v for k, v in item.items() if k != "object_key"} for item in items
+    ]}
+    logger.info(
+        f"Bulk request: {sum('error' not in item for item in items)} of {len(items)} URLs handed to IngestUrl"
+    )
+    return {"statusCode": 200, "headers": headers, "body": json.dumps(result)}
 
-        if metadata:
-            item["metadata"] = metadata
 
-        _ = TABLE.put_item(Item=item)
-        logger.info(f"Job {job_id} with status={status!r} updated successfully")
-    except ClientError as e:
-        msg = f"Error updating job {job_id}: {e.response['Error']['Message']}"
+def content_type_for(source_url, header=None):
+    """The Content-Type response header without parameters, or a guess from the filename."""
+    content_type = header.split(";")[0].strip() if header else None
+    if content_type:
+        logger.info(f"Read content_type={content_type} from headers")
+        return content_type
+    fname = source_url.split("?")[0].rsplit("/", 1)[1]
+    guessed_type, _ = mimetypes.guess_type(fname)
+    content_type = guessed_type if guessed_type else "application/octet-stream"
+    logger.info(f"Inferred content_type={content_type} from filename")
+    return content_type
+
+
+def part_size_for(content_length=None):
+    """INGEST_PART_SIZE, or larger parts if the file would need more than MAX_PARTS."""
+    if content_length:
+        return max(INGEST_PART_SIZE, -(-content_length // MAX_PARTS))
+    return INGEST_PART_SIZE
+
+
+def stream_url_to_s3(source_url, bucket_name, object_key, deadline=None):
+    """
+    Streams the file at source_url into S3 without holding it in memory. The body is
+    cut into parts that are uploaded (multipart) while the next part downloads; at most
+    INGEST_UPLOAD_CONCURRENCY parts are in flight, so memory use stays under
+    (INGEST_UPLOAD_CONCURRENCY + 1) parts whatever the file size. A file that fits in
+    one part is uploaded with a single PutObject. The content type comes from the GET
+    response.
+
+    Args:
+        deadline (float, optional): time.monotonic() value after which the copy is
+            abandoned with a TimeoutError (and the multipart upload aborted).
+
+    Returns:
+        tuple: (content type, size in bytes)
+    """
+    try:
+        response = SESSION.get(source_url, stream=True, timeout=(CONNECT_TIMEOUT_SEC, READ_TIMEOUT_SEC))
+        response.raise_for_status()
+    except requests.RequestException as e:
+        msg = f"Error downloading file from {source_url}: {str(e)}"
         logger.error(msg)
-        raise
+        raise Exception(msg) from e
+
+    # each copy has its own part uploaders, so concurrent copies don't wait on each other
+    with response, ThreadPoolExecutor(max_workers=INGEST_UPLOAD_CONCURRENCY) as upload_pool:
+        content_type = content_type_for(source_url, response.headers.get("Content-Type"))
+        length = response.headers.get("Content-Length")
+        part_size = part_size_for(int(length) if length and length.isdigit() else None)
+        target = {"Bucket": bucket_name, "Key": object_key}
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        in_flight = []  # futures of the parts being uploaded, oldest first
+        parts = []
+
+        def upload_part(data):
+            nonlocal upload_id
+            if upload_id is None:
+                upload_id = s3_client.create_multipart_upload(
+                    **target, ContentType=content_type
+                )["UploadId"]
+            number = len(parts) + len(in_flight) + 1
+            if number > MAX_PARTS:
+                raise ValueError(f"{source_url} needs more than {MAX_PARTS} parts")
+            if len(in_flight) >= INGEST_UPLOAD_CONCURRENCY:
+                parts.append(in_flight.pop(0).result())
+            in_flight.append(upload_pool.submit(
+                lambda: {"PartNumber": number, "ETag": s3_client.upload_part(
+                    **target, UploadId=upload_id, PartNumber=number, Body=data
+                )["ETag"]}
+            ))
+
+        try:
+            for chunk in response.iter_content(chunk_size=INGEST_READ_CHUNK):
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"Copy of {source_url} did not finish in time")
+                buffer += chunk
+                size += len(chunk)
+                while len(buffer) > part_size:  # a file of exactly one part takes one PutObject
+                    upload_part(bytes(buffer[:part_size]))
+                    del buffer[:part_size]
+            if size == 0:
+                raise ValueError(f"Error downloading file from {source_url}: no content")
+            if upload_id is None:
+                s3_client.put_object(**target, Body=bytes(buffer), ContentType=content_type)
+            else:
+                if buffer:
+                    upload_part(bytes(buffer))
+                parts.extend(future.result() for future in in_flight)
+                in_flight.clear()
+                s3_client.complete_multipart_upload(
+                    **target, UploadId=upload_id, MultipartUpload={"Parts": parts}
+                )
+        except BaseException as e:
+            if upload_id is not None:
+                # parts still uploading would outlive the abort, so let them finish
+                for future in in_flight:
+                    future.exception()
+                try:
+                    s3_client.abort_multipart_upload(**target, UploadId=upload_id)
+                except ClientError as abort_error:
+                    logger.error(f"Could not abort upload {upload_id}: {abort_error}")
+            if isinstance(e, ClientError):
+                logger.error(
+                    f"Error uploading file to s3://{bucket_name}/{object_key}: "
+                    + f"{e.response['Error']['Message']}"
+                )
+            raise
+
+    logger.info(f"File successfully uploaded to s3://{bucket_name}/{object_key} ({size} bytes)")
+    return content_type, size
+
+
+def raise_write_error(results):
+    """Raises the first error of a JobWriteGroup flush."""
+    for error in results.values():
+        if error is not None:
+            raise error
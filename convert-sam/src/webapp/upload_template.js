@@ -24,7 +24,8 @@ async function uploadFile() {
             },
             body: JSON.stringify({
                 filename: filename,
-                content_type: contentType
+                content_type: contentType,
+                size: file.size  // large files get a multipart upload
             })
         });
 
@@ -37,18 +38,22 @@ async function uploadFile() {
         const presignedUrl = lambdaData.presigned_url;
         const jobId = lambdaData.job_id;
 
-        // Upload the file to S3 using the presigned URL
         statusMessage.textContent = 'Uploading file...';
-        const uploadResponse = await fetch(presignedUrl, {
-            method: 'PUT',
-            headers: {
-                'Content-Type': contentType
-            },
-            body: file
-        });
+        if (lambdaData.parts) {
+            await uploadMultipart(file, lambdaData, apiUrl, statusMessage);
+        } else {
+            // Upload the file to S3 using the presigned URL
+            const uploadResponse = await fetch(presignedUrl, {
+                method: 'PUT',
+                headers: {
+                    'Content-Type': contentType
+                },
+                body: file
+            });
 
-        if (!uploadResponse.ok) {
-            throw new Error('Failed to upload file to S3');
+            if (!uploadResponse.ok) {
+                throw new Error('Failed to upload file to S3');
+            }
         }
 
         statusMessage.textContent = 'File uploaded successfully. Checking job status...';
@@ -61,10 +66,87 @@ async function uploadFile() {
     }
 }
 
-async function checkJobStatus(jobId, elapsedTime) {
+async function uploadPart(file, part, partSize, refreshUrl) {
+    const maxAttempts = 4;
+    const start = (part.part_number - 1) * partSize;
+    const blob = file.slice(start, Math.min(start + partSize, file.size));
+
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(part.url, { method: 'PUT', body: blob });
+            if (response.status === 403 && attempt < maxAttempts) {
+                // The part URL expired: get a new one and retry
+                part = { ...part, url: await refreshUrl(part.part_number) };
+                continue;
+            }
+            if (!response.ok) {
+                throw new Error(`Failed to upload part ${part.part_number}: ${response.status}`);
+            }
+            return { part_number: part.part_number, etag: response.headers.get('ETag') };
+        } catch (error) {
+            if (attempt >= maxAttempts) {
+                throw error;
+            }
+            // Retry this part only, after 1, 2, then 4 seconds
+            await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+        }
+    }
+}
+
+async function uploadMultipart(file, uploadData, apiUrl, statusMessage) {
+    const concurrency = 4; // Parts uploaded at the same time
+    const pending = [...uploadData.parts];
+    const uploaded = [];
+    const request = { job_id: uploadData.job_id, upload_id: uploadData.upload_id };
+    const completeUrl = `${apiUrl}/complete`;
+
+    async function refreshUrl(partNumber) {
+        const response = await fetch(`${apiUrl}/parts`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ...request, part_numbers: [partNumber] })
+        });
+        if (!response.ok) {
+            throw new Error(`Failed to refresh the URL of part ${partNumber}`);
+        }
+        return (await response.json()).parts[0].url;
+    }
+
+    async function worker() {
+        while (pending.length > 0) {
+            const part = pending.shift();
+            uploaded.push(await uploadPart(file, part, uploadData.part_size, refreshUrl));
+            statusMessage.textContent = `Uploading file... ${uploaded.length} of ${uploadData.parts.length} parts`;
+        }
+    }
+
+    try {
+        await Promise.all(Array.from({ length: concurrency }, worker));
+    } catch (error) {
+        pending.length = 0; // Stop the other workers
+        await fetch(completeUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ...request, abort: true })
+        });
+        throw error;
+    }
+
+    const completeResponse = await fetch(completeUrl, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...request, parts: uploaded })
+    });
+    if (!completeResponse.ok) {
+        throw new Error('Failed to complete the upload');
+    }
+}
+
+async function checkJobStatus(jobId, elapsedTime, lastStatus = 'started') {
     const statusMessage = document.getElementById('statusMessage');
     const fileLinks = document.getElementById('fileLinks');
-    const pollInterval = 5000; // Poll every 5 seconds
+    const waitSeconds = 20; // The server holds each request until the status changes, for up to 20 seconds
+    const retryDelay = 500; // Pause between requests, in case the server returns right away
     const maxPollingTime = 120000; // Maximum polling time of 2 minutes (120,000 ms)
     const apiUrl = "API_GATEWAY_URL";
 
@@ -74,13 +156,17 @@ async function checkJobStatus(jobId, elapsedTime) {
         return;
     }
 
+    const requestStart = Date.now();
     try {
-        const statusResponse = await fetch(`${apiUrl}?job_id=${jobId}`);  // Use the environment variable
+        const statusResponse = await fetch(
+            `${apiUrl}?job_id=${jobId}&wait=${waitSeconds}&last_status=${encodeURIComponent(lastStatus)}`
+        );
         if (!statusResponse.ok) {
             throw new Error('Failed to check job status');
         }
 
         const statusData = await statusResponse.json();
+        const nextElapsed = elapsedTime + (Date.now() - requestStart) + retryDelay;
 
         if (statusData.status === 'success') {
             statusMessage.textContent = 'Job completed successfully:';
@@ -105,7 +191,7 @@ async function checkJobStatus(jobId, elapsedTime) {
             if (statusMessage.textContent !== 'Job started successfully. Please wait...') {
                 statusMessage.textContent = 'Job started successfully. Please wait...';
             }
-            setTimeout(() => checkJobStatus(jobId, elapsedTime + pollInterval), pollInterval);
+            setTimeout(() => checkJobStatus(jobId, nextElapsed, statusData.status), retryDelay);
         } else if (statusData.status === 'error') {
             statusMessage.textContent = statusData.message;
         } else {
@@ -113,7 +199,7 @@ async function checkJobStatus(jobId, elapsedTime) {
             if (statusMessage.textContent !== 'Job is in progress...') {
                 statusMessage.textContent = 'Job is in progress...';
             }
-            setTimeout(() => checkJobStatus(jobId, elapsedTime + pollInterval), pollInterval);
+            setTimeout(() => checkJobStatus(jobId, nextElapsed, statusData.status), retryDelay);
         }
     } catch (error) {
         console.error('Error:', error);